@@ -0,0 +1,103 @@
+# bench_batch.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure the throughput and latency of batch executions : sequential
+awaits, an unbounded asyncio.gather() and execute_many() with several
+concurrency limits through ASandbox, and map() through Sandbox.
+
+Usage: python -m benchmarks.bench_batch [-n EXECUTIONS] [--delay SECONDS]"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+from benchmarks.stub import StubServer
+from sandbox_api import ASandbox, Sandbox
+
+
+CONFIG = {"commands": ["echo $((2+2))"]}
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    """Return the <p>-th percentile of <latencies>."""
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+async def timed(sandbox: ASandbox, latencies: List[float]):
+    start = time.perf_counter()
+    await sandbox.execute(CONFIG)
+    latencies.append(time.perf_counter() - start)
+
+
+async def sequential(sandbox: ASandbox, n: int) -> List[float]:
+    latencies = []
+    for _ in range(n):
+        await timed(sandbox, latencies)
+    return latencies
+
+
+async def gather(sandbox: ASandbox, n: int) -> List[float]:
+    latencies = []
+    await asyncio.gather(*(timed(sandbox, latencies) for _ in range(n)))
+    return latencies
+
+
+async def execute_many(sandbox: ASandbox, n: int, concurrency: int) -> List[float]:
+    latencies = []
+    async for result in sandbox.execute_many([CONFIG] * n, concurrency):
+        result.get()
+        latencies.append(result.elapsed)
+    return latencies
+
+
+def report(name: str, latencies: List[float], elapsed: float):
+    print("%-30s %10.1f %10.2f %10.2f" % (
+        name, len(latencies) / elapsed, percentile(latencies, 50) * 1000,
+        percentile(latencies, 99) * 1000
+    ))
+
+
+async def run(url: str, n: int):
+    modes = [
+        ("sequential (n / 10)", lambda s: sequential(s, n // 10)),
+        ("asyncio.gather (unbounded)", lambda s: gather(s, n)),
+    ] + [
+        ("execute_many(concurrency=%d)" % c, lambda s, c=c: execute_many(s, n, c))
+        for c in (10, 50, 100)
+    ]
+    print("%-30s %10s %10s %10s" % ("", "exec/s", "p50 (ms)", "p99 (ms)"))
+    for name, func in modes:
+        async with ASandbox(url, limit=0) as sandbox:
+            start = time.perf_counter()
+            latencies = await func(sandbox)
+            report(name, latencies, time.perf_counter() - start)
+
+
+def run_sync(url: str, n: int):
+    for workers in (10, 50):
+        with Sandbox(url, pool_maxsize=workers) as sandbox:
+            start = time.perf_counter()
+            latencies = [r.elapsed for r in sandbox.map([CONFIG] * n) if r.get()]
+            report("Sandbox.map(max_workers=%d)" % workers, latencies,
+                   time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2000, help="Number of executions")
+    parser.add_argument("--delay", type=float, default=0.01,
+                        help="Time taken by the stub to answer an execution")
+    args = parser.parse_args()
+    
+    with StubServer(delay=args.delay) as stub:
+        asyncio.run(run(stub.url, args.n))
+        run_sync(stub.url, args.n)
+
+
+if __name__ == '__main__':
+    main()
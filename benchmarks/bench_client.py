@@ -0,0 +1,307 @@
+# bench_client.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure the overhead of Sandbox and ASandbox for each endpoint, at several
+payload sizes, through an in-process mock transport, comparing the results
+against stored baselines.
+
+The cases cover the building of URLs, the encoding of the config and of the
+multipart body, the decoding of the JSON responses, the construction of the
+exceptions and the copy of downloaded content. No sandbox is needed.
+
+Usage: python -m benchmarks.bench_client [--quick] [--filter TEXT] [--save]
+                                         [--check] [--tolerance RATIO]"""
+
+import argparse
+import asyncio
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+from typing import Awaitable, Callable, Dict
+
+from benchmarks.mock import MockTransport, mock_sandbox
+from benchmarks.stub import EXECUTE, USAGE
+from sandbox_api import ASandbox, Sandbox, SandboxError
+from sandbox_api.exceptions import status_exceptions
+
+
+URL = "http://sandbox.mock/"
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines", "bench_client.json")
+
+# Size in bytes of the payloads of each size, used as the size of the config,
+# of the environment, of the output of the execution and of the downloads.
+SIZES = {
+    "small":  1024,
+    "medium": 64 * 1024,
+    "large":  1024 * 1024,
+}
+
+SPECIFICATIONS = {
+    "host":      {"sandbox_version": "3.0.0", "docker_version": "20.10.0", "cpu": {"core": 4}},
+    "container": {"count": 20, "cpu": {"count": 1}, "memory": {"ram": 100000000}},
+}
+
+
+def sized_config(size: int) -> dict:
+    """Return a config whose JSON is about <size> bytes."""
+    command = "echo " + "x" * 59
+    return {"commands": [command] * max(1, size // (len(command) + 4)), "result_path": "out"}
+
+
+def sized_result(size: int) -> dict:
+    """Return a result of execute() whose JSON is about <size> bytes."""
+    execution = dict(EXECUTE["execution"][0], stdout="x" * size)
+    return dict(EXECUTE, execution=[execution])
+
+
+def transport(size: int) -> MockTransport:
+    """Return a mock transport answering with payloads of <size> bytes."""
+    return MockTransport(URL, {
+        "execute":        MockTransport.json(sized_result(size)),
+        "usages":         MockTransport.json(USAGE),
+        "specifications": MockTransport.json(SPECIFICATIONS),
+        "environments":   MockTransport.raw(b"x" * size),
+    })
+
+
+def measure(func: Callable[[], object], min_time: float, repeat: int = 5) -> float:
+    """Return the best time in seconds of a call to <func> over <repeat>
+    rounds, each round lasting at least <min_time> seconds. The garbage
+    collector is disabled during the rounds, as in timeit."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        n, start = 0, time.perf_counter()
+        while True:
+            func()
+            n += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / n)
+    return best
+
+
+async def ameasure(func: Callable[[], Awaitable], min_time: float, repeat: int = 5) -> float:
+    """Asynchronous version of measure()."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        n, start = 0, time.perf_counter()
+        while True:
+            await func()
+            n += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / n)
+    return best
+
+
+def raises(func: Callable[[], object]) -> Callable[[], None]:
+    """Return a function calling <func> and swallowing the SandboxError it
+    is expected to raise."""
+    
+    def call():
+        try:
+            func()
+        except SandboxError:
+            return
+        raise AssertionError("%s did not raise" % func)
+    
+    return call
+
+
+def araises(func: Callable[[], Awaitable]) -> Callable[[], Awaitable]:
+    """Asynchronous version of raises()."""
+    
+    async def call():
+        try:
+            await func()
+        except SandboxError:
+            return
+        raise AssertionError("%s did not raise" % func)
+    
+    return call
+
+
+def sync_cases(size: int) -> Dict[str, Callable[[], object]]:
+    """Return the cases of Sandbox with payloads of <size> bytes."""
+    sandbox = Sandbox(URL)
+    mock_sandbox(sandbox, transport(size))
+    config, environ = sized_config(size), b"x" * size
+    return {
+        "execute":         lambda: sandbox.execute(config),
+        "execute_environ": lambda: sandbox.execute({"commands": []}, io.BytesIO(environ)),
+        "download":        lambda: sandbox.download("uuid"),
+    }
+
+
+def sync_fixed_cases() -> Dict[str, Callable[[], object]]:
+    """Return the cases of Sandbox not depending on the size of payloads."""
+    sandbox = Sandbox(URL)
+    mock_sandbox(sandbox, transport(0))
+    return {
+        "build_url":      lambda: sandbox._build_url("files", "uuid", "dir/file"),
+        "usage":          sandbox.usage,
+        "specifications": sandbox.specifications,
+        "error":          raises(sandbox.libraries),
+    }
+
+
+def async_cases(size: int) -> Dict[str, Callable[[], Awaitable]]:
+    """Return the cases of ASandbox with payloads of <size> bytes."""
+    sandbox = ASandbox(URL)
+    mock_sandbox(sandbox, transport(size))
+    config, environ = sized_config(size), b"x" * size
+    return {
+        "execute":         lambda: sandbox.execute(config),
+        "execute_environ": lambda: sandbox.execute({"commands": []}, io.BytesIO(environ)),
+        "download":        lambda: sandbox.download("uuid"),
+    }
+
+
+def async_fixed_cases() -> Dict[str, Callable[[], Awaitable]]:
+    """Return the cases of ASandbox not depending on the size of payloads."""
+    sandbox = ASandbox(URL)
+    mock_sandbox(sandbox, transport(0))
+    return {
+        "build_url":      lambda: sandbox._build_url("files", "uuid", "dir/file"),
+        "usage":          sandbox.usage,
+        "specifications": sandbox.specifications,
+        "error":          araises(sandbox.libraries),
+    }
+
+
+def helper_fixed_cases() -> Dict[str, Callable[[], object]]:
+    """Return the cases of the helpers not depending on the size of
+    payloads."""
+    status, headers, _ = transport(0).answer("GET", URL + "libraries/", 0)
+    response = type("Response", (), {"status_code": status, "headers": headers})()
+    return {
+        "status_exception": lambda: status_exceptions(response),
+    }
+
+
+def helper_cases(size: int) -> Dict[str, Callable[[], object]]:
+    """Return the cases of the encoding and decoding of payloads of <size>
+    bytes done by both clients."""
+    config, body = sized_config(size), json.dumps(sized_result(size))
+    return {
+        "config_dumps": lambda: json.dumps(config),
+        "result_loads": lambda: json.loads(body),
+    }
+
+
+def cases(prefix: str, fixed: Callable[[], dict], sized: Callable[[int], dict]):
+    """Yield the (name, function) pairs of the cases returned by <fixed> and
+    by <sized> for every size."""
+    for case, func in fixed().items():
+        yield "%s.%s" % (prefix, case), func
+    for label, size in SIZES.items():
+        for case, func in sized(size).items():
+            yield "%s.%s[%s]" % (prefix, case, label), func
+
+
+def run(min_time: float = 0.2, selected: str = "") -> Dict[str, float]:
+    """Run every case whose name contains <selected>, returning the time in
+    seconds of a call to each, keyed by name."""
+    results, enabled = {}, gc.isenabled()
+    gc.disable()
+    try:
+        _run(results, min_time, selected)
+    finally:
+        if enabled:
+            gc.enable()
+    return results
+
+
+def _run(results: Dict[str, float], min_time: float, selected: str):
+    for name, func in cases("helpers", helper_fixed_cases, helper_cases):
+        if selected in name:
+            results[name] = measure(func, min_time)
+    for name, func in cases("Sandbox", sync_fixed_cases, sync_cases):
+        if selected in name:
+            results[name] = measure(func, min_time)
+    
+    async def arun():
+        for name, func in cases("ASandbox", async_fixed_cases, async_cases):
+            if selected in name:
+                results[name] = await ameasure(func, min_time)
+    
+    asyncio.run(arun())
+
+
+def load_baselines(path: str = BASELINES) -> Dict[str, float]:
+    """Return the stored time of each case, empty if there are none."""
+    try:
+        with open(path) as f:
+            return json.load(f)["results"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(results: Dict[str, float], path: str = BASELINES):
+    """Store <results> as the baselines."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "python":  platform.python_version(),
+            "machine": platform.platform(),
+            "results": results,
+        }, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results: Dict[str, float], baselines: Dict[str, float],
+            tolerance: float) -> Dict[str, float]:
+    """Return the ratio to the baseline of every case slower than its
+    baseline by more than <tolerance> (E.G. 0.25 for 25%)."""
+    return {
+        name: seconds / baselines[name] for name, seconds in results.items()
+        if name in baselines and seconds > baselines[name] * (1 + tolerance)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Shorter, noisier measures")
+    parser.add_argument("--filter", default="", help="Only run cases containing this text")
+    parser.add_argument("--save", action="store_true", help="Store the results as baselines")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if a case regressed")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown before a case is a regression (default: 0.5)")
+    args = parser.parse_args()
+    
+    baselines = load_baselines()
+    results = run(0.02 if args.quick else 0.2, args.filter)
+    print("%-36s %12s %12s %8s" % ("case", "us/call", "baseline", "ratio"))
+    for name, seconds in results.items():
+        baseline = baselines.get(name)
+        print("%-36s %12.1f %12s %8s" % (
+            name, seconds * 1e6, "-" if baseline is None else "%.1f" % (baseline * 1e6),
+            "-" if baseline is None else "%.2f" % (seconds / baseline),
+        ))
+    
+    if args.save:
+        save_baselines(dict(baselines, **results))
+        print("\nBaselines saved to %s" % BASELINES)
+    if args.check:
+        regressions = compare(results, baselines, args.tolerance)
+        for name, ratio in regressions.items():
+            print("REGRESSION: %s is %.2fx slower than its baseline" % (name, ratio))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
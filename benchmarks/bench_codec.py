@@ -0,0 +1,82 @@
+# bench_codec.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compare the CPU time spent by each installed JSON codec encoding configs
+and decoding execution results of several sizes.
+
+Usage: python -m benchmarks.bench_codec [--sizes MB [MB ...]] [--repeat N]"""
+
+import argparse
+import gc
+import time
+from typing import Callable
+
+from benchmarks.bench_client import sized_config
+from benchmarks.stub import EXECUTE
+from sandbox_api.codec import CODECS, JSONCodec
+
+
+def result(size: int) -> dict:
+    """Return an execution result of about <size> bytes, split between many
+    commands with non-ASCII and escaped output, as a grader would produce."""
+    line = "test %d : ok — « expected » == \"got\"\tin 0.01s\n"
+    per_command = 16 * 1024
+    execution = []
+    for i in range(max(1, size // per_command)):
+        stdout = "".join(line % n for n in range(per_command // len(line)))
+        execution.append(dict(EXECUTE["execution"][0], command="./grader %d" % i,
+                              stdout=stdout, stderr="", time=0.01 * i))
+    return dict(EXECUTE, execution=execution)
+
+
+def cpu_time(func: Callable[[], object], repeat: int) -> float:
+    """Return the best CPU time in seconds of a call to <func> over <repeat>
+    calls, with the garbage collector disabled."""
+    best = float("inf")
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.process_time()
+            func()
+            best = min(best, time.process_time() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16],
+                        help="Size of the payloads in MB")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of calls measured")
+    args = parser.parse_args()
+    
+    codecs = [cls() for cls in CODECS.values() if cls.available()]
+    print("%-8s %-16s %8s %10s %10s %8s" % (
+        "size", "case", "codec", "cpu (ms)", "MB/s", "speedup"
+    ))
+    for mb in args.sizes:
+        size = int(mb * 2 ** 20)
+        payloads = {"result_loads": result(size), "config_dumps": sized_config(size)}
+        body = JSONCodec().dumps(payloads["result_loads"]).encode()
+        for case, payload in payloads.items():
+            times = {}
+            for codec in codecs:
+                if case == "result_loads":
+                    times[codec.name] = cpu_time(lambda: codec.loads(body), args.repeat)
+                else:
+                    times[codec.name] = cpu_time(lambda: codec.dumps(payload), args.repeat)
+            for name, seconds in times.items():
+                seconds = max(seconds, 1e-9)
+                print("%-8s %-16s %8s %10.2f %10.1f %7.2fx" % (
+                    "%gMB" % mb, case, name, seconds * 1e3, mb / seconds,
+                    times[JSONCodec.name] / seconds
+                ))
+
+
+if __name__ == '__main__':
+    main()
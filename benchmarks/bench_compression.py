@@ -0,0 +1,138 @@
+# bench_compression.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure the bytes saved and the CPU time spent by the compression of
+request bodies (configs embedding files) and of responses (large outputs),
+for each algorithm, then end-to-end through a FakeSandbox.
+
+Usage: python -m benchmarks.bench_compression [--sizes KB [KB ...]]"""
+
+import argparse
+import glob
+import gzip
+import os
+import time
+from typing import Callable, Iterator, List, Tuple
+
+from benchmarks.bench_codec import result
+from sandbox_api import Instrumentation, MetricsSink, Sandbox
+from sandbox_api.codec import default_codec
+from sandbox_api.compression import Compression, zstd_available
+from sandbox_api.testing import FakeSandbox
+
+
+SOURCES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sandbox_api")
+
+
+def inline_config(size: int) -> dict:
+    """Return a config of about <size> bytes writing source files inline
+    before running them, as graders do."""
+    commands, total = [], 0
+    while total < size:
+        for path in sorted(glob.glob(os.path.join(SOURCES, "*.py"))):
+            with open(path) as f:
+                source = f.read()[:size - total]
+            commands.append("cat > %s << 'EOF'\n%s\nEOF" % (os.path.basename(path), source))
+            total += len(commands[-1])
+            if total >= size:
+                break
+    return {"commands": commands + ["python3 grader.py"], "result_path": "grade.txt"}
+
+
+def compressions() -> Iterator[Tuple[str, Compression, Callable[[bytes], bytes]]]:
+    """Yield the name, the Compression and the decompression function of
+    every algorithm and level measured."""
+    for level in (1, 6, 9):
+        yield "gzip-%d" % level, Compression("gzip", 0, level), gzip.decompress
+    if zstd_available():
+        import zstandard
+        
+        for level in (1, 3, 9):
+            yield "zstd-%d" % level, Compression("zstd", 0, level), (
+                lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+            )
+
+
+def cpu_time(func: Callable[[], object], repeat: int = 3) -> float:
+    """Return the best CPU time in seconds of a call to <func>."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def offline(sizes: List[int]):
+    """Print the ratio and CPU cost of each algorithm on configs and
+    results of <sizes> bytes."""
+    print("%-8s %-8s %-8s %10s %10s %8s %12s %12s" % (
+        "size", "payload", "algo", "raw (KB)", "wire (KB)", "ratio", "comp (ms)", "decomp (ms)"
+    ))
+    codec = default_codec()
+    for size in sizes:
+        payloads = {
+            "config": [("config", codec.dumps(inline_config(size)))],
+            "result": [("result", codec.dumps(result(size)))],
+        }
+        for payload, fields in payloads.items():
+            for name, compression, decompress in compressions():
+                body, _ = compression.encode_form(fields) or (b"", None)
+                raw = sum(len(value) for _, value in fields)
+                compress_time = cpu_time(lambda: compression.encode_form(fields))
+                decompress_time = cpu_time(lambda: decompress(body))
+                print("%-8s %-8s %-8s %10.1f %10.1f %7.1fx %12.2f %12.2f" % (
+                    "%dKB" % (size // 1024), payload, name, raw / 1024, len(body) / 1024,
+                    raw / max(1, len(body)), compress_time * 1e3, decompress_time * 1e3,
+                ))
+
+
+def end_to_end(sizes: List[int], executions: int = 5):
+    """Print the bytes sent and received by Sandbox through a FakeSandbox
+    compressing responses, without any compression, with the defaults of
+    requests (compressed responses only) and with each algorithm."""
+    print("\n%-8s %-12s %12s %14s %10s" % (
+        "size", "compression", "sent (KB)", "received (KB)", "time (ms)"
+    ))
+    options = [
+        ("none", Compression(threshold=2 ** 62, responses=False)),
+        ("default", None),
+        ("gzip", Compression()),
+    ]
+    if zstd_available():
+        options.append(("zstd", Compression("zstd")))
+    with FakeSandbox(compress=1024) as fake:
+        for size in sizes:
+            config = inline_config(size)
+            # The output of the commands is about as large as the config
+            config["commands"][-1] = "cat *.py"
+            for name, compression in options:
+                sink = MetricsSink()
+                with Sandbox(fake.url, instrumentation=Instrumentation([sink]),
+                             compression=compression) as sandbox:
+                    start = time.perf_counter()
+                    for _ in range(executions):
+                        sandbox.execute(config)
+                    elapsed = (time.perf_counter() - start) / executions
+                sent = sum(sink.sent_bytes.values().values()) / executions
+                received = sum(sink.received_bytes.values().values()) / executions
+                print("%-8s %-12s %12.1f %14.1f %10.2f" % (
+                    "%dKB" % (size // 1024), name, sent / 1024, received / 1024, elapsed * 1e3
+                ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 256, 4096],
+                        help="Size of the payloads in KB")
+    args = parser.parse_args()
+    sizes = [kb * 1024 for kb in args.sizes]
+    offline(sizes)
+    end_to_end(sizes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# bench_environment.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compare building an environment in memory with tarfile against streaming
+it with EnvironmentBuilder : build time, archive size and peak memory.
+
+Usage: python -m benchmarks.bench_environment [--size MB] [--files N]"""
+
+import argparse
+import io
+import os
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+from sandbox_api import EnvironmentBuilder
+
+
+def populate(directory: str, size: int, files: int):
+    """Create <files> files totalling <size> bytes in <directory>, half of
+    each being random bytes and the other half repeated text."""
+    per_file = size // files
+    for i in range(files):
+        with open(os.path.join(directory, "file%d.dat" % i), "wb") as f:
+            f.write(os.urandom(per_file // 2))
+            f.write(b"some text content\n" * (per_file // 2 // 18))
+
+
+def measure(func):
+    """Return the result of func(), its duration and the peak of memory
+    allocated during its execution."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def with_tarfile(directory: str, level: int) -> int:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz", compresslevel=level) as tar:
+        tar.add(directory, "")
+    return len(buffer.getvalue())
+
+
+def with_builder(directory: str, level: int) -> int:
+    builder = EnvironmentBuilder(compresslevel=level)
+    builder.add_path(directory, "")
+    return sum(len(chunk) for chunk in builder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=64, help="Size of the environment in MB")
+    parser.add_argument("--files", type=int, default=16, help="Number of files")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        populate(directory, args.size * 2 ** 20, args.files)
+        print("%-22s %5s %10s %12s %14s" % ("", "level", "time (s)", "sent (MB)", "peak mem (MB)"))
+        for level in (1, 6, 9):
+            for name, func in (("tarfile + BytesIO", with_tarfile),
+                               ("EnvironmentBuilder", with_builder)):
+                size, elapsed, peak = measure(lambda: func(directory, level))
+                print("%-22s %5d %10.3f %12.2f %14.2f" % (
+                    name, level, elapsed, size / 2 ** 20, peak / 2 ** 20
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# bench_http2.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compare the throughput of the default HTTP/1.1 transport and of the HTTP/2
+transport, with many executions in flight at once.
+
+The stand-in sandbox (benchmarks.h2stub) runs in a separate process and
+serves both protocols on the same port. Each case reports the executions per
+second, the number of connections the server saw and the CPU time spent by
+the client per execution. Over HTTP/1.1 every execution in flight needs its
+own connection, either opening as many connections as there are executions
+in flight or queuing the executions on a capped pool. HTTP/2 multiplexes them
+over a single connection.
+
+Usage: python -m benchmarks.bench_http2 [-n EXECUTIONS] [--concurrency N]
+                                        [--delay SECONDS]"""
+
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from typing import Callable, Dict
+
+from benchmarks.h2stub import H2StubServer
+from sandbox_api import ASandbox, Sandbox
+
+
+CONFIG = {"commands": ["echo $((2+2))"]}
+
+
+def connections(url: str) -> int:
+    """Return the number of connections the stand-in has seen so far."""
+    with urllib.request.urlopen(url + "stats/") as response:
+        return sum(json.load(response)["connections"].values())
+
+
+def measure(url: str, n: int, func: Callable[[], object]) -> Dict[str, float]:
+    """Run <func>, sending <n> executions, returning the number of executions
+    per second, the connections opened and the CPU time per execution."""
+    before = connections(url)
+    start, cpu = time.perf_counter(), time.process_time()
+    func()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    return {
+        "exec/s":      n / elapsed,
+        "connections": connections(url) - before,
+        "cpu":         cpu / n,
+    }
+
+
+async def execute_many(sandbox: ASandbox, n: int, concurrency: int):
+    async with sandbox:
+        async for result in sandbox.execute_many([CONFIG] * n, concurrency):
+            result.get()
+
+
+def run_map(sandbox: Sandbox, n: int):
+    with sandbox:
+        for result in sandbox.map([CONFIG] * n):
+            result.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2000, help="Number of executions")
+    parser.add_argument("--concurrency", type=int, default=500,
+                        help="Executions in flight through ASandbox")
+    parser.add_argument("--delay", type=float, default=0.1,
+                        help="Time taken by the stand-in to answer an execution")
+    args = parser.parse_args()
+    
+    n, c = args.n, args.concurrency
+    cases = {
+        "ASandbox(limit=%d)[http1]" % c: lambda url: asyncio.run(
+            execute_many(ASandbox(url, limit=c), n, c)
+        ),
+        "ASandbox(limit=10)[http1]":     lambda url: asyncio.run(
+            execute_many(ASandbox(url, limit=10), n, c)
+        ),
+        "ASandbox[http2]":               lambda url: asyncio.run(
+            execute_many(ASandbox(url, transport="http2"), n, c)
+        ),
+        "Sandbox.map(50)[http1]":        lambda url: run_map(Sandbox(url, pool_maxsize=50), n),
+        "Sandbox.map(50)[http2]":        lambda url: run_map(
+            Sandbox(url, pool_maxsize=50, transport="http2"), n
+        ),
+    }
+    with H2StubServer(delay=args.delay) as stub:
+        results = {name: measure(stub.url, n, lambda: func(stub.url))
+                   for name, func in cases.items()}
+    
+    print("%-28s %10s %12s %14s" % ("case", "exec/s", "connections", "cpu/exec (us)"))
+    for name, result in results.items():
+        print("%-28s %10.1f %12d %14.0f" % (
+            name, result["exec/s"], result["connections"], result["cpu"] * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# bench_import.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure the time taken to import sandbox_api and each client in a fresh
+interpreter, checking which HTTP stacks are loaded and comparing the times
+against stored baselines.
+
+Usage: python -m benchmarks.bench_import [--runs N] [--save] [--check]
+                                         [--tolerance RATIO]"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_client import compare, load_baselines, save_baselines
+
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines", "bench_import.json")
+
+# Statement of each case and the HTTP stacks it must, and must not, load.
+CASES = {
+    "package":       ("import sandbox_api", [], ["requests", "aiohttp"]),
+    "exceptions":    ("from sandbox_api import SandboxError, Sandbox404", [],
+                      ["requests", "aiohttp"]),
+    "Sandbox":       ("from sandbox_api import Sandbox", ["requests"], ["aiohttp"]),
+    "ASandbox":      ("from sandbox_api import ASandbox", ["aiohttp"], ["requests"]),
+    "both":          ("from sandbox_api import Sandbox, ASandbox", ["requests", "aiohttp"], []),
+}
+
+# Run in the fresh interpreter, printing the time taken by <statement> and
+# the modules loaded.
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+exec(%r)
+elapsed = time.perf_counter() - start
+print(json.dumps({"time": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def run_case(statement: str) -> Tuple[float, List[str]]:
+    """Execute <statement> in a fresh interpreter, returning the time it took
+    and the modules loaded afterward."""
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT % statement], check=True, stdout=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    result = json.loads(output)
+    return result["time"], result["modules"]
+
+
+def stack_errors(name: str, modules: List[str]) -> List[str]:
+    """Return a message for each HTTP stack wrongly loaded or not loaded by
+    the case <name>."""
+    _, loaded, absent = CASES[name]
+    errors = ["%s did not load %s" % (name, m) for m in loaded if m not in modules]
+    errors += ["%s loaded %s" % (name, m) for m in absent if m in modules]
+    return errors
+
+
+def run(runs: int) -> Tuple[Dict[str, float], Dict[str, int], List[str]]:
+    """Run every case <runs> times, returning the best time of each case,
+    the number of modules it loaded and the stacks errors."""
+    times, counts, errors = {}, {}, []
+    for name, (statement, _, _) in CASES.items():
+        best = float("inf")
+        for _ in range(runs):
+            elapsed, modules = run_case(statement)
+            best = min(best, elapsed)
+        times[name], counts[name] = best, len(modules)
+        errors += stack_errors(name, modules)
+    return times, counts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Interpreters started per case")
+    parser.add_argument("--save", action="store_true", help="Store the results as baselines")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if a case regressed or loaded a wrong stack")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown before a case is a regression (default: 0.5)")
+    args = parser.parse_args()
+    
+    baselines = load_baselines(BASELINES)
+    times, counts, errors = run(args.runs)
+    print("%-12s %10s %10s %12s %8s" % ("case", "ms", "modules", "baseline", "ratio"))
+    for name, seconds in times.items():
+        baseline = baselines.get(name)
+        print("%-12s %10.1f %10d %12s %8s" % (
+            name, seconds * 1e3, counts[name],
+            "-" if baseline is None else "%.1f" % (baseline * 1e3),
+            "-" if baseline is None else "%.2f" % (seconds / baseline),
+        ))
+    for error in errors:
+        print("STACK: %s" % error)
+    
+    if args.save:
+        save_baselines(dict(baselines, **times), BASELINES)
+        print("\nBaselines saved to %s" % BASELINES)
+    if args.check:
+        regressions = compare(times, baselines, args.tolerance)
+        for name, ratio in regressions.items():
+            print("REGRESSION: %s is %.2fx slower than its baseline" % (name, ratio))
+        if regressions or errors:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# bench_results.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compare the memory kept by the results of execute() as the response's
+dicts and as ExecutionResult, and the time taken to build them.
+
+Usage: python -m benchmarks.bench_results [--results N] [--commands N]
+                                          [--stdout BYTES]"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from sandbox_api import ExecutionResult
+from sandbox_api.codec import default_codec
+
+
+def response(commands: int, stdout: int) -> bytes:
+    """Return the body of a response of execute() with <commands> commands
+    each writing <stdout> bytes."""
+    return default_codec().dumps({
+        "status":     0,
+        "execution":  [{
+            "command":   "./grader --test %d" % i,
+            "exit_code": 0,
+            "stdout":    "x" * stdout,
+            "stderr":    "",
+            "time":      0.012345,
+        } for i in range(commands)],
+        "total_time": 0.123456,
+    }).encode()
+
+
+def measure(body: bytes, results: int, typed: bool):
+    """Decode <body> <results> times, keeping every result, and return the
+    memory they use in bytes and the time taken in seconds."""
+    loads = default_codec().loads
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if typed:
+        kept = [ExecutionResult.from_dict(loads(body)) for _ in range(results)]
+    else:
+        kept = [loads(body) for _ in range(results)]
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return memory, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=20000, help="Number of results kept")
+    parser.add_argument("--commands", type=int, default=5, help="Number of commands per result")
+    parser.add_argument("--stdout", type=int, default=16, help="Size of the output of commands")
+    args = parser.parse_args()
+    
+    body = response(args.commands, args.stdout)
+    print("%d results of %d commands, %d bytes of JSON each\n" % (
+        args.results, args.commands, len(body)
+    ))
+    print("%-16s %14s %14s %12s" % ("", "memory (MB)", "per result (B)", "build (us)"))
+    reference = None
+    for name, typed in (("dict", False), ("ExecutionResult", True)):
+        memory, elapsed = measure(body, args.results, typed)
+        reference = reference or memory
+        print("%-16s %14.2f %14d %12.2f   %.0f%%" % (
+            name, memory / 2 ** 20, memory // args.results, elapsed / args.results * 1e6,
+            memory / reference * 100
+        ))
+
+
+if __name__ == '__main__':
+    main()
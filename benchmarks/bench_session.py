@@ -0,0 +1,46 @@
+# bench_session.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compare the throughput of one connection per request (module-level
+'requests' functions, the behaviour of Sandbox before 1.2.0) against Sandbox's
+pooled keep-alive session.
+
+Usage: python -m benchmarks.bench_session [-n REQUESTS]"""
+
+import argparse
+import time
+
+import requests
+
+from benchmarks.stub import StubServer
+from sandbox_api import Sandbox
+
+
+def bench(n: int, func) -> float:
+    """Call <func> <n> times, returning the number of requests per second."""
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2000, help="Number of requests")
+    args = parser.parse_args()
+    
+    with StubServer() as stub, Sandbox(stub.url) as sandbox:
+        url = sandbox._build_url("usages")
+        before = bench(args.n, lambda: requests.get(url, timeout=60).json())
+        after = bench(args.n, sandbox.usage)
+    
+    print("one connection per request : %8.1f req/s" % before)
+    print("pooled keep-alive session  : %8.1f req/s" % after)
+    print("speedup                    : %8.2fx" % (after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# bench_unix.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure the latency of Sandbox and ASandbox talking to a fake sandbox
+through a Unix domain socket, against the same fake sandbox through the TCP
+loopback.
+
+Two fake sandboxes run in separate processes, one listening on the socket and
+the other on the loopback, so that the client and the servers do not share an
+interpreter. Each case reports the median and the 99th percentile of the
+latency of a request.
+
+Usage: python -m benchmarks.bench_unix [--requests N]"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sandbox_api import ASandbox, Sandbox
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Small execution, answered without spending much time in the fake sandbox.
+CONFIG = {"commands": ["true"]}
+
+
+def free_port() -> int:
+    """Return a free TCP port of the loopback."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 10):
+    """Wait for the sandbox at <url> to answer."""
+    deadline = time.monotonic() + timeout
+    with Sandbox(url) as sandbox:
+        while True:
+            try:
+                sandbox.usage()
+                return
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+
+def start_fake(**arguments: str) -> subprocess.Popen:
+    """Start a fake sandbox in a subprocess with the given command line
+    <arguments>."""
+    command = [sys.executable, "-m", "sandbox_api.testing"]
+    for name, value in arguments.items():
+        command += ["--" + name, value]
+    return subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def sync_latencies(func: Callable[[], object], count: int) -> List[float]:
+    """Return the duration in seconds of <count> calls to <func>, after a
+    warm up."""
+    for _ in range(min(count, 20)):
+        func()
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def async_latencies(func: Callable[[], Awaitable], count: int) -> List[float]:
+    """Asynchronous version of sync_latencies()."""
+    for _ in range(min(count, 20)):
+        await func()
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(urls: Dict[str, str], count: int) -> Dict[str, List[float]]:
+    """Measure the latency of usage() and execute() of both clients against
+    every URL of <urls>, returning the latencies of each case."""
+    results = {}
+    for transport, url in urls.items():
+        with Sandbox(url) as sandbox:
+            results["Sandbox.usage[%s]" % transport] = sync_latencies(sandbox.usage, count)
+            results["Sandbox.execute[%s]" % transport] = sync_latencies(
+                lambda: sandbox.execute(CONFIG, cache=False), count
+            )
+    
+    async def arun():
+        for transport, url in urls.items():
+            async with ASandbox(url) as sandbox:
+                results["ASandbox.usage[%s]" % transport] = await async_latencies(
+                    sandbox.usage, count
+                )
+                results["ASandbox.execute[%s]" % transport] = await async_latencies(
+                    lambda: sandbox.execute(CONFIG, cache=False), count
+                )
+    
+    asyncio.run(arun())
+    return results
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Return the <q> quantile (E.G. 0.99) of <values>."""
+    return statistics.quantiles(values, n=100)[int(q * 100) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="Requests sent per case")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path, port = os.path.join(directory, "sandbox.sock"), free_port()
+        servers = [start_fake(path=path), start_fake(port=str(port))]
+        try:
+            urls = {"tcp": "http://127.0.0.1:%d/" % port, "unix": "unix://" + path}
+            for url in urls.values():
+                wait_for(url)
+            results = run(urls, args.requests)
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+    
+    print("%-28s %10s %10s %8s" % ("case", "p50 (us)", "p99 (us)", "vs tcp"))
+    for name, latencies in results.items():
+        median, ratio = statistics.median(latencies), "-"
+        if name.endswith("[unix]"):
+            tcp = statistics.median(results[name.replace("[unix]", "[tcp]")])
+            ratio = "%.2f" % (median / tcp)
+        print("%-28s %10.1f %10.1f %8s" % (
+            name, median * 1e6, quantile(latencies, 0.99) * 1e6, ratio
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# bench_upload.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure the peak memory (maximum resident set size) of uploading a large
+environment with Sandbox.execute(), streaming it from a file object, a path or
+a generator, against requests.post(files=...) which builds the whole body in
+memory.
+
+Each upload is done in a fresh interpreter, to a local server discarding the
+body, the growth of the peak RSS over the interpreter with everything imported
+being reported.
+
+Usage: python -m benchmarks.bench_upload [--size MB] [--check] [--limit MB]"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Server reading and discarding the body of every POST request, whether it has
+# a Content-Length or a chunked transfer encoding, printing its port.
+SERVER = """
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                self.rfile.read(size + 2)
+                if not size:
+                    break
+        else:
+            remaining = int(self.headers["Content-Length"])
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 2 ** 16)))
+        body = b'{"status": 0, "execution": [], "total_time": 0}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+print(server.server_port, flush=True)
+server.serve_forever()
+"""
+
+# Statement uploading the file <path> to <url> in each case.
+CASES = {
+    "files":            "requests.post(url + 'execute/', data={'config': '{}'}, "
+                        "files={'environment': open(path, 'rb')})",
+    "stream_file":      "sandbox.execute({}, open(path, 'rb'))",
+    "stream_path":      "sandbox.execute({}, path)",
+    "stream_generator": "sandbox.execute({}, iter(lambda f=open(path, 'rb'): f.read(2 ** 16),"
+                        " b''))",
+}
+
+# Run in the fresh interpreter, printing the peak RSS in KiB before and after
+# the upload.
+SCRIPT = """
+import json, resource, requests
+from sandbox_api import Sandbox
+url, path = %r, %r
+sandbox = Sandbox(url)
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+%s
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"before": before, "after": after}))
+"""
+
+
+def run_case(statement: str, url: str, path: str) -> int:
+    """Run <statement> in a fresh interpreter, returning the growth of its
+    peak RSS in bytes."""
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT % (url, path, statement)], check=True,
+        stdout=subprocess.PIPE, cwd=ROOT,
+    ).stdout
+    result = json.loads(output)
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return (result["after"] - result["before"]) * unit
+
+
+def run(size: int) -> Dict[str, int]:
+    """Upload a file of <size> bytes in every case, returning the growth of
+    the peak RSS of each case."""
+    server = subprocess.Popen([sys.executable, "-c", SERVER], stdout=subprocess.PIPE)
+    try:
+        url = "http://127.0.0.1:%d/" % int(server.stdout.readline())
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(os.urandom(2 ** 20) * (size // 2 ** 20))
+            f.flush()
+            return {name: run_case(statement, url, f.name) for name, statement in CASES.items()}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=256, help="Size of the upload in MiB")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if a streaming case exceeded the limit")
+    parser.add_argument("--limit", type=float, default=16,
+                        help="Maximum growth of the peak RSS of streaming cases in MiB "
+                             "(default: 16)")
+    args = parser.parse_args()
+    
+    results = run(args.size * 2 ** 20)
+    print("%-18s %14s" % ("case", "peak RSS (MiB)"))
+    for name, growth in results.items():
+        print("%-18s %14.1f" % (name, growth / 2 ** 20))
+    
+    if args.check:
+        exceeded = {
+            name: growth for name, growth in results.items()
+            if name.startswith("stream") and growth > args.limit * 2 ** 20
+        }
+        for name, growth in exceeded.items():
+            print("EXCEEDED: %s grew the peak RSS by %.1f MiB" % (name, growth / 2 ** 20))
+        if exceeded:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
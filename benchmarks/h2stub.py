@@ -0,0 +1,149 @@
+# h2stub.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""A minimal ASGI application answering the sandbox's endpoints with canned
+responses, served by hypercorn over both HTTP/1.1 and HTTP/2 (h2c with prior
+knowledge) in a separate process, used to benchmark the transports without a
+real sandbox.
+
+'GET /stats/' returns the number of requests and of distinct connections seen
+by the server, by HTTP version, not counting the requests to '/stats/'.
+
+Usage: python -m benchmarks.h2stub [--host HOST] [--port PORT]
+                                  [--delay SECONDS]"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.stub import EXECUTE, USAGE
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+class StubApp:
+    """Answer every GET with <USAGE> and every POST with <EXECUTE>, the
+    latter after <delay> seconds."""
+    
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.requests = defaultdict(int)
+        self.connections = defaultdict(set)
+    
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                await send({"type": message["type"] + ".complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+        
+        if scope["path"] != "/stats/":
+            version = scope["http_version"]
+            self.requests[version] += 1
+            self.connections[version].add(tuple(scope["client"]))
+        more = True
+        while more:
+            more = (await receive()).get("more_body", False)
+        
+        if scope["method"] == "POST":
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            payload = EXECUTE
+        elif scope["path"] == "/stats/":
+            payload = {
+                "requests":    dict(self.requests),
+                "connections": {v: len(c) for v, c in self.connections.items()},
+            }
+        else:
+            payload = USAGE
+        body = json.dumps(payload).encode()
+        await send({
+            "type":    "http.response.start",
+            "status":  200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+
+class H2StubServer:
+    """Run a StubApp with hypercorn in a subprocess.
+    
+    Can be used as a context manager, the server's URL is available in the
+    'url' attribute. Executions take <delay> seconds, simulating the run of
+    the commands."""
+    
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        if not port:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.host, self.port, self.delay = host, port, delay
+        self.url = "http://%s:%d/" % (host, port)
+        self.process = None
+    
+    
+    def __enter__(self):
+        self.process = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.h2stub", "--host", self.host,
+            "--port", str(self.port), "--delay", str(self.delay),
+        ], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection((self.host, self.port)).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.process.kill()
+                    raise RuntimeError("The HTTP/2 stub server did not start")
+                time.sleep(0.05)
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.terminate()
+        self.process.wait()
+
+
+def main():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Duration of each execution in seconds")
+    args = parser.parse_args()
+    
+    config = Config()
+    config.bind = ["%s:%d" % (args.host, args.port)]
+    config.backlog = 4096
+    config.keep_alive_timeout = 60
+    # Hypercorn closes a connection after 1000 requests by default, failing the
+    # streams still in flight on it
+    config.keep_alive_max_requests = 2 ** 31
+    config.accesslog = config.errorlog = None
+    asyncio.run(serve(StubApp(args.delay), config))
+
+
+if __name__ == '__main__':
+    main()
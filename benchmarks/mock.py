@@ -0,0 +1,213 @@
+# mock.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""In-process transports answering the requests of Sandbox and ASandbox with
+canned responses, without any socket, so that only the overhead of the client
+is measured."""
+
+import datetime
+import io
+import json
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from yarl import URL
+
+from sandbox_api import ASandbox, Sandbox
+from sandbox_api.instrumentation import endpoint_name
+
+
+# Status, headers and body of a response.
+Answer = Tuple[int, Dict[str, str], bytes]
+
+# Return the answer to a request from its method, endpoint and URL.
+Handler = Callable[[str, str, str], Answer]
+
+
+
+class MockTransport:
+    """Answer requests according to <routes>, mapping the name of an endpoint
+    (see endpoint_name()) to either an Answer or a Handler. Endpoints missing
+    from <routes> are answered with a 404.
+    
+    * requests : Number of requests answered.
+    * sent : Number of bytes of the bodies of the requests.
+    """
+    
+    
+    def __init__(self, base_url: str, routes: Dict[str, Union[Answer, Handler]]):
+        self.base_url = base_url
+        self.routes = routes
+        self.requests = 0
+        self.sent = 0
+    
+    
+    @staticmethod
+    def json(payload, status: int = 200) -> Answer:
+        """Return the answer sending <payload> as JSON."""
+        body = json.dumps(payload).encode()
+        return status, {"Content-Type": "application/json", "Content-Length": str(len(body))}, body
+    
+    
+    @staticmethod
+    def raw(body: bytes, status: int = 200) -> Answer:
+        """Return the answer sending <body> as an octet stream."""
+        return status, {
+            "Content-Type":   "application/octet-stream",
+            "Content-Length": str(len(body)),
+        }, body
+    
+    
+    def answer(self, method: str, url: str, sent: int) -> Answer:
+        """Return the answer to a request of <sent> bytes."""
+        self.requests += 1
+        self.sent += sent
+        endpoint = endpoint_name(self.base_url, url)
+        route = self.routes.get(endpoint)
+        if route is None:
+            return 404, {"Content-Length": "0"}, b""
+        return route(method, endpoint, url) if callable(route) else route
+
+
+
+class MockAdapter(BaseAdapter):
+    """A requests transport adapter answering through a MockTransport."""
+    
+    
+    def __init__(self, transport: MockTransport):
+        super().__init__()
+        self.transport = transport
+    
+    
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None,
+             verify=True, cert=None, proxies=None) -> requests.Response:
+        body = request.body
+        if body is None:
+            sent = 0
+        elif isinstance(body, (bytes, str)):
+            sent = len(body)
+        else:
+            sent = sum(len(chunk) for chunk in body)
+        status, headers, content = self.transport.answer(request.method, request.url, sent)
+        
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.raw = io.BytesIO(content)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(0)
+        response.connection = self
+        return response
+    
+    
+    def close(self):
+        pass
+
+
+
+class _NullWriter:
+    """Stream writer discarding what is written, counting its size."""
+    
+    
+    def __init__(self):
+        self.size = 0
+    
+    
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+
+
+
+class MockStream:
+    """The part of aiohttp.StreamReader used by ASandbox."""
+    
+    
+    def __init__(self, body: bytes):
+        self._body = body
+    
+    
+    async def iter_chunked(self, n: int):
+        for i in range(0, len(self._body), n):
+            yield self._body[i:i + n]
+
+
+
+class MockResponse:
+    """The part of aiohttp.ClientResponse used by ASandbox."""
+    
+    
+    def __init__(self, answer: Answer, url: str):
+        self.status, headers, self._body = answer
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self.url = URL(url)
+        self.content_length = len(self._body)
+        self.content = MockStream(self._body)
+    
+    
+    async def __aenter__(self):
+        return self
+    
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+    
+    
+    async def read(self) -> bytes:
+        return self._body
+    
+    
+    async def json(self):
+        return json.loads(self._body)
+    
+    
+    def release(self):
+        pass
+    
+    
+    def close(self):
+        pass
+
+
+
+class MockSession:
+    """The part of aiohttp.ClientSession used by ASandbox, answering through
+    a MockTransport. FormData bodies are fully serialized, as aiohttp
+    would."""
+    
+    
+    def __init__(self, transport: MockTransport):
+        self.transport = transport
+        self.closed = False
+    
+    
+    async def request(self, method: str, url: str, data=None, headers: Optional[dict] = None,
+                      **kwargs) -> MockResponse:
+        sent = 0
+        if isinstance(data, aiohttp.FormData):
+            writer = _NullWriter()
+            await data().write(writer)
+            sent = writer.size
+        elif data is not None:
+            sent = len(data)
+        return MockResponse(self.transport.answer(method, str(url), sent), str(url))
+    
+    
+    async def close(self):
+        self.closed = True
+
+
+
+def mock_sandbox(sandbox: Union[Sandbox, ASandbox], transport: MockTransport):
+    """Make <sandbox> send its requests through <transport>."""
+    if isinstance(sandbox, Sandbox):
+        sandbox.session.mount(sandbox.url, MockAdapter(transport))
+    else:
+        sandbox._session = MockSession(transport)
@@ -0,0 +1,104 @@
+# stub.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""A minimal threaded HTTP/1.1 server answering the sandbox's endpoints with
+canned responses, used to benchmark the client without a real sandbox."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+USAGE = {
+    "cpu":       {"frequency": 800.0, "usage": 0.085, "usage_avg": [0.10, 0.09, 0.07]},
+    "memory":    {"ram": 5376819200, "swap": 0, "storage": {"/dev/sda2": 60275105792}},
+    "io":        {"read_iops": {}, "read_bps": {}, "write_iops": {}, "write_bps": {}},
+    "network":   {"sent_bytes": 514, "received_bytes": 526, "sent_packets": 6,
+                  "received_packets": 6},
+    "process":   326,
+    "container": 0,
+}
+
+EXECUTE = {
+    "status":     0,
+    "execution":  [{
+        "command":   "echo $((2+2))",
+        "exit_code": 0,
+        "stdout":    "4",
+        "stderr":    "",
+        "time":      0.001,
+    }],
+    "total_time": 0.001,
+}
+
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answer every GET with <USAGE> and every POST with <EXECUTE>, the
+    latter after <delay> seconds."""
+    
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delay = 0.0
+    
+    
+    def log_message(self, *args):
+        pass
+    
+    
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    
+    def do_GET(self):
+        self._send_json(USAGE)
+    
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.delay:
+            time.sleep(self.delay)
+        self._send_json(EXECUTE)
+
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """Threaded server accepting many concurrent connections."""
+    
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+
+class StubServer:
+    """Run a StubHandler server in a background thread.
+    
+    Can be used as a context manager, the server's URL is available in the
+    'url' attribute. Executions take <delay> seconds, simulating the run of
+    the commands."""
+    
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        handler = type("StubHandler", (StubHandler,), {"delay": delay})
+        self.server = StubHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.url = "http://%s:%d/" % self.server.server_address
+    
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
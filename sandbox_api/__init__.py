@@ -4,6 +4,10 @@
 #   - Coumes Quentin <coumes.quentin@gmail.com>
 
 
+import importlib
+from typing import TYPE_CHECKING
+
+from . import exceptions
 from .enums import SandboxErrCode
 from .exceptions import (Sandbox300, Sandbox301, Sandbox302, Sandbox303, Sandbox304, Sandbox305,
                          Sandbox307, Sandbox308, Sandbox400, Sandbox401, Sandbox402, Sandbox403,
@@ -12,10 +16,84 @@ from .exceptions import (Sandbox300, Sandbox301, Sandbox302, Sandbox303, Sandbox
                          Sandbox416, Sandbox417, Sandbox421, Sandbox422, Sandbox423, Sandbox424,
                          Sandbox426, Sandbox428, Sandbox429, Sandbox431, Sandbox451, Sandbox500,
                          Sandbox501, Sandbox502, Sandbox503, Sandbox504, Sandbox505, Sandbox506,
-                         Sandbox507, Sandbox508, Sandbox510, Sandbox511, SandboxError,
+                         Sandbox507, Sandbox508, Sandbox510, Sandbox511, SandboxBusy,
+                         SandboxCircuitOpen, SandboxError, SandboxUnavailable,
                          status_exceptions)
-from .sandbox import Sandbox
-from .asandbox import ASandbox
 
 
-VERSION = __version__ = "1.1.0"
+# Everything but the exceptions is imported on first access, so that the
+# synchronous clients do not load aiohttp, the asynchronous ones do not load
+# requests, and neither loads the modules of unused features.
+_LAZY = {
+    "AdmissionLimiter":      ".admission",
+    "AsyncAdmissionLimiter": ".admission",
+    "BatchResult":           ".batch",
+    "ResultCache":           ".cache",
+    "JSONCodec":             ".codec",
+    "Compression":           ".compression",
+    "EnvironmentCache":      ".envcache",
+    "EnvironmentBuilder":    ".environment",
+    "HistogramSink":         ".instrumentation",
+    "Instrumentation":       ".instrumentation",
+    "LoggingSink":           ".instrumentation",
+    "Sink":                  ".instrumentation",
+    "MetadataCache":         ".metacache",
+    "MetricsSink":           ".metrics",
+    "serve_metrics":         ".metrics",
+    "UsageMonitor":          ".monitor",
+    "UsageSeries":           ".monitor",
+    "CommandResult":         ".results",
+    "ExecutionResult":       ".results",
+    "CircuitBreaker":        ".retry",
+    "RetryPolicy":           ".retry",
+    "HTTP2Transport":        ".transport",
+    "Transport":             ".transport",
+    "Sandbox":               ".sandbox",
+    "ASandbox":              ".asandbox",
+    "SandboxCluster":        ".cluster",
+    "ASandboxCluster":       ".acluster",
+}
+
+# The lazy names are listed explicitly, 'from sandbox_api import *' would
+# otherwise only export the names already loaded.
+__all__ = [
+    "SandboxErrCode", "status_exceptions", "VERSION",
+    *(name for name in dir(exceptions) if name.startswith("Sandbox")),
+    *_LAZY,
+]
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .admission import AdmissionLimiter, AsyncAdmissionLimiter
+    from .batch import BatchResult
+    from .cache import ResultCache
+    from .codec import JSONCodec
+    from .compression import Compression
+    from .envcache import EnvironmentCache
+    from .environment import EnvironmentBuilder
+    from .instrumentation import HistogramSink, Instrumentation, LoggingSink, Sink
+    from .metacache import MetadataCache
+    from .metrics import MetricsSink, serve_metrics
+    from .monitor import UsageMonitor, UsageSeries
+    from .results import CommandResult, ExecutionResult
+    from .retry import CircuitBreaker, RetryPolicy
+    from .transport import HTTP2Transport, Transport
+    from .sandbox import Sandbox
+    from .asandbox import ASandbox
+    from .cluster import SandboxCluster
+    from .acluster import ASandboxCluster
+
+
+def __getattr__(name: str):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+VERSION = __version__ = "1.2.0"
@@ -0,0 +1,157 @@
+# acluster.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""An asynchronous client dispatching requests between several sandboxes."""
+
+import asyncio
+import time
+from contextlib import AbstractAsyncContextManager
+from typing import BinaryIO, Iterable, List, Optional, Union
+
+import aiohttp
+
+from .asandbox import ASandbox
+from .balancer import Balancer, Node
+from .exceptions import SandboxError, SandboxUnavailable, get_status_code
+from .results import saved_environment
+
+
+class ASandboxCluster(AbstractAsyncContextManager):
+    """Interface several Sandbox servers asynchronously, sending each
+    execution to the sandbox with the most free containers."""
+    
+    
+    def __init__(self, sandboxes: Iterable[Union[str, ASandbox]], poll_interval: float = 5.0,
+                 max_failures: int = 3, cooldown: float = 30.0, **kwargs):
+        """Initialize a cluster with the given sandboxes.
+        
+        <sandboxes> can contain URLs or already created ASandbox instances,
+        <kwargs> are given to ASandbox when it is created from an URL.
+        
+        The usage of every sandbox is polled at most once every
+        <poll_interval> seconds. A sandbox is taken out of rotation for
+        <cooldown> seconds when it fails a health check, or when
+        <max_failures> consecutive requests failed with a connection error or
+        a 5xx status code."""
+        self.balancer = Balancer(
+            [ASandbox(s, **kwargs) if isinstance(s, str) else s for s in sandboxes],
+            max_failures, cooldown
+        )
+        self.poll_interval = poll_interval
+        self._refreshed_at = None
+        self._refresh_lock = None
+    
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    
+    async def close(self):
+        """Close every sandbox of the cluster."""
+        await asyncio.gather(*(node.sandbox.close() for node in self.nodes))
+    
+    
+    @property
+    def nodes(self) -> List[Node]:
+        return self.balancer.nodes
+    
+    
+    async def _poll(self, node: Node):
+        """Health check <node>, updating its usage or taking it out of
+        rotation."""
+        try:
+            specifications = None
+            if node.containers is None:
+                specifications = await node.sandbox.specifications()
+            usage = await node.sandbox.usage()
+        except (aiohttp.ClientError, asyncio.TimeoutError, SandboxError):
+            self.balancer.mark_down(node)
+        else:
+            self.balancer.update(node, usage, specifications)
+    
+    
+    async def refresh(self):
+        """Asynchronously poll the usage of every sandbox of the cluster."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            await asyncio.gather(*(self._poll(node) for node in self.nodes))
+            self._refreshed_at = time.monotonic()
+    
+    
+    async def _maybe_refresh(self):
+        """Refresh the cluster if its usage is older than <poll_interval>.
+        
+        Only the first call will wait for the refresh if another coroutine is
+        already refreshing the cluster."""
+        if (self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.poll_interval):
+            return
+        if self._refreshed_at is None or not self._refresh_lock.locked():
+            await self.refresh()
+    
+    
+    async def _locate(self, uuid: str) -> Node:
+        """Return the node storing the environment <uuid>."""
+        node = self.balancer.owner(uuid)
+        if node is not None:
+            return node
+        for node in self.balancer.up():
+            try:
+                if await node.sandbox.check(uuid):
+                    self.balancer.remember(uuid, node)
+                    return node
+            except (aiohttp.ClientError, asyncio.TimeoutError, SandboxError):
+                continue
+        raise SandboxUnavailable("Environment '%s' was not found in the cluster" % uuid)
+    
+    
+    async def download(self, uuid: str, path: str = None) -> BinaryIO:
+        """Asynchronously download an environment or a specific file inside an
+        environment from the sandbox storing it."""
+        return await (await self._locate(uuid)).sandbox.download(uuid, path)
+    
+    
+    async def check(self, uuid: str, path: str = None) -> int:
+        """Asynchronously return the size of an environment or a specific file,
+        0 if it was not found on any sandbox of the cluster."""
+        try:
+            return await (await self._locate(uuid)).sandbox.check(uuid, path)
+        except SandboxUnavailable:
+            return 0
+    
+    
+    async def execute(self, config: Union[dict], environ: Optional[BinaryIO] = None) -> dict:
+        """Asynchronously execute commands on the least loaded sandbox according
+        to <config> and <environ>, returning the response's json as a dict.
+        
+        If <config> uses an environment created through the cluster, the
+        execution is sent to the sandbox storing it.
+        
+        <environ>, if not None, will be consumed and closed and shall not be
+        used further."""
+        await self._maybe_refresh()
+        uuid = config.get("environment") if isinstance(config, dict) else None
+        node = self.balancer.acquire(uuid)
+        try:
+            result = await node.sandbox.execute(config, environ)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.balancer.release(node, failed=True)
+            raise
+        except SandboxError as e:
+            self.balancer.release(
+                node, failed=e.response is not None and get_status_code(e.response) >= 500
+            )
+            raise
+        except BaseException:
+            self.balancer.release(node)
+            raise
+        
+        self.balancer.release(node)
+        environment = saved_environment(result)
+        if environment is not None:
+            self.balancer.remember(environment, node)
+        return result
@@ -0,0 +1,207 @@
+# admission.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Client-side admission control, limiting the number of executions in
+flight to the number of containers of the sandbox."""
+
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from .exceptions import SandboxBusy
+
+
+class BaseAdmissionLimiter:
+    """Statistics and sizing shared by both admission limiters.
+    
+    * capacity : Maximum number of executions in flight, None means that the
+            limiter is not sized yet and admits everything.
+    * timeout : Maximum time in seconds an execution waits to be admitted,
+            None waits indefinitely.
+    * max_queue : Maximum number of executions waiting to be admitted, None
+            means no limit.
+    """
+    
+    
+    def __init__(self, capacity: Optional[int] = None, timeout: Optional[float] = None,
+                 max_queue: Optional[int] = None):
+        self.capacity = capacity
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+    
+    
+    def __repr__(self):
+        return "<%s capacity=%s in_flight=%d queue_depth=%d>" % (
+            type(self).__name__, self.capacity, self.in_flight, self.queue_depth
+        )
+    
+    
+    @property
+    def mean_wait_time(self) -> float:
+        """Mean time in seconds an admitted execution waited."""
+        return self.wait_time / self.admitted if self.admitted else 0.0
+    
+    
+    def stats(self) -> dict:
+        """Return the statistics of the limiter as a dict."""
+        return {
+            "capacity":       self.capacity,
+            "in_flight":      self.in_flight,
+            "queue_depth":    self.queue_depth,
+            "admitted":       self.admitted,
+            "rejected":       self.rejected,
+            "wait_time":      self.wait_time,
+            "mean_wait_time": self.mean_wait_time,
+            "max_wait_time":  self.max_wait_time,
+        }
+    
+    
+    def _has_room(self) -> bool:
+        return self.capacity is None or self.in_flight < self.capacity
+    
+    
+    def _check_queue(self):
+        """Raise SandboxBusy if the queue is full."""
+        if self.max_queue is not None and self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise SandboxBusy("Admission queue is full (%d waiting)" % self.queue_depth)
+    
+    
+    def _admit(self, start: float):
+        waited = time.monotonic() - start
+        self.in_flight += 1
+        self.admitted += 1
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+    
+    
+    def _reject(self, start: float):
+        self.rejected += 1
+        raise SandboxBusy(
+            "Execution was not admitted after %.3f seconds" % (time.monotonic() - start)
+        )
+
+
+
+class AdmissionLimiter(BaseAdmissionLimiter):
+    """A thread-safe admission limiter, to be used as a context manager around
+    an execution."""
+    
+    
+    def __init__(self, capacity: Optional[int] = None, timeout: Optional[float] = None,
+                 max_queue: Optional[int] = None):
+        super().__init__(capacity, timeout, max_queue)
+        self._condition = threading.Condition()
+    
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+    
+    
+    def resize(self, capacity: Optional[int]):
+        """Set the capacity of the limiter, waking up waiting executions if it
+        grew."""
+        with self._condition:
+            self.capacity = capacity
+            self._condition.notify_all()
+    
+    
+    def acquire(self):
+        """Wait for a free slot, raising SandboxBusy if none is available
+        within <timeout> or if the queue is full."""
+        start = time.monotonic()
+        with self._condition:
+            if not self._has_room():
+                self._check_queue()
+                self.queue_depth += 1
+                try:
+                    admitted = self._condition.wait_for(self._has_room, self.timeout)
+                finally:
+                    self.queue_depth -= 1
+                if not admitted:
+                    self._reject(start)
+            self._admit(start)
+    
+    
+    def release(self):
+        """Free the slot taken by acquire()."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+
+class AsyncAdmissionLimiter(BaseAdmissionLimiter):
+    """An asyncio admission limiter, to be used as an asynchronous context
+    manager around an execution."""
+    
+    
+    def __init__(self, capacity: Optional[int] = None, timeout: Optional[float] = None,
+                 max_queue: Optional[int] = None):
+        super().__init__(capacity, timeout, max_queue)
+        self._condition = None
+    
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+    
+    
+    @property
+    def condition(self) -> asyncio.Condition:
+        """The asyncio Condition guarding the limiter, created inside the
+        running event loop on first access."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+    
+    
+    async def resize(self, capacity: Optional[int]):
+        """Set the capacity of the limiter, waking up waiting executions if it
+        grew."""
+        async with self.condition:
+            self.capacity = capacity
+            self.condition.notify_all()
+    
+    
+    async def acquire(self):
+        """Wait for a free slot, raising SandboxBusy if none is available
+        within <timeout> or if the queue is full."""
+        start = time.monotonic()
+        async with self.condition:
+            if not self._has_room():
+                self._check_queue()
+                self.queue_depth += 1
+                try:
+                    await asyncio.wait_for(self.condition.wait_for(self._has_room), self.timeout)
+                except asyncio.TimeoutError:
+                    self._reject(start)
+                finally:
+                    self.queue_depth -= 1
+            self._admit(start)
+    
+    
+    async def release(self):
+        """Free the slot taken by acquire()."""
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
@@ -0,0 +1,220 @@
+# ahttp2.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Send the requests of ASandbox over HTTP/2 with httpx, see
+transport.HTTP2Transport.
+
+HTTP2Session provides the part of aiohttp.ClientSession used by ASandbox.
+Errors of httpx are raised as the corresponding exceptions of aiohttp."""
+
+import asyncio
+import contextlib
+from types import SimpleNamespace
+from typing import AsyncIterator, Optional, Set, Union
+
+import aiohttp
+import httpx
+from aiohttp.payload import Payload
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+
+# Bodies of at most this size are sent in a single DATA frame sequence
+# instead of being streamed.
+SMALL_BODY = 2 ** 16
+
+# Body of a request, as sent by ASandbox.
+Data = Union[None, bytes, aiohttp.FormData, Payload]
+
+
+@contextlib.contextmanager
+def _aiohttp_errors(url: str):
+    """Raise the errors of httpx as the corresponding aiohttp exceptions."""
+    try:
+        yield
+    except (httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+        error = getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ServerTimeoutError)
+        raise error(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise aiohttp.ServerTimeoutError(str(e)) from e
+    except httpx.ConnectError as e:
+        url = URL(url)
+        key = SimpleNamespace(host=url.host, port=url.port, ssl=url.scheme == "https")
+        raise aiohttp.ClientConnectorError(key, OSError(0, str(e))) from e
+    except httpx.TransportError as e:
+        raise aiohttp.ClientConnectionError(str(e)) from e
+
+
+
+class _StreamReader:
+    """The part of aiohttp.StreamReader used by ASandbox."""
+    
+    
+    def __init__(self, response: httpx.Response, url: str):
+        self._response = response
+        self._url = url
+    
+    
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        with _aiohttp_errors(self._url):
+            async for chunk in self._response.aiter_bytes(n):
+                yield chunk
+
+
+
+class HTTP2Response:
+    """The part of aiohttp.ClientResponse used by ASandbox, wrapping an httpx
+    response. The tasks closing it in the background are added to
+    <closing>."""
+    
+    
+    def __init__(self, response: httpx.Response, url: str, closing: Set[asyncio.Task]):
+        self._response = response
+        self._closing = closing
+        self.status = response.status_code
+        self.headers = CIMultiDictProxy(CIMultiDict(response.headers.multi_items()))
+        self.url = URL(url)
+        length = self.headers.get("Content-Length")
+        self.content_length = int(length) if length is not None else None
+        self.content = _StreamReader(response, url)
+    
+    
+    def __repr__(self):
+        return "<HTTP2Response %d %s>" % (self.status, self.url)
+    
+    
+    async def __aenter__(self):
+        return self
+    
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._response.aclose()
+    
+    
+    async def read(self) -> bytes:
+        with _aiohttp_errors(str(self.url)):
+            return await self._response.aread()
+    
+    
+    def release(self):
+        """Close the response in the background, as aiohttp's release() is
+        not a coroutine."""
+        if not self._response.is_closed:
+            task = asyncio.ensure_future(self._response.aclose())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+    
+    
+    def close(self):
+        self.release()
+
+
+
+class _BufferWriter(list):
+    """Collect the chunks written by a Payload."""
+    
+    async def write(self, chunk: bytes):
+        self.append(bytes(chunk))
+
+
+
+async def _payload_chunks(payload: Payload) -> AsyncIterator[bytes]:
+    """Yield the chunks written by <payload>, as aiohttp would send them."""
+    queue = asyncio.Queue(maxsize=4)
+    
+    class Writer:
+        
+        async def write(self, chunk: bytes):
+            await queue.put(bytes(chunk))
+    
+    async def produce():
+        try:
+            await payload.write(Writer())
+        finally:
+            await queue.put(None)
+    
+    task = asyncio.ensure_future(produce())
+    try:
+        chunk = await queue.get()
+        while chunk is not None:
+            yield chunk
+            chunk = await queue.get()
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+
+class HTTP2Session:
+    """The part of aiohttp.ClientSession used by ASandbox, sending the
+    requests through an httpx.AsyncHTTPTransport created with <options> and
+    multiplexing them over HTTP/2 connections.
+    
+    * timeout : The aiohttp.ClientTimeout of the requests, its 'total'
+            applying to each phase not otherwise limited.
+    * headers : Headers sent with every request.
+    """
+    
+    
+    def __init__(self, options: dict, timeout: Optional[aiohttp.ClientTimeout] = None,
+                 headers: Optional[dict] = None):
+        self.transport = httpx.AsyncHTTPTransport(**options)
+        self.headers = dict(headers or {})
+        self.timeout = {}
+        if timeout is not None:
+            connect = timeout.sock_connect or timeout.connect or timeout.total
+            read = timeout.sock_read or timeout.total
+            self.timeout = {
+                "connect": connect, "read": read, "write": timeout.total,
+                "pool": timeout.connect or timeout.total,
+            }
+        self._closing = set()
+        self.closed = False
+    
+    
+    async def request(self, method: str, url: str, data: Data = None,
+                      headers: Optional[dict] = None, **kwargs) -> HTTP2Response:
+        """Send a request, returning its response once its headers are
+        received. The 'trace_request_ctx' of aiohttp is ignored."""
+        headers = CIMultiDict(self.headers, **(headers or {}))
+        content = data
+        if isinstance(data, aiohttp.FormData):
+            data = data()
+        if isinstance(data, Payload):
+            headers.setdefault("Content-Type", data.content_type)
+            if data.size is None:
+                content = _payload_chunks(data)
+            else:
+                headers["Content-Length"] = str(data.size)
+                if data.size <= SMALL_BODY:
+                    buffer = _BufferWriter()
+                    await data.write(buffer)
+                    content = b"".join(buffer)
+                else:
+                    content = _payload_chunks(data)
+        request = httpx.Request(
+            method, url, headers=list(headers.items()), content=content,
+            extensions={"timeout": self.timeout}
+        )
+        with _aiohttp_errors(url):
+            response = await self.transport.handle_async_request(request)
+        response.request = request
+        return HTTP2Response(response, url, self._closing)
+    
+    
+    async def close(self):
+        """Wait for the responses being released, then close the
+        transport."""
+        await asyncio.gather(*self._closing, return_exceptions=True)
+        await self.transport.aclose()
+        self.closed = True
+    
+    
+    def detach(self):
+        """Mark the session as closed without closing its transport, as
+        aiohttp.ClientSession.detach()."""
+        self.closed = True
@@ -6,16 +6,71 @@
 
 """An asynchronous implementation of the Sandbox API."""
 
+import asyncio
+import functools
 import io
-import json
 import os
+import time
 from contextlib import AbstractAsyncContextManager
-from typing import BinaryIO, Optional, Union
+from typing import Any, AsyncIterator, BinaryIO, Callable, Iterable, List, Optional, Tuple, Union
 
 import aiohttp
+from aiohttp import compression_utils
+from aiohttp.abc import AbstractStreamWriter
+from aiohttp.payload import Payload
+
+from .admission import AsyncAdmissionLimiter
+from .batch import BatchItem, BatchResult, ProgressCallback, aexecute_many
+from .cache import ResultCache, result_key
+from .codec import JSONCodec, get_codec
+from .compression import Compression
+from .envcache import EnvironmentCache
+from .environment import EnvironmentBuilder, EnvironmentReader
+from .exceptions import Sandbox404, SandboxBusy, status_exceptions
+from .instrumentation import Instrumentation, RequestTiming, endpoint_name, trace_phases
+from .metacache import MetadataCache
+from .multipart import Field
+from .results import ExecutionResult
+from .retry import CircuitBreaker, Rewinder, RetryPolicy
+from .transport import Transport, get_transport
+from .utils import (ENDPOINTS, ChunkSlicer, base_url, file_digest, range_header,
+                    resolve_option, split_segments, unix_socket_path)
+
+
+# Exceptions raised when the connection could not be established.
+CONNECT_ERRORS = tuple(
+    e for e in (aiohttp.ClientConnectorError, getattr(aiohttp, "ConnectionTimeoutError", None))
+    if e is not None
+)
+
+# Whether aiohttp can decode zstd responses.
+HAS_ZSTD = getattr(compression_utils, "HAS_ZSTD", False)
+
+
+class EnvironmentPayload(Payload):
+    """Stream the archive of an EnvironmentBuilder, compressing it in the
+    default executor so that the event loop is not blocked."""
+    
+    
+    def __init__(self, value: EnvironmentBuilder, *args, **kwargs):
+        kwargs.setdefault("content_type", "application/gzip")
+        super().__init__(value, *args, **kwargs)
+        if value.sized:
+            self._size = value.size()
+    
+    
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        raise TypeError("Environment archives cannot be decoded")
+    
+    
+    async def write(self, writer: AbstractStreamWriter):
+        loop = asyncio.get_running_loop()
+        chunks = self._value.chunks()
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        while chunk is not None:
+            await writer.write(chunk)
+            chunk = await loop.run_in_executor(None, next, chunks, None)
 
-from .exceptions import status_exceptions
-from .utils import ENDPOINTS
 
 
 class ASandbox(AbstractAsyncContextManager):
@@ -23,9 +78,28 @@ class ASandbox(AbstractAsyncContextManager):
     
     
     def __init__(self, url: str, total: Optional[float] = 60, connect: Optional[float] = None,
-                 sock_connect: Optional[float] = None, sock_read: Optional[float] = None):
+                 sock_connect: Optional[float] = None, sock_read: Optional[float] = None,
+                 limit: int = 100, limit_per_host: int = 0,
+                 keepalive_timeout: Optional[float] = None, ttl_dns_cache: Optional[int] = 10,
+                 connector: Optional[aiohttp.BaseConnector] = None,
+                 admission: Union[bool, AsyncAdmissionLimiter, None] = None,
+                 retry: Union[bool, RetryPolicy, None] = None,
+                 circuit_breaker: Union[bool, CircuitBreaker, None] = None,
+                 env_cache: Union[bool, EnvironmentCache, None] = None,
+                 result_cache: Union[bool, ResultCache, None] = None,
+                 metadata_cache: Union[bool, MetadataCache, None] = None,
+                 instrumentation: Union[bool, Instrumentation, None] = None,
+                 compression: Union[bool, Compression, None] = None,
+                 transport: Union[str, Transport, None] = None,
+                 codec: Union[str, JSONCodec, None] = None, typed: bool = False,
+                 chunk_size: int = 2 ** 16):
         """Initialize a sandbox with the given URL.
         
+        <url> can also be 'unix://' followed by the path of the Unix domain
+        socket the sandbox listens on, E.G. 'unix:///run/sandbox.sock', for a
+        sandbox running on the same host. An aiohttp.UnixConnector is then
+        created, <ttl_dns_cache> being ignored.
+        
         Default timeout for the whole operation is one minute, use the following
         argument to override :
             
@@ -38,11 +112,128 @@ class ASandbox(AbstractAsyncContextManager):
                     connection, not given from a pool.
             * sock_read : The maximum allowed timeout for period between reading
                     a new data portion from a peer.
-        """
+        
+        The connection pool can be tuned with the following arguments :
+            
+            * limit : The total number of simultaneous connections, 0 means no
+                    limit.
+            * limit_per_host : The number of simultaneous connections to the
+                    same host, 0 means no limit.
+            * keepalive_timeout : How long an idle connection is kept alive,
+                    aiohttp's default (15 seconds) is used if None.
+            * ttl_dns_cache : How long resolved DNS entries are cached, None
+                    caches them forever.
+            * connector : A connector to use instead of creating one. Such a
+                    connector can be shared between several instances and will
+                    not be closed by close(), the options above are then
+                    ignored.
+        
+        The underlying aiohttp.ClientSession is created on first use, inside
+        the running event loop, so an ASandbox can safely be instantiated
+        outside of any coroutine.
+        
+        If <admission> is True or an AsyncAdmissionLimiter, the number of
+        executions in flight is limited to the number of containers of the
+        sandbox, excess executions waiting on the client. A limiter created
+        without capacity is sized from the sandbox's specifications on the
+        first execution.
+        
+        If <retry> is True or a RetryPolicy, failed requests are retried
+        according to the policy. If <circuit_breaker> is True or a
+        CircuitBreaker, requests fail fast with SandboxCircuitOpen while the
+        sandbox is recovering.
+        
+        If <env_cache> is True or an EnvironmentCache, environments given to
+        execute() are uploaded once and reused afterward, see execute().
+        
+        If <result_cache> is True or a ResultCache, the results of execute()
+        are cached, see execute().
+        
+        If <metadata_cache> is True or a MetadataCache, the responses of
+        specifications() and libraries() are cached and refreshed once stale.
+        
+        If <instrumentation> is True or an Instrumentation, the timings of
+        every request are recorded and passed to its sinks, using an aiohttp
+        TraceConfig.
+        
+        If <compression> is True or a Compression, the bodies of executions
+        without environment and of the loaders are compressed once
+        larger than its threshold, and responses are requested compressed
+        with zstd when it can be decoded, see Compression.
+        
+        <transport> is the Transport, or the name of one ('http1' or 'http2'),
+        through which requests are sent. Defaults to HTTP/1.1 through aiohttp's
+        connectors, 'http2' multiplexes requests over a single HTTP/2
+        connection instead of using one connection per request in flight,
+        see HTTP2Transport.
+        
+        <codec> is the JSONCodec, or the name of one ('orjson', 'ujson' or
+        'json'), encoding the configs and decoding the responses. Defaults to
+        the fastest installed, see default_codec().
+        
+        If <typed> is True, execute() returns an ExecutionResult instead of
+        the response's dict.
+        
+        <chunk_size> is the default size of the chunks read by
+        iter_download() and download_to()."""
         self.url = url
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total, connect, sock_connect, sock_read)
-        )
+        self.base_url = base_url(url)
+        self.socket_path = unix_socket_path(url)
+        self.timeout = aiohttp.ClientTimeout(total, connect, sock_connect, sock_read)
+        self.connector = connector
+        self.connector_options = {
+            "limit":          limit,
+            "limit_per_host": limit_per_host,
+            "ttl_dns_cache":  ttl_dns_cache,
+        }
+        if keepalive_timeout is not None:
+            self.connector_options["keepalive_timeout"] = keepalive_timeout
+        self._session = None
+        self._session_loop = None
+        self.admission = resolve_option(admission, AsyncAdmissionLimiter)
+        self.retry = resolve_option(retry, RetryPolicy)
+        self.circuit_breaker = resolve_option(circuit_breaker, CircuitBreaker)
+        self.env_cache = resolve_option(env_cache, EnvironmentCache)
+        self.result_cache = resolve_option(result_cache, ResultCache)
+        self.metadata_cache = resolve_option(metadata_cache, MetadataCache)
+        self.instrumentation = resolve_option(instrumentation, Instrumentation)
+        self.compression = resolve_option(compression, Compression)
+        self.transport = get_transport(transport)
+        self.codec = get_codec(codec)
+        self.typed = typed
+        self._refresh_tasks = set()
+        self.chunk_size = chunk_size
+    
+    
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The aiohttp ClientSession used to send requests, created by the
+        transport on first access.
+        
+        The session is bound to the running event loop, it is replaced when
+        accessed from another loop (e.g. across several asyncio.run()).
+        Raise RuntimeError if the connector given at initialization was used
+        in another loop."""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and self._session_loop is not loop:
+            if self.connector is not None:
+                raise RuntimeError(
+                    "The connector of this ASandbox is bound to another event loop, use a "
+                    "connector per event loop"
+                )
+            self._drop_session()
+        if self._session is None or self._session.closed:
+            self._session = self.transport.session(self)
+            self._session_loop = loop
+        return self._session
+    
+    
+    def _drop_session(self):
+        """Forget a session bound to another event loop. It cannot be closed
+        outside of its loop, its connections are closed once garbage
+        collected."""
+        self._session.detach()
+        self._session = self._session_loop = None
     
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -50,153 +241,639 @@ class ASandbox(AbstractAsyncContextManager):
     
     
     async def close(self):
-        """Close the aiohttp ClientSession."""
-        await self.session.close()
+        """Close the aiohttp ClientSession, if it was created, cancelling the
+        background refreshes of the metadata cache.
+        
+        A connector given at initialization is not closed."""
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        await asyncio.gather(*self._refresh_tasks, return_exceptions=True)
+        if self._session is not None and self._session_loop is not asyncio.get_running_loop():
+            self._drop_session()
+        elif self._session is not None:
+            await self._session.close()
+            self._session = self._session_loop = None
     
     
     async def _build_url(self, endpoint: str, *args: str):
         """Build the url corresponding to <endpoint> with the given <args>."""
-        return os.path.join(self.url, ENDPOINTS[endpoint] % tuple(args))
+        return os.path.join(self.base_url, ENDPOINTS[endpoint] % tuple(args))
+    
+    
+    async def _request(self, method: str, url: str, idempotent: bool = True,
+                       data: Optional[Callable[[], aiohttp.FormData]] = None,
+                       files: Iterable[BinaryIO] = (),
+                       headers: Optional[dict] = None,
+                       expected: Iterable[int] = ()) -> aiohttp.ClientResponse:
+        """Send a request through the session, returning the response which
+        must be released by the caller, E.G. by using it as an asynchronous
+        context manager.
+        
+        The timings of the request are recorded if instrumentation is
+        enabled, see _send(). <expected> are the error statuses handled by
+        the caller, which are not recorded as errors."""
+        if self.instrumentation is None:
+            return await self._send(method, url, idempotent, data, files, headers)
+        
+        timing = self.instrumentation.start(endpoint_name(self.base_url, url), method)
+        try:
+            response = await self._send(method, url, idempotent, data, files, headers, timing)
+        except Exception as e:
+            trace_phases(timing)
+            self.instrumentation.finish(timing, error=e)
+            raise
+        trace_phases(timing)
+        timing.received_bytes = response.content_length or 0
+        self.instrumentation.finish(timing, response.status, expected=response.status in expected)
+        return response
+    
+    
+    async def _send(self, method: str, url: str, idempotent: bool = True,
+                    data: Optional[Callable[[], aiohttp.FormData]] = None,
+                    files: Iterable[BinaryIO] = (), headers: Optional[dict] = None,
+                    timing: Optional[RequestTiming] = None) -> aiohttp.ClientResponse:
+        """Send a request through the session, returning the response which
+        must be released by the caller.
+        
+        <timing>, if given, is filled by the trace config of the session.
+        <data>, if given, is called before each attempt to build the body of
+        the request. The request is retried according to the retry policy, the
+        circuit breaker being checked before each attempt. <files> are
+        rewound before a retry, the request is not retried if one of them can
+        not be."""
+        rewinder = Rewinder(files) if files else None
+        attempt = 0
+        while True:
+            trial = False
+            if self.circuit_breaker is not None:
+                trial = self.circuit_breaker.before_request()
+            
+            try:
+                response = await self.session.request(
+                    method, url, data=data() if data is not None else None, headers=headers,
+                    trace_request_ctx=timing
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                delay = None if self.retry is None else self.retry.delay(
+                    attempt, idempotent, connect_error=isinstance(e, CONNECT_ERRORS)
+                )
+                if delay is None or (rewinder is not None and not rewinder.rewind()):
+                    raise
+            except BaseException:
+                # Cancelled or failed for another reason, the sandbox's health
+                # is unknown
+                if trial:
+                    self.circuit_breaker.release_trial()
+                raise
+            else:
+                if self.circuit_breaker is not None:
+                    if response.status >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                if response.status < 300 or self.retry is None:
+                    return response
+                delay = self.retry.delay(
+                    attempt, idempotent, response.status, response.headers.get("Retry-After")
+                )
+                if delay is None or (rewinder is not None and not rewinder.rewind()):
+                    return response
+                response.release()
+            
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    
+    async def _json(self, response: aiohttp.ClientResponse):
+        """Read and decode the JSON body of <response>, recording the time
+        taken by both if instrumentation is enabled."""
+        if self.instrumentation is None:
+            return self.codec.loads(await response.read())
+        
+        endpoint = endpoint_name(self.base_url, response.url)
+        start = time.perf_counter()
+        body = await response.read()
+        read = time.perf_counter()
+        self.instrumentation.observe(endpoint, "read", read - start)
+        result = self.codec.loads(body)
+        self.instrumentation.decoded(endpoint, result, time.perf_counter() - read)
+        return result
+    
+    
+    def _form(self, fields: List[Field]) -> Tuple[Callable[[], Any], Optional[dict]]:
+        """Return the function building the multipart body of <fields> before
+        each attempt, and the headers to send with it. The body is compressed
+        once if compression is enabled and worth it."""
+        encoded = None if self.compression is None else self.compression.encode_form(fields)
+        if encoded is not None:
+            body, headers = encoded
+            return lambda: body, headers
+        
+        def data():
+            form = aiohttp.FormData()
+            for name, value in fields:
+                form.add_field(name, value)
+            return form
+        
+        return data, None
     
     
     async def libraries(self) -> dict:
         """Asynchronously retrieve libraries installed in the containers of the
-        sandbox."""
-        async with self.session.get(await self._build_url("libraries")) as response:
-            if response.status != 200:
-                raise status_exceptions(response)
-            
-            return await response.json()
+        sandbox.
+        
+        The response is cached if the metadata cache is enabled, its nested
+        values are then shared with the cache and must not be mutated."""
+        return await self._metadata("libraries")
     
     
     async def specifications(self) -> dict:
-        """Asynchronously retrieve specifications of the sandbox."""
-        async with self.session.get(await self._build_url("specifications")) as response:
+        """Asynchronously retrieve specifications of the sandbox.
+        
+        The response is cached if the metadata cache is enabled, its nested
+        values are then shared with the cache and must not be mutated."""
+        return await self._metadata("specifications")
+    
+    
+    async def _metadata(self, endpoint: str) -> dict:
+        """Retrieve the response of <endpoint>, from the metadata cache if it
+        is enabled.
+        
+        A stale response is refreshed in a background task if the cache
+        refreshes in the background."""
+        if self.metadata_cache is None:
+            return await self._fetch_metadata(endpoint)
+        
+        value, fresh = self.metadata_cache.lookup(endpoint)
+        if value is None or (not fresh and not self.metadata_cache.background):
+            return await self._fetch_metadata(endpoint)
+        if not fresh and self.metadata_cache.begin_refresh(endpoint):
+            task = asyncio.ensure_future(self._fetch_metadata(endpoint))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(functools.partial(self._metadata_refreshed, endpoint))
+        return value
+    
+    
+    async def _fetch_metadata(self, endpoint: str) -> dict:
+        """Send the request of <endpoint>, storing the response in the metadata
+        cache if it is enabled. The request is conditional if the cached
+        response has validators."""
+        cache = self.metadata_cache
+        url = await self._build_url(endpoint)
+        headers = None if cache is None else cache.validators(endpoint)
+        response = await self._request("GET", url, headers=headers)
+        if response.status == 304:
+            response.release()
+            value = cache.not_modified(endpoint)
+            if value is not None:
+                return value
+            response = await self._request("GET", url)
+        async with response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
+            if cache is None:
+                return await self._json(response)
+            return cache.store(
+                endpoint, await self._json(response), response.headers.get("ETag"),
+                response.headers.get("Last-Modified")
+            )
+    
+    
+    def _metadata_refreshed(self, endpoint: str, task: asyncio.Task):
+        """Record the end of the background refresh of <endpoint>, the stale
+        response being kept if the request failed."""
+        self._refresh_tasks.discard(task)
+        failed = not task.cancelled() and task.exception() is not None
+        self.metadata_cache.end_refresh(endpoint, failed)
     
     
     async def usage(self) -> dict:
         """Asynchronously retrieve current usage stats of the sandbox."""
-        async with self.session.get(await self._build_url("usages")) as response:
+        url = await self._build_url("usages")
+        async with await self._request("GET", url) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
+            return await self._json(response)
+    
+    
+    async def _download_url(self, uuid: str, path: str = None) -> str:
+        """Build the url of the environment <uuid>, or of the file <path>
+        inside it."""
+        if path is None:
+            return await self._build_url("environments", uuid)
+        return await self._build_url("files", uuid, path)
     
     
     async def download(self, uuid: str, path: str = None) -> BinaryIO:
         """Asynchronously download an environment or a specific file inside an
         environment."""
-        if path is None:
-            url = await self._build_url("environments", uuid)
-        else:
-            url = await self._build_url("files", uuid, path)
-        
-        async with self.session.get(url) as response:
+        url = await self._download_url(uuid, path)
+        async with await self._request("GET", url) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
             return io.BytesIO(await response.read())
     
     
+    async def _range_request(self, url: str, start: int = 0,
+                             end: Optional[int] = None) -> aiohttp.ClientResponse:
+        """Send a request for the bytes from <start> to <end> (inclusive) of
+        <url>.
+        
+        The status code of the response is 206 if the range was honored, 200
+        if the server ignored it and sent the whole content."""
+        response = await self._request("GET", url, headers=range_header(start, end))
+        if response.status not in (200, 206):
+            response.release()
+            raise status_exceptions(response)
+        return response
+    
+    
+    async def _iter_response(self, response: aiohttp.ClientResponse, start: int = 0,
+                             end: Optional[int] = None,
+                             chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the content of a response returned by _range_request(),
+        slicing it if the server ignored the range."""
+        async with response:
+            slicer = ChunkSlicer(start, end) if response.status == 200 else None
+            async for chunk in response.content.iter_chunked(chunk_size or self.chunk_size):
+                if slicer is not None:
+                    chunk = slicer.feed(chunk)
+                if chunk:
+                    yield chunk
+                if slicer is not None and slicer.done:
+                    return
+    
+    
+    async def iter_download(self, uuid: str, path: str = None, chunk_size: Optional[int] = None,
+                            start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Asynchronously download an environment or a specific file inside an
+        environment, yielding its content in chunks of <chunk_size> bytes.
+        
+        Only the bytes from <start> to <end> (inclusive, up to the last byte
+        if None) are downloaded. If the sandbox does not support ranges, the
+        whole content is downloaded and sliced.
+        
+        The request is sent when the iteration starts."""
+        response = await self._range_request(await self._download_url(uuid, path), start, end)
+        async for chunk in self._iter_response(response, start, end, chunk_size):
+            yield chunk
+    
+    
+    async def download_range(self, uuid: str, start: int, end: Optional[int] = None,
+                             path: str = None) -> BinaryIO:
+        """Asynchronously download the bytes from <start> to <end> (inclusive,
+        up to the last byte if None) of an environment or a specific file
+        inside an environment."""
+        chunks = [c async for c in self.iter_download(uuid, path, start=start, end=end)]
+        return io.BytesIO(b"".join(chunks))
+    
+    
+    async def download_to(self, uuid: str, destination: Union[str, os.PathLike, BinaryIO],
+                          path: str = None, chunk_size: Optional[int] = None,
+                          resume: bool = False) -> int:
+        """Asynchronously download an environment or a specific file inside an
+        environment to <destination>, returning the number of bytes written.
+        
+        <destination> can either be a path or a binary file object, which is
+        not closed. Only one chunk of <chunk_size> bytes is held in memory at
+        a time, writes are done in the default executor.
+        
+        If <resume> is True, the download resumes from the current size of
+        <destination> (its current position for a file object), using the
+        size returned by check() to know whether it is already complete. The
+        download restarts from the beginning if the sandbox does not support
+        ranges."""
+        loop = asyncio.get_running_loop()
+        if not hasattr(destination, "write"):
+            mode = "ab" if resume and os.path.exists(destination) else "wb"
+            f = await loop.run_in_executor(None, open, destination, mode)
+            try:
+                return await self.download_to(uuid, f, path, chunk_size, resume)
+            finally:
+                await loop.run_in_executor(None, f.close)
+        
+        start = destination.tell() if resume else 0
+        if start:
+            size = int(await self.check(uuid, path))
+            if start == size:
+                return 0
+            if start > size:
+                destination.seek(0)
+                destination.truncate()
+                start = 0
+        
+        response = await self._range_request(await self._download_url(uuid, path), start)
+        if start and response.status == 200:
+            destination.seek(0)
+            destination.truncate()
+            start = 0
+        
+        written = 0
+        async for chunk in self._iter_response(response, start, None, chunk_size):
+            await loop.run_in_executor(None, destination.write, chunk)
+            written += len(chunk)
+        return written
+    
+    
+    async def download_segmented(self, uuid: str, destination: Union[str, os.PathLike],
+                                 path: str = None, segments: int = 4,
+                                 chunk_size: Optional[int] = None,
+                                 min_segment_size: int = 2 ** 20) -> int:
+        """Asynchronously download an environment or a specific file inside an
+        environment to the file <destination>, fetching <segments> ranges
+        concurrently over as many connections. Return the number of bytes
+        written.
+        
+        The size is given by check(), segments are at least
+        <min_segment_size> bytes long. If the sandbox does not support ranges,
+        the content is downloaded through a single connection."""
+        size = int(await self.check(uuid, path))
+        count = max(1, min(segments, size // max(1, min_segment_size)))
+        if count == 1:
+            return await self.download_to(uuid, destination, path, chunk_size)
+        
+        loop = asyncio.get_running_loop()
+        url = await self._download_url(uuid, path)
+        bounds = list(split_segments(size, count))
+        first = await self._range_request(url, *bounds[0])
+        if first.status == 200:
+            with open(destination, "wb") as f:
+                written = 0
+                async for chunk in self._iter_response(first, chunk_size=chunk_size):
+                    await loop.run_in_executor(None, f.write, chunk)
+                    written += len(chunk)
+            return written
+        
+        with open(destination, "wb") as f:
+            f.truncate(size)
+        
+        async def fetch(start: int, end: int,
+                        response: Optional[aiohttp.ClientResponse] = None):
+            if response is None:
+                response = await self._range_request(url, start, end)
+            with open(destination, "r+b") as f:
+                f.seek(start)
+                async for chunk in self._iter_response(response, start, end, chunk_size):
+                    await loop.run_in_executor(None, f.write, chunk)
+        
+        tasks = [fetch(*bounds[0], first)] + [fetch(*b) for b in bounds[1:]]
+        await asyncio.gather(*tasks)
+        return size
+    
+    
     async def check(self, uuid: str, path: str = None) -> int:
         """Asynchronously check if an environment or a specific file inside an
         environment exists."""
-        if path is None:
-            url = await self._build_url("environments", uuid)
-        else:
-            url = await self._build_url("files", uuid, path)
-        
-        async with self.session.head(url) as response:
+        url = await self._download_url(uuid, path)
+        async with await self._request("HEAD", url, expected=(404,)) as response:
             if response.status not in [200, 404]:  # pragma: no cover
                 raise status_exceptions(response)
-
+            
             return 0 if response.status == 404 else response.headers["Content-Length"]
     
     
-    async def execute(self, config: Union[dict], environ: Optional[BinaryIO] = None) -> dict:
+    async def execute(self, config: Union[dict],
+                      environ: Union[BinaryIO, EnvironmentBuilder, None] = None,
+                      cache: bool = True) -> Union[dict, ExecutionResult]:
         """Asynchronously execute commands on the sandbox according to <config>
-        and <environ>, returning the response's json as a dict.
+        and <environ>, returning the response's json as a dict, or as an
+        ExecutionResult if the sandbox is typed.
         
         <environ>, if not None, will be consumed and closed and shall not be
-        used further."""
-        data = aiohttp.FormData()
-        data.add_field("config", json.dumps(config))
-        if environ is not None:
-            data.add_field("environment", environ)
+        used further. It can also be an EnvironmentBuilder, whose archive is
+        then streamed while being built.
+        
+        If the result cache is enabled and <cache> is True, the result is
+        looked up in the cache using the config and the content of <environ>,
+        the execution being sent only if it is not found. Results of
+        executions whose <environ> is not seekable or is an
+        EnvironmentBuilder, saving their environment or that timed out are
+        never cached. Use <cache>=False for non-deterministic commands.
+        
+        If admission control is enabled, wait for a free container first,
+        raising SandboxBusy if none was available in time.
+        
+        If the environment cache is enabled, <config> does not contain an
+        'environment' and <environ> is seekable, <environ> is uploaded once
+        and saved on the sandbox, its UUID being then used in place of
+        <environ> as long as the sandbox keeps it. The upload is done through
+        a separate execution so that the saved environment is not modified by
+        the commands of <config>."""
+        key = await self._result_key(config, environ) if cache else None
+        if key is not None:
+            result = await self._run_cache(self.result_cache.get, key)
+            if result is not None:
+                if environ is not None:
+                    environ.close()
+                return ExecutionResult.from_dict(result) if self.typed else result
+        
+        result = await self._admitted_execute(config, environ)
+        if key is not None and self.result_cache.cacheable(config, result):
+            await self._run_cache(self.result_cache.set, key, result)
+        return ExecutionResult.from_dict(result) if self.typed else result
+    
+    
+    async def _result_key(self, config: Union[dict],
+                          environ: Union[BinaryIO, EnvironmentBuilder, None]) -> Optional[str]:
+        """Return the key of the execution in the result cache, None if the
+        cache is disabled or if the execution can not be cached."""
+        if (self.result_cache is None or not isinstance(config, dict)
+                or isinstance(environ, EnvironmentBuilder)):
+            return None
+        if environ is None:
+            return result_key(config)
+        digest = await asyncio.get_running_loop().run_in_executor(None, file_digest, environ)
+        return None if digest is None else result_key(config, digest)
+    
+    
+    async def _run_cache(self, method: Callable, *args):
+        """Call <method> of the result cache, in the default executor if it
+        has an on-disk tier."""
+        if self.result_cache.directory is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+    
+    
+    async def _admitted_execute(self, config: Union[dict],
+                                environ: Union[BinaryIO, EnvironmentBuilder, None] = None
+                                ) -> dict:
+        """Execute <config> once admitted by the admission limiter."""
+        if self.admission is None:
+            return await self._execute(config, environ)
+        
+        if self.admission.capacity is None:
+            await self.admission.resize((await self.specifications())["container"]["count"])
+        try:
+            async with self.admission:
+                return await self._execute(config, environ)
+        except SandboxBusy as e:
+            if self.instrumentation is not None:
+                self.instrumentation.error("execute", e)
+            raise
+    
+    
+    def execute_many(self, items: Iterable[BatchItem], concurrency: int = 10,
+                     ordered: bool = False,
+                     progress: Optional[ProgressCallback] = None) -> AsyncIterator[BatchResult]:
+        """Asynchronously execute every item of <items>, either a config or a
+        (config, environ) pair, with execute(), at most <concurrency> at a
+        time.
+        
+        Return an asynchronous iterator yielding a BatchResult, holding the
+        index of the item and either its result or its exception, as soon as
+        an item finishes, or in the order of <items> if <ordered> is True.
+        
+        <progress>, if given, is called with the number of finished items and
+        the total number of items (None if <items> has no length) every time
+        an item finishes. Closing the iterator, or cancelling the task
+        consuming it, cancels the remaining items."""
+        return aexecute_many(self.execute, items, concurrency, ordered, progress)
+    
+    
+    async def _execute(self, config: Union[dict], environ: Optional[BinaryIO] = None) -> dict:
+        """Execute <config>, using the environment cache if possible."""
+        if (self.env_cache is None or environ is None or not isinstance(config, dict)
+                or "environment" in config):
+            return await self._post_execute(config, environ)
+        
+        digest = await asyncio.get_running_loop().run_in_executor(None, file_digest, environ)
+        if digest is None:
+            return await self._post_execute(config, environ)
         
-        async with self.session.post(await self._build_url("execute"), data=data) as response:
+        rewinder = Rewinder([environ])
+        uuid = await self._cached_environment(digest, environ)
+        try:
+            return await self._post_execute(dict(config, environment=uuid))
+        except Sandbox404:
+            # The environment expired between its check and the execution
+            self.env_cache.invalidate(digest)
+            if not rewinder.rewind():  # pragma: no cover
+                raise
+            uuid = await self._cached_environment(digest, environ)
+            return await self._post_execute(dict(config, environment=uuid))
+    
+    
+    async def _cached_environment(self, digest: str, environ: BinaryIO) -> str:
+        """Return the UUID of the environment corresponding to <digest>,
+        uploading <environ> if the sandbox does not have it."""
+        uuid = self.env_cache.get(digest)
+        if uuid is not None and self.env_cache.needs_check(digest):
+            if await self.check(uuid):
+                self.env_cache.checked(digest)
+            else:
+                self.env_cache.invalidate(digest)
+                uuid = None
+        
+        if uuid is None:
+            config = {"commands": ["true"], "save": True}
+            uuid = (await self._post_execute(config, environ))["environment"]
+            self.env_cache.set(digest, uuid)
+        return uuid
+    
+    
+    async def _post_execute(self, config: Union[dict],
+                            environ: Optional[BinaryIO] = None) -> dict:
+        """Send the request of execute()."""
+        if isinstance(environ, EnvironmentBuilder):
+            if environ.sized:
+                await asyncio.get_running_loop().run_in_executor(None, environ.size)
+            builder, environ = environ, None
+        else:
+            builder = None
+        
+        url, serialized = await self._build_url("execute"), self.codec.dumps(config)
+        if environ is None and builder is None:
+            data, headers = self._form([("config", serialized)])
+        else:
+            headers = None
+            
+            def data():
+                form = aiohttp.FormData()
+                form.add_field("config", serialized)
+                if environ is not None:
+                    form.add_field("environment", environ)
+                else:
+                    form.add_field(
+                        "environment", EnvironmentPayload(builder), filename=EnvironmentReader.name
+                    )
+                return form
+        
+        files = () if environ is None else (environ,)
+        async with await self._request("POST", url, False, data, files, headers) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
-
-
+            return await self._json(response)
+    
+    
     async def load(self, environ: dict) -> dict:
         """Asynchronously execute commands on the sandbox according to <config>
         and <environ>, returning the response's json as a dict.
         
         <environ>, if not None, will be consumed and closed and shall not be
         used further."""
-        data = aiohttp.FormData()
-        data.add_field("data", json.dumps(environ))
-     
-        async with self.session.post(await self._build_url("load/fr"), data=data) as response:
+        data, headers = self._form([("data", self.codec.dumps(environ))])
+        url = await self._build_url("load/fr")
+        async with await self._request("POST", url, False, data, headers=headers) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
-
-
+            return await self._json(response)
+    
+    
     async def demo(self, environ: dict) -> dict:
         """Asynchronously execute commands on the sandbox according to <config>
         and <environ>, returning the response's json as a dict.
         
         <environ>, if not None, will be consumed and closed and shall not be
         used further."""
-        data = aiohttp.FormData()
-        data.add_field("data", json.dumps(environ))
-        data.add_field("demo", True)
+        def data():
+            form = aiohttp.FormData()
+            form.add_field("data", self.codec.dumps(environ))
+            form.add_field("demo", True)
+            return form
         
-        async with self.session.post(await self._build_url("demo"), data=data) as response:
+        url = await self._build_url("demo")
+        async with await self._request("POST", url, False, data) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
-
-
+            return await self._json(response)
+    
+    
     async def playexo(self, config: dict, environ: dict) -> dict:
         """Asynchronously execute commands on the sandbox according to <config>
         and <environ>, returning the response's json as a dict.
         
         <environ>, if not None, will be consumed and closed and shall not be
         used further."""
-        data = aiohttp.FormData()
-        data.add_field("data", json.dumps(environ))
-        data.add_field("config", json.dumps(config))
-        
-        async with self.session.post(await self._build_url("exo"), data=data) as response:
+        data, headers = self._form([
+            ("data", self.codec.dumps(environ)), ("config", self.codec.dumps(config))
+        ])
+        url = await self._build_url("exo")
+        async with await self._request("POST", url, False, data, headers=headers) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
-
+            return await self._json(response)
+    
     async def exec(self, datas: dict = {}) -> dict:
         """Asynchronously execute commands on the sandbox according to <config>
         and <environ>, returning the response's json as a dict.
         
         <environ>, if not None, will be consumed and closed and shall not be
         used further."""
-        data = aiohttp.FormData()
-        data.add_field("data", json.dumps(datas))
-        for key, value in datas.items():
-            data.add_field(str(key), value)
-        
-        async with self.session.post(await self._build_url("exec"), data=data) as response:
+        data, headers = self._form(
+            [("data", self.codec.dumps(datas))] + [(str(k), v) for k, v in datas.items()]
+        )
+        url = await self._build_url("exec")
+        async with await self._request("POST", url, False, data, headers=headers) as response:
             if response.status != 200:
                 raise status_exceptions(response)
             
-            return await response.json()
+            return await self._json(response)
@@ -0,0 +1,177 @@
+# balancer.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Least-loaded routing of requests between several sandboxes, shared by
+SandboxCluster and ASandboxCluster."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from .exceptions import SandboxUnavailable
+
+
+class Node:
+    """State of a sandbox inside a cluster.
+    
+    * containers : Number of containers of the sandbox, None until its
+            specifications are retrieved.
+    * running : Number of containers in use according to the last usage.
+    * cpu : CPU usage according to the last usage.
+    * in_flight : Number of requests sent to the sandbox through the cluster
+            not answered yet.
+    * failures : Number of consecutive failures.
+    * down_until : Monotonic time until which the node is out of rotation.
+    """
+    
+    
+    def __init__(self, sandbox):
+        self.sandbox = sandbox
+        self.containers = None
+        self.running = 0
+        self.cpu = 0.0
+        self.in_flight = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.polled_at = None
+    
+    
+    def __repr__(self):
+        return "<Node %s free=%d in_flight=%d%s>" % (
+            self.url, self.free, self.in_flight, "" if self.is_up() else " down"
+        )
+    
+    
+    @property
+    def url(self) -> str:
+        return self.sandbox.url
+    
+    
+    @property
+    def free(self) -> int:
+        """Estimated number of free containers on the node.
+        
+        Requests sent through the cluster are also counted in the usage once
+        the node has been polled, the greatest of both is thus used."""
+        if self.containers is None:
+            return 0
+        return self.containers - max(self.running, self.in_flight)
+    
+    
+    def is_up(self, now: Optional[float] = None) -> bool:
+        """Return whether the node is in rotation.
+        
+        A node whose circuit breaker is open is out of rotation."""
+        breaker = getattr(self.sandbox, "circuit_breaker", None)
+        if breaker is not None and breaker.state == breaker.OPEN:
+            return False
+        return (time.monotonic() if now is None else now) >= self.down_until
+
+
+
+class Balancer:
+    """Select the node with the most free containers.
+    
+    A node is taken out of rotation for <cooldown> seconds when it fails a
+    health check, or when <max_failures> consecutive requests failed.
+    
+    The node which created an environment (using 'save') is remembered for the
+    <max_owners> most recent environments so that requests using it are sent
+    to that node."""
+    
+    
+    def __init__(self, sandboxes: Iterable, max_failures: int = 3, cooldown: float = 30.0,
+                 max_owners: int = 4096):
+        self.nodes = [Node(s) for s in sandboxes]
+        if not self.nodes:
+            raise ValueError("A cluster needs at least one sandbox")
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_owners = max_owners
+        self._owners = OrderedDict()
+        self._lock = threading.Lock()
+    
+    
+    def up(self) -> List[Node]:
+        """Return the nodes currently in rotation."""
+        now = time.monotonic()
+        return [n for n in self.nodes if n.is_up(now)]
+    
+    
+    def select(self, uuid: str = None) -> Node:
+        """Return the node which should handle the next request.
+        
+        If <uuid> is given and the environment's owner is known and up, the
+        owner is returned."""
+        owner = self.owner(uuid)
+        if owner is not None and owner.is_up():
+            return owner
+        
+        nodes = self.up()
+        if not nodes:
+            raise SandboxUnavailable("Every sandbox of the cluster is out of rotation")
+        return max(nodes, key=lambda n: (n.free, -n.cpu))
+    
+    
+    def acquire(self, uuid: str = None) -> Node:
+        """Select a node and count the request as in flight on it."""
+        with self._lock:
+            node = self.select(uuid)
+            node.in_flight += 1
+        return node
+    
+    
+    def release(self, node: Node, failed: bool = False):
+        """Count the request sent through acquire() as done, recording a
+        failure if <failed> is True, or a success otherwise."""
+        with self._lock:
+            node.in_flight -= 1
+            if failed:
+                self._fail(node)
+            else:
+                node.failures = 0
+    
+    
+    def _fail(self, node: Node):
+        node.failures += 1
+        if node.failures >= self.max_failures:
+            node.down_until = time.monotonic() + self.cooldown
+    
+    
+    def update(self, node: Node, usage: dict, specifications: dict = None):
+        """Update <node> with the result of a successful health check."""
+        with self._lock:
+            if specifications is not None:
+                node.containers = specifications["container"]["count"]
+            node.running = usage["container"]
+            node.cpu = usage["cpu"]["usage"]
+            node.polled_at = time.monotonic()
+            node.failures = 0
+            node.down_until = 0.0
+    
+    
+    def mark_down(self, node: Node):
+        """Take <node> out of rotation after a failed health check."""
+        with self._lock:
+            node.failures = max(node.failures + 1, self.max_failures)
+            node.down_until = time.monotonic() + self.cooldown
+    
+    
+    def remember(self, uuid: str, node: Node):
+        """Remember that the environment <uuid> is stored on <node>."""
+        with self._lock:
+            self._owners[uuid] = node
+            self._owners.move_to_end(uuid)
+            while len(self._owners) > self.max_owners:
+                self._owners.popitem(last=False)
+    
+    
+    def owner(self, uuid: Optional[str]) -> Optional[Node]:
+        """Return the node storing the environment <uuid>, if known."""
+        if uuid is None:
+            return None
+        return self._owners.get(uuid)
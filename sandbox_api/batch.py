@@ -0,0 +1,210 @@
+# batch.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Execution of many configs with a bounded concurrency, shared by
+Sandbox.execute_many() and ASandbox.execute_many()."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import (Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterable, List,
+                    Optional, Tuple, Union)
+
+
+# An item of a batch, either a config or a (config, environ) pair.
+BatchItem = Union[dict, Tuple[dict, Optional[BinaryIO]]]
+
+# Called with the number of finished items and the total number of items
+# (None if unknown) each time an item finishes.
+ProgressCallback = Callable[[int, Optional[int]], Any]
+
+# Marks the end of a worker in the queue of results.
+_DONE = object()
+
+
+def split_item(item: BatchItem) -> Tuple[dict, Optional[BinaryIO]]:
+    """Return the config and the environ of a batch <item>."""
+    if isinstance(item, tuple):
+        config, environ = item
+        return config, environ
+    return item, None
+
+
+def batch_size(items: Iterable) -> Optional[int]:
+    """Return the number of <items>, None if it cannot be known without
+    consuming them."""
+    try:
+        return len(items)
+    except TypeError:
+        return None
+
+
+
+class BatchResult:
+    """Outcome of an item of a batch.
+    
+    * index : Position of the item in the batch.
+    * result : The result returned by execute(), None if it failed.
+    * exception : The exception raised by execute(), None if it succeeded.
+    * elapsed : Time in seconds spent executing the item.
+    """
+    
+    
+    def __init__(self, index: int, result: Optional[dict] = None,
+                 exception: Optional[Exception] = None, elapsed: float = 0.0):
+        self.index = index
+        self.result = result
+        self.exception = exception
+        self.elapsed = elapsed
+    
+    
+    def __repr__(self):
+        return "<BatchResult index=%d %s>" % (
+            self.index, "ok" if self.ok else "exception=%r" % self.exception
+        )
+    
+    
+    @property
+    def ok(self) -> bool:
+        """Whether the item was executed without raising."""
+        return self.exception is None
+    
+    
+    def get(self) -> dict:
+        """Return the result of the item, raising its exception if it
+        failed."""
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+def run_item(func: Callable[[dict, Optional[BinaryIO]], dict], index: int,
+             item: BatchItem) -> BatchResult:
+    """Execute <item> with <func>, capturing its exception."""
+    config, environ = split_item(item)
+    start = time.monotonic()
+    try:
+        result = func(config, environ)
+    except Exception as e:
+        return BatchResult(index, exception=e, elapsed=time.monotonic() - start)
+    return BatchResult(index, result, elapsed=time.monotonic() - start)
+
+
+def submit_many(executor: Executor, func: Callable[[dict, Optional[BinaryIO]], dict],
+                items: Iterable[BatchItem],
+                progress: Optional[ProgressCallback] = None) -> List[Future]:
+    """Submit every item of <items> to <executor> to be executed with <func>,
+    returning a Future of a BatchResult for each of them, in the order of
+    <items>.
+    
+    <progress>, if given, is called from the worker threads with the number
+    of finished items and the total number of items every time an item
+    finishes."""
+    items = list(items)
+    futures = [executor.submit(run_item, func, i, item) for i, item in enumerate(items)]
+    if progress is not None:
+        lock = threading.Lock()
+        done = 0
+        
+        def callback(_: Future):
+            nonlocal done
+            with lock:
+                done += 1
+                progress(done, len(items))
+        
+        for future in futures:
+            future.add_done_callback(callback)
+    return futures
+
+
+async def arun_item(func: Callable[[dict, Optional[BinaryIO]], Awaitable[dict]], index: int,
+                    item: BatchItem) -> BatchResult:
+    """Asynchronously execute <item> with <func>, capturing its exception."""
+    config, environ = split_item(item)
+    start = time.monotonic()
+    try:
+        result = await func(config, environ)
+    except Exception as e:
+        return BatchResult(index, exception=e, elapsed=time.monotonic() - start)
+    return BatchResult(index, result, elapsed=time.monotonic() - start)
+
+
+async def aexecute_many(func: Callable[[dict, Optional[BinaryIO]], Awaitable[dict]],
+                        items: Iterable[BatchItem], concurrency: int = 10,
+                        ordered: bool = False,
+                        progress: Optional[ProgressCallback] = None
+                        ) -> AsyncIterator[BatchResult]:
+    """Asynchronously execute every item of <items> with <func>, at most
+    <concurrency> at a time, yielding a BatchResult for each of them.
+    
+    Results are yielded as soon as they are available, or in the order of
+    <items> if <ordered> is True. <items> is consumed lazily : at most
+    <concurrency> results wait for the consumer before the workers stop
+    starting new items, so that at most 2 * <concurrency> items are started
+    ahead of the results (<concurrency> if <ordered> is True).
+    
+    <progress>, if given, is called with the number of finished items and
+    the total number of items (None if <items> has no length) every time an
+    item finishes.
+    
+    Closing the iterator (e.g. breaking out of an 'async for') or cancelling
+    the task consuming it cancels the remaining items."""
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1, not %d" % concurrency)
+    
+    total = batch_size(items)
+    iterator = enumerate(items)
+    queue = asyncio.Queue(maxsize=concurrency)
+    # Items started but not yielded yet, bounding the results held back
+    # until the previous ones are done when <ordered> is True
+    window = asyncio.Semaphore(concurrency) if ordered else None
+    
+    async def worker():
+        try:
+            while True:
+                if window is not None:
+                    await window.acquire()
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    break
+                await queue.put(await arun_item(func, index, item))
+        except Exception:
+            await queue.put(_DONE)
+            raise
+        await queue.put(_DONE)
+    
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    pending: Dict[int, BatchResult] = {}
+    running, done, following = len(workers), 0, 0
+    try:
+        while running:
+            result = await queue.get()
+            if result is _DONE:
+                running -= 1
+                continue
+            
+            done += 1
+            if progress is not None:
+                progress(done, total)
+            
+            if not ordered:
+                yield result
+                continue
+            
+            pending[result.index] = result
+            while following in pending:
+                yield pending.pop(following)
+                following += 1
+                window.release()
+        
+        # Raise the exception raised while iterating over <items>, if any
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,246 @@
+# cache.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Remember the results of executions, keyed by a hash of their config and
+of the content of their environment, so that repeated executions are not
+sent to the sandbox again."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .enums import SandboxErrCode
+
+
+# Status of results which depend on the load of the sandbox and must not be
+# cached.
+UNCACHEABLE_STATUS = frozenset({SandboxErrCode.UNKNOWN, SandboxErrCode.TIMEOUT})
+
+
+def result_key(config: dict, environ_digest: Optional[str] = None) -> str:
+    """Return the key of the execution of <config> with the environment whose
+    SHA-256 is <environ_digest> (None if there is no environment).
+    
+    The config is serialized canonically, two configs differing only by the
+    order of their keys share the same key."""
+    digest = hashlib.sha256(
+        json.dumps(config, sort_keys=True, separators=(",", ":")).encode()
+    )
+    digest.update(b"\0" + (environ_digest or "").encode())
+    return digest.hexdigest()
+
+
+
+class ResultCache:
+    """Map the key of executions to their result, see result_key().
+    
+    Results are kept in memory, the least recently used being evicted first.
+    If <directory> is given, results are also written there, one file per
+    result, and looked up when they are not in memory anymore.
+    
+    * maxsize : Maximum number of results kept in memory.
+    * ttl : Time in seconds during which a result is valid, None if results
+            never expire.
+    * directory : Directory of the on-disk tier, None to keep results in
+            memory only. It is created if it does not exist.
+    * disk_maxsize : Maximum number of results kept in <directory>, the
+            oldest being removed first, None for no limit.
+    """
+    
+    
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 3600.0,
+                 directory: Optional[str] = None, disk_maxsize: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_size = len(self._disk_files())
+    
+    
+    def __repr__(self):
+        return "<ResultCache size=%d hits=%d disk_hits=%d misses=%d evictions=%d>" % (
+            len(self), self.hits, self.disk_hits, self.misses, self.evictions
+        )
+    
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    
+    def stats(self) -> dict:
+        """Return the statistics of the cache."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size":       len(self),
+            "disk_size":  self._disk_size,
+            "hits":       self.hits,
+            "disk_hits":  self.disk_hits,
+            "misses":     self.misses,
+            "evictions":  self.evictions,
+            "expired":    self.expired,
+            "hit_ratio":  (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+    
+    
+    @staticmethod
+    def cacheable(config: dict, result: dict) -> bool:
+        """Return whether <result>, returned by the execution of <config>, can
+        be cached.
+        
+        Executions saving their environment and results whose status depends
+        on the load of the sandbox (unknown error, timeout) are not
+        cached."""
+        return not config.get("save") and result.get("status") not in UNCACHEABLE_STATUS
+    
+    
+    def _expired(self, stored: float) -> bool:
+        return self.ttl is not None and time.time() - stored >= self.ttl
+    
+    
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the result corresponding to <key>, None if it is
+        unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[0])
+                del self._entries[key]
+                self.expired += 1
+        
+        entry = self._read(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, *entry)
+        return json.loads(entry[0])
+    
+    
+    def set(self, key: str, result: dict):
+        """Record <result> as the result corresponding to <key>."""
+        data, stored = json.dumps(result), time.time()
+        with self._lock:
+            self._store(key, data, stored)
+        self._write(key, data, stored)
+    
+    
+    def _store(self, key: str, data: str, stored: float):
+        """Store an entry in memory, evicting the least recently used ones.
+        Must be called with the lock held."""
+        self._entries[key] = (data, stored)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    
+    def invalidate(self, key: str):
+        """Forget the result corresponding to <key>."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.directory is not None:
+            self._remove(self._path(key))
+    
+    
+    def clear(self):
+        """Forget every result, including those stored on disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for path in self._disk_files():
+                self._remove(path)
+    
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+    
+    
+    def _disk_files(self):
+        return [e.path for e in os.scandir(self.directory) if e.name.endswith(".json")]
+    
+    
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._disk_size = max(0, self._disk_size - 1)
+    
+    
+    def _read(self, key: str) -> Optional[tuple]:
+        """Return the entry corresponding to <key> from the disk, None if it is
+        not there, expired or unreadable."""
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                stored, data = f.read().split("\n", 1)
+            stored = float(stored)
+        except (OSError, ValueError):
+            return None
+        if self._expired(stored):
+            self._remove(path)
+            with self._lock:
+                self.expired += 1
+            return None
+        return data, stored
+    
+    
+    def _write(self, key: str, data: str, stored: float):
+        """Write an entry to the disk atomically, removing the oldest entries
+        if there are more than <disk_maxsize>."""
+        if self.directory is None:
+            return
+        path = self._path(key)
+        exists = os.path.exists(path)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write("%r\n%s" % (stored, data))
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_size += not exists
+            prune = self.disk_maxsize is not None and self._disk_size > self.disk_maxsize
+        if prune:
+            self._prune()
+    
+    
+    def _prune(self):
+        """Remove the oldest results from the disk until there are at most
+        <disk_maxsize> of them."""
+        files = []
+        for path in self._disk_files():
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                continue
+        files = [path for _, path in sorted(files)]
+        with self._lock:
+            self._disk_size = len(files)
+        for path in files[:max(0, len(files) - self.disk_maxsize)]:
+            self._remove(path)
+            with self._lock:
+                self.evictions += 1
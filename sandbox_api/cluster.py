@@ -0,0 +1,160 @@
+# cluster.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""A synchronous client dispatching requests between several sandboxes."""
+
+import threading
+import time
+from contextlib import AbstractContextManager
+from typing import BinaryIO, Iterable, List, Optional, Union
+
+import requests
+
+from .balancer import Balancer, Node
+from .exceptions import SandboxError, SandboxUnavailable, get_status_code
+from .results import saved_environment
+from .sandbox import Sandbox
+
+
+class SandboxCluster(AbstractContextManager):
+    """Interface several Sandbox servers, sending each execution to the
+    sandbox with the most free containers."""
+    
+    
+    def __init__(self, sandboxes: Iterable[Union[str, Sandbox]], poll_interval: float = 5.0,
+                 max_failures: int = 3, cooldown: float = 30.0, **kwargs):
+        """Initialize a cluster with the given sandboxes.
+        
+        <sandboxes> can contain URLs or already created Sandbox instances,
+        <kwargs> are given to Sandbox when it is created from an URL.
+        
+        The usage of every sandbox is polled at most once every
+        <poll_interval> seconds. A sandbox is taken out of rotation for
+        <cooldown> seconds when it fails a health check, or when
+        <max_failures> consecutive requests failed with a connection error or
+        a 5xx status code."""
+        self.balancer = Balancer(
+            [Sandbox(s, **kwargs) if isinstance(s, str) else s for s in sandboxes],
+            max_failures, cooldown
+        )
+        self.poll_interval = poll_interval
+        self._refreshed_at = None
+        self._refresh_lock = threading.Lock()
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    
+    def close(self):
+        """Close every sandbox of the cluster."""
+        for node in self.nodes:
+            node.sandbox.close()
+    
+    
+    @property
+    def nodes(self) -> List[Node]:
+        return self.balancer.nodes
+    
+    
+    def _poll(self, node: Node):
+        """Health check <node>, updating its usage or taking it out of
+        rotation."""
+        try:
+            specifications = None
+            if node.containers is None:
+                specifications = node.sandbox.specifications()
+            usage = node.sandbox.usage()
+        except (requests.RequestException, SandboxError):
+            self.balancer.mark_down(node)
+        else:
+            self.balancer.update(node, usage, specifications)
+    
+    
+    def refresh(self):
+        """Poll the usage of every sandbox of the cluster."""
+        with self._refresh_lock:
+            for node in self.nodes:
+                self._poll(node)
+            self._refreshed_at = time.monotonic()
+    
+    
+    def _maybe_refresh(self):
+        """Refresh the cluster if its usage is older than <poll_interval>.
+        
+        Only the first call will wait for the refresh if another thread is
+        already refreshing the cluster."""
+        if (self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.poll_interval):
+            return
+        if self._refreshed_at is None:
+            self.refresh()
+        elif self._refresh_lock.acquire(blocking=False):
+            self._refresh_lock.release()
+            self.refresh()
+    
+    
+    def _locate(self, uuid: str) -> Node:
+        """Return the node storing the environment <uuid>."""
+        node = self.balancer.owner(uuid)
+        if node is not None:
+            return node
+        for node in self.balancer.up():
+            try:
+                if node.sandbox.check(uuid):
+                    self.balancer.remember(uuid, node)
+                    return node
+            except (requests.RequestException, SandboxError):
+                continue
+        raise SandboxUnavailable("Environment '%s' was not found in the cluster" % uuid)
+    
+    
+    def download(self, uuid: str, path: str = None) -> BinaryIO:
+        """Download an environment or a specific file inside an environment
+        from the sandbox storing it."""
+        return self._locate(uuid).sandbox.download(uuid, path)
+    
+    
+    def check(self, uuid: str, path: str = None) -> int:
+        """Return the size of an environment or a specific file, 0 if it was not
+        found on any sandbox of the cluster."""
+        try:
+            return self._locate(uuid).sandbox.check(uuid, path)
+        except SandboxUnavailable:
+            return 0
+    
+    
+    def execute(self, config: Union[dict], environ: Optional[BinaryIO] = None) -> dict:
+        """Execute commands on the least loaded sandbox according to <config>
+        and <environ>, returning the response's json as a dict.
+        
+        If <config> uses an environment created through the cluster, the
+        execution is sent to the sandbox storing it.
+        
+        <environ>, if not None, will be consumed and closed and shall not be
+        used further."""
+        self._maybe_refresh()
+        uuid = config.get("environment") if isinstance(config, dict) else None
+        node = self.balancer.acquire(uuid)
+        try:
+            result = node.sandbox.execute(config, environ)
+        except requests.RequestException:
+            self.balancer.release(node, failed=True)
+            raise
+        except SandboxError as e:
+            self.balancer.release(
+                node, failed=e.response is not None and get_status_code(e.response) >= 500
+            )
+            raise
+        except BaseException:
+            self.balancer.release(node)
+            raise
+        
+        self.balancer.release(node)
+        environment = saved_environment(result)
+        if environment is not None:
+            self.balancer.remember(environment, node)
+        return result
@@ -0,0 +1,136 @@
+# codec.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""JSON codecs used to encode the configs sent to the sandbox and to decode
+its responses. orjson or ujson are used when installed, the standard library
+otherwise."""
+
+import json
+from typing import Any, Dict, Optional, Type, Union
+
+
+
+class JSONCodec:
+    """Encode and decode JSON with the standard library.
+    
+    Subclasses override dumps() and loads(). Both raise a subclass of
+    ValueError (or TypeError for objects which cannot be encoded)."""
+    
+    name = "json"
+    
+    
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.name)
+    
+    
+    @staticmethod
+    def available() -> bool:
+        """Return whether the library of the codec is installed."""
+        return True
+    
+    
+    def dumps(self, obj: Any) -> str:
+        """Encode <obj> as a JSON string."""
+        return json.dumps(obj)
+    
+    
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Decode the JSON document <data>."""
+        return json.loads(data)
+
+
+
+class OrjsonCodec(JSONCodec):
+    """Encode and decode JSON with orjson."""
+    
+    name = "orjson"
+    
+    
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+    
+    
+    @staticmethod
+    def available() -> bool:
+        try:
+            import orjson  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    
+    
+    def dumps(self, obj: Any) -> str:
+        return self._orjson.dumps(obj, option=self._options).decode()
+    
+    
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._orjson.loads(data)
+
+
+
+class UjsonCodec(JSONCodec):
+    """Encode and decode JSON with ujson."""
+    
+    name = "ujson"
+    
+    
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+    
+    
+    @staticmethod
+    def available() -> bool:
+        try:
+            import ujson  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    
+    
+    def dumps(self, obj: Any) -> str:
+        return self._ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+    
+    
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._ujson.loads(data)
+
+
+# Codecs by name, the first available one being the default.
+CODECS: Dict[str, Type[JSONCodec]] = {
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name:  UjsonCodec,
+    JSONCodec.name:   JSONCodec,
+}
+
+_default = None
+
+
+def default_codec() -> JSONCodec:
+    """Return the fastest codec available : orjson, ujson, or the standard
+    library."""
+    global _default
+    if _default is None:
+        _default = next(cls for cls in CODECS.values() if cls.available())()
+    return _default
+
+
+def get_codec(codec: Union[str, JSONCodec, None] = None) -> JSONCodec:
+    """Return the codec corresponding to <codec> : the default codec if None,
+    the codec of this name if it is a string, <codec> itself otherwise.
+    
+    Raise ValueError if the name is unknown and ImportError if the library
+    of the codec is not installed."""
+    if codec is None:
+        return default_codec()
+    if isinstance(codec, JSONCodec):
+        return codec
+    cls: Optional[Type[JSONCodec]] = CODECS.get(codec)
+    if cls is None:
+        raise ValueError("Unknown JSON codec '%s', must be one of %s" % (codec, list(CODECS)))
+    return cls()
@@ -0,0 +1,98 @@
+# compression.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compression of the bodies of the requests sent to the sandbox, and of
+its responses through the Accept-Encoding header."""
+
+import gzip
+from typing import Dict, Iterable, Optional, Tuple
+
+from .multipart import Field, encode_multipart
+
+
+# Names of the algorithms, as in the Content-Encoding header.
+ALGORITHMS = ("gzip", "zstd")
+
+
+def zstd_available() -> bool:
+    """Return whether the zstandard library is installed."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+
+class Compression:
+    """Compress the bodies of the requests sent by execute() and the
+    loaders, and negotiate the compression of the responses.
+    
+    The sandbox must accept compressed request bodies (a Content-Encoding
+    header), which is why compression is opt-in.
+    
+    * algorithm : 'gzip', or 'zstd' if the zstandard library is installed.
+    * threshold : Minimum size in bytes of the bodies compressed, smaller
+            bodies are sent as is.
+    * level : Compression level, None for the default of the algorithm.
+    * responses : Whether to ask for compressed responses. If False, the
+            responses are requested uncompressed ('identity'), saving the
+            CPU time spent decompressing them on fast links.
+    """
+    
+    
+    def __init__(self, algorithm: str = "gzip", threshold: int = 1024,
+                 level: Optional[int] = None, responses: bool = True):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(
+                "Unknown compression algorithm '%s', must be one of %s" % (algorithm, ALGORITHMS)
+            )
+        if algorithm == "zstd":
+            import zstandard
+            
+            self._zstd = zstandard.ZstdCompressor(level=3 if level is None else level)
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.level = level
+        self.responses = responses
+    
+    
+    def __repr__(self):
+        return "<Compression %s threshold=%d>" % (self.algorithm, self.threshold)
+    
+    
+    def compress(self, data: bytes) -> bytes:
+        """Compress <data> with the algorithm."""
+        if self.algorithm == "zstd":
+            return self._zstd.compress(data)
+        return gzip.compress(data, 6 if self.level is None else self.level, mtime=0)
+    
+    
+    def encode_form(self, fields: Iterable[Field]) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Return the compressed multipart/form-data body of <fields> and the
+        headers to send with it.
+        
+        None is returned if the body is smaller than the threshold, if
+        compressing it does not make it smaller, or if a value is neither a
+        string nor bytes, the body then having to be sent as is."""
+        fields = list(fields)
+        if not all(isinstance(value, (str, bytes)) for _, value in fields):
+            return None
+        body, content_type = encode_multipart(fields)
+        if len(body) < self.threshold:
+            return None
+        compressed = self.compress(body)
+        if len(compressed) >= len(body):
+            return None
+        return compressed, {"Content-Type": content_type, "Content-Encoding": self.algorithm}
+    
+    
+    def accept_encoding(self, zstd: bool) -> str:
+        """Return the value of the Accept-Encoding header of a client which
+        can decode zstd if <zstd> is True."""
+        if not self.responses:
+            return "identity"
+        return "zstd, gzip, deflate" if zstd else "gzip, deflate"
@@ -0,0 +1,98 @@
+# envcache.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Remember environments already uploaded to a sandbox, keyed by the
+SHA-256 of their archive, so that they are not sent again."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class EnvironmentCache:
+    """Map the digest of environment archives to the UUID of the environment
+    saved on the sandbox.
+    
+    * maxsize : Maximum number of environments remembered, the least recently
+            used being forgotten first.
+    * check_interval : Time in seconds during which an environment is
+            assumed to still exist on the sandbox after it was uploaded or
+            checked. It is checked with check() before each use if 0.
+    """
+    
+    
+    def __init__(self, maxsize: int = 1024, check_interval: float = 0.0):
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    
+    def __repr__(self):
+        return "<EnvironmentCache size=%d hits=%d misses=%d expired=%d>" % (
+            len(self), self.hits, self.misses, self.expired
+        )
+    
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    
+    def get(self, digest: str) -> Optional[str]:
+        """Return the UUID of the environment corresponding to <digest>, None
+        if it is unknown."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+    
+    
+    def needs_check(self, digest: str) -> bool:
+        """Return whether the environment corresponding to <digest> must be
+        checked before being used."""
+        entry = self._entries.get(digest)
+        return entry is None or time.monotonic() - entry[1] >= self.check_interval
+    
+    
+    def checked(self, digest: str):
+        """Record that the environment corresponding to <digest> still exists
+        on the sandbox."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                entry[1] = time.monotonic()
+    
+    
+    def set(self, digest: str, uuid: str):
+        """Record that the archive corresponding to <digest> was saved as the
+        environment <uuid>."""
+        with self._lock:
+            self._entries[digest] = [uuid, time.monotonic()]
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    
+    def invalidate(self, digest: str):
+        """Forget the environment corresponding to <digest>, E.G. because it
+        expired on the sandbox."""
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self.expired += 1
+    
+    
+    def clear(self):
+        """Forget every environment."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,211 @@
+# environment.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Build environment archives in memory, streaming the compressed archive
+instead of creating it beforehand."""
+
+import io
+import os
+import stat
+import tarfile
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+
+Source = Optional[Callable[[], Iterator[bytes]]]
+
+
+class EnvironmentBuilder:
+    """Build a tar.gz environment from in-memory files and directories of the
+    local file system.
+    
+    The archive is never held in memory : iterating over the builder yields
+    the compressed archive chunk by chunk, files on disk being read only when
+    their turn comes. An EnvironmentBuilder can directly be given as the
+    environment of Sandbox.execute() and ASandbox.execute().
+    
+    * files : A dict mapping paths inside the environment to their content,
+            as bytes or str.
+    * compresslevel : The gzip compression level, from 0 (no compression) to
+            9 (best compression).
+    * chunk_size : Approximate size of the chunks of the compressed archive.
+    * sized : Whether the size of the archive must be computed, by building
+            it a first time, before being sent. This allows to send a
+            Content-Length, which servers not supporting chunked requests
+            require, at the cost of compressing the archive twice.
+    """
+    
+    
+    def __init__(self, files: Optional[Dict[str, Union[bytes, str]]] = None,
+                 compresslevel: int = 6, chunk_size: int = 2 ** 16, sized: bool = True):
+        self.compresslevel = compresslevel
+        self.chunk_size = chunk_size
+        self.sized = sized
+        self.mtime = int(time.time())
+        self._entries: List[Tuple[tarfile.TarInfo, Source]] = []
+        self._size = None
+        for path, content in (files or {}).items():
+            self.add_file(path, content)
+    
+    
+    def __repr__(self):
+        return "<EnvironmentBuilder %d entries>" % len(self._entries)
+    
+    
+    def __iter__(self) -> Iterator[bytes]:
+        return self.chunks()
+    
+    
+    def _add(self, info: tarfile.TarInfo, source: Source = None):
+        self._entries.append((info, source))
+        self._size = None
+    
+    
+    def add_file(self, path: str, content: Union[bytes, str], mode: int = 0o644):
+        """Add a file at <path> inside the environment containing <content>.
+        
+        Str content is encoded in UTF-8."""
+        if isinstance(content, str):
+            content = content.encode()
+        info = tarfile.TarInfo(path)
+        info.size = len(content)
+        info.mode = mode
+        info.mtime = self.mtime
+        self._add(info, lambda: iter((content,)))
+    
+    
+    def add_path(self, source: str, arcname: Optional[str] = None):
+        """Add the file or directory <source> of the local file system at
+        <arcname> inside the environment, recursively for directories.
+        
+        <arcname> defaults to the basename of <source>, an empty <arcname>
+        adds the content of the directory <source> at the root of the
+        environment."""
+        if arcname is None:
+            arcname = os.path.basename(os.path.normpath(source))
+        
+        st = os.lstat(source)
+        if stat.S_ISDIR(st.st_mode):
+            if arcname:
+                self._add(self._info(arcname, st, tarfile.DIRTYPE))
+            for name in sorted(os.listdir(source)):
+                self.add_path(os.path.join(source, name), os.path.join(arcname, name))
+        elif stat.S_ISLNK(st.st_mode):
+            info = self._info(arcname, st, tarfile.SYMTYPE)
+            info.linkname = os.readlink(source)
+            self._add(info)
+        elif stat.S_ISREG(st.st_mode):
+            info = self._info(arcname, st, tarfile.REGTYPE)
+            info.size = st.st_size
+            self._add(info, lambda: self._read(source, info.size))
+    
+    
+    @staticmethod
+    def _info(arcname: str, st: os.stat_result, type_: bytes) -> tarfile.TarInfo:
+        info = tarfile.TarInfo(arcname)
+        info.type = type_
+        info.mode = stat.S_IMODE(st.st_mode)
+        info.mtime = int(st.st_mtime)
+        return info
+    
+    
+    def _read(self, path: str, size: int) -> Iterator[bytes]:
+        """Yield the first <size> bytes of <path> in chunks."""
+        with open(path, "rb") as f:
+            while size > 0:
+                chunk = f.read(min(size, self.chunk_size))
+                if not chunk:
+                    raise OSError("'%s' was truncated while being archived" % path)
+                size -= len(chunk)
+                yield chunk
+    
+    
+    def _tar(self) -> Iterator[bytes]:
+        """Yield the uncompressed tar archive."""
+        written = 0
+        for info, source in self._entries:
+            header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+            written += len(header)
+            yield header
+            if source is not None:
+                for chunk in source():
+                    yield chunk
+                padding = -info.size % tarfile.BLOCKSIZE
+                written += info.size + padding
+                yield tarfile.NUL * padding
+        
+        end = 2 * tarfile.BLOCKSIZE
+        end += -(written + end) % tarfile.RECORDSIZE
+        yield tarfile.NUL * end
+    
+    
+    def chunks(self) -> Iterator[bytes]:
+        """Yield the compressed archive in chunks of approximately
+        <chunk_size> bytes."""
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        buffer = bytearray()
+        for data in self._tar():
+            buffer += compressor.compress(data)
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += compressor.flush()
+        if buffer:
+            yield bytes(buffer)
+    
+    
+    def size(self) -> int:
+        """Return the size of the compressed archive, building it once if it
+        was not computed yet."""
+        if self._size is None:
+            self._size = sum(len(chunk) for chunk in self.chunks())
+        return self._size
+    
+    
+    def open(self) -> "EnvironmentReader":
+        """Return a read-only file object streaming the compressed archive."""
+        return EnvironmentReader(self)
+    
+    
+    def build(self) -> bytes:
+        """Return the whole compressed archive."""
+        return b"".join(self.chunks())
+
+
+
+class EnvironmentReader(io.RawIOBase):
+    """A read-only, non-seekable, file object streaming the archive of an
+    EnvironmentBuilder."""
+    
+    name = "environment.tgz"
+    
+    
+    def __init__(self, builder: EnvironmentBuilder):
+        super().__init__()
+        self.builder = builder
+        self._chunks = builder.chunks()
+        self._buffer = b""
+    
+    
+    def __len__(self):
+        return self.builder.size()
+    
+    
+    def readable(self) -> bool:
+        return True
+    
+    
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            self._buffer = next(self._chunks, None)
+            if self._buffer is None:
+                self._buffer = b""
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
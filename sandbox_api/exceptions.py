@@ -2,13 +2,16 @@
 #
 # Authors:
 #   - Coumes Quentin <coumes.quentin@gmail.com>
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
-import aiohttp
-import requests
 
+if TYPE_CHECKING:  # pragma: no cover
+    import aiohttp
+    import requests
 
-Response = Union[requests.Response, aiohttp.ClientResponse]
+# Only used in annotations, so that importing the exceptions does not load
+# both HTTP stacks.
+Response = Union["requests.Response", "aiohttp.ClientResponse"]
 
 
 def get_status_code(response: Response):
@@ -37,6 +40,29 @@ class SandboxError(Exception):
         return "Sandbox responded with status %d" % get_status_code(self.response)
 
 
+class SandboxUnavailable(SandboxError):
+    """Raised when a request could not be sent because no sandbox is able to
+    handle it."""
+    
+    
+    def __init__(self, message: str, response: Response = None):
+        super().__init__(response, message)
+    
+    
+    def __str__(self):
+        return self.message
+
+
+class SandboxBusy(SandboxUnavailable):
+    """Raised when an execution could not be admitted in time by the
+    client-side admission limiter."""
+
+
+class SandboxCircuitOpen(SandboxUnavailable):
+    """Raised when a request is not sent because the circuit breaker of the
+    sandbox is open."""
+
+
 class Sandbox300(SandboxError):
     pass
 
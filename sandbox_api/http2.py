@@ -0,0 +1,201 @@
+# http2.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Send the requests of Sandbox over HTTP/2 with httpx, see
+transport.HTTP2Transport.
+
+HTTP2Adapter is a requests transport adapter, so that Sandbox keeps handling
+requests.Response. Errors of httpx are raised as the corresponding exceptions
+of requests."""
+
+import asyncio
+import contextlib
+import threading
+from typing import AsyncIterator, Awaitable, Iterable, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+
+# Headers specific to an HTTP/1.1 connection, forbidden in HTTP/2.
+CONNECTION_HEADERS = {
+    "connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade",
+}
+
+
+def _timeout(timeout) -> dict:
+    """Return the httpx timeout extension corresponding to the <timeout> of
+    requests, a number, a (connect, read) tuple or None."""
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return {"connect": connect, "read": read, "write": read, "pool": connect}
+
+
+def _headers(headers) -> list:
+    """Return <headers> without the headers specific to a connection."""
+    return [(k, v) for k, v in headers.items() if k.lower() not in CONNECTION_HEADERS]
+
+
+@contextlib.contextmanager
+def _requests_errors(request: requests.PreparedRequest):
+    """Raise the errors of httpx as the corresponding requests exceptions."""
+    try:
+        yield
+    except (httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+        raise requests.ConnectTimeout(e, request=request) from e
+    except httpx.TimeoutException as e:
+        raise requests.ReadTimeout(e, request=request) from e
+    except httpx.ConnectError as e:
+        reason = MaxRetryError(None, request.url, NewConnectionError(None, str(e)))
+        raise requests.ConnectionError(reason, request=request) from e
+    except httpx.TransportError as e:
+        raise requests.ConnectionError(e, request=request) from e
+
+
+
+class _LoopThread:
+    """An event loop running in a daemon thread, started on first use, on
+    which the coroutines of other threads are run."""
+    
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+    
+    
+    def run(self, coroutine: Awaitable):
+        """Run <coroutine> on the loop, returning its result once done."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="sandbox-api-http2", daemon=True
+                )
+                self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+    
+    
+    async def iterate(self, iterable: Iterable[bytes]) -> AsyncIterator[bytes]:
+        """Yield the chunks of <iterable>, a synchronous iterable consumed in
+        the default executor so that reading it does not block the loop."""
+        iterator, done = iter(iterable), object()
+        while True:
+            chunk = await self._loop.run_in_executor(None, next, iterator, done)
+            if chunk is done:
+                return
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+    
+    
+    def close(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+                self._loop = self._thread = None
+
+
+
+class _RawResponse:
+    """The part of urllib3.HTTPResponse read by requests.Response, streaming
+    the decoded content of an httpx response from the adapter's loop."""
+    
+    
+    def __init__(self, response: httpx.Response, request: requests.PreparedRequest,
+                 loop: _LoopThread):
+        self._response = response
+        self._request = request
+        self._loop = loop
+    
+    
+    def stream(self, chunk_size: int = 2 ** 16, decode_content: bool = True) -> Iterator[bytes]:
+        chunks = self._response.aiter_bytes(chunk_size)
+        try:
+            with _requests_errors(self._request):
+                while True:
+                    try:
+                        yield self._loop.run(chunks.__anext__())
+                    except StopAsyncIteration:
+                        return
+        finally:
+            self.close()
+    
+    
+    def read(self, amt: Optional[int] = None, decode_content: bool = True) -> bytes:
+        with _requests_errors(self._request):
+            return self._loop.run(self._response.aread())
+    
+    
+    def close(self):
+        if not self._response.is_closed:
+            self._loop.run(self._response.aclose())
+    
+    
+    def release_conn(self):
+        self.close()
+
+
+
+class HTTP2Adapter(BaseAdapter):
+    """A requests transport adapter sending the requests through an
+    httpx.AsyncHTTPTransport created with <options>, multiplexing them over
+    HTTP/2 connections.
+    
+    The connections are driven by an event loop running in a thread of the
+    adapter, httpx's synchronous HTTP/2 connections not being safe to share
+    between threads. Proxies and the per-request TLS options of requests are
+    ignored."""
+    
+    
+    def __init__(self, options: dict):
+        super().__init__()
+        self.transport = httpx.AsyncHTTPTransport(**options)
+        self.loop = _LoopThread()
+    
+    
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None,
+             verify=True, cert=None, proxies=None) -> requests.Response:
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode()
+        elif body is not None and not isinstance(body, bytes):
+            body = self.loop.iterate(body)
+        outgoing = httpx.Request(
+            request.method, request.url, headers=_headers(request.headers), content=body,
+            extensions={"timeout": _timeout(timeout)}
+        )
+        with _requests_errors(request):
+            incoming = self.loop.run(self.transport.handle_async_request(outgoing))
+        incoming.request = outgoing
+        
+        response = requests.Response()
+        response.status_code = incoming.status_code
+        response.headers = CaseInsensitiveDict(incoming.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = incoming.reason_phrase
+        response.raw = _RawResponse(incoming, request, self.loop)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+    
+    
+    def close(self):
+        if not self.loop.started:
+            return
+        try:
+            self.loop.run(self.transport.aclose())
+        finally:
+            self.loop.close()
@@ -0,0 +1,363 @@
+# instrumentation.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Measure how long each phase of the requests sent to a sandbox takes,
+passing the timings to pluggable sinks."""
+
+import bisect
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .exceptions import SandboxError
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    import aiohttp
+
+
+logger = logging.getLogger("sandbox_api")
+
+# Upper bounds in seconds of the buckets of the histograms.
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+    float("inf"),
+)
+
+
+def endpoint_name(base_url: str, url) -> str:
+    """Return the name of the endpoint of <url>, the first segment of its
+    path relative to <base_url> (E.G. 'execute', 'environments')."""
+    base = urlsplit(base_url).path
+    path = urlsplit(str(url)).path
+    if path.startswith(base):
+        path = path[len(base):]
+    return path.strip("/").split("/", 1)[0] or "/"
+
+
+
+class RequestTiming:
+    """Timings of a request.
+    
+    * endpoint : Name of the endpoint, see endpoint_name().
+    * method : HTTP method of the request.
+    * status : Status code of the response, None if the request failed.
+    * error : Name of the class of the exception raised, if any.
+    * expected : Whether <status> is handled by the caller (E.G. 404 for
+            check()), the request then not being an error.
+    * phases : Duration in seconds of each phase of the request :
+            - queued : Waiting for a free connection of the pool (ASandbox).
+            - dns : Resolving the host (ASandbox).
+            - connect : Establishing a new connection (ASandbox).
+            - send : Sending the request, including the environment (ASandbox).
+            - wait : Waiting for the headers of the response, including the
+                    execution on the sandbox. For Sandbox, this includes
+                    the connection and the sending of the request.
+            - read : Reading the body of the response.
+            - decode : Decoding the JSON of the response.
+            - server : The 'total_time' reported by the sandbox.
+            - total : From the start of the request to the headers of the
+                    response (to the end of the body for Sandbox).
+    * sent_bytes : Size of the body of the request.
+    * received_bytes : Size of the body of the response according to its
+            Content-Length header, 0 if it has none.
+    """
+    
+    
+    def __init__(self, endpoint: str, method: str):
+        self.endpoint = endpoint
+        self.method = method
+        self.status = None
+        self.error = None
+        self.expected = False
+        self.phases = {}
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.start = time.perf_counter()
+        self.marks = {}
+    
+    
+    def __repr__(self):
+        return "<RequestTiming %s %s status=%s %s>" % (
+            self.method, self.endpoint, self.status,
+            " ".join("%s=%.4f" % item for item in self.phases.items())
+        )
+    
+    
+    def mark(self, name: str):
+        """Record that the event <name> happened now."""
+        self.marks[name] = time.perf_counter()
+    
+    
+    def span(self, start: str, end: str, phase: str):
+        """Record the time between the events <start> and <end> as <phase>,
+        if both happened."""
+        if start in self.marks and end in self.marks:
+            self.phases[phase] = self.marks[end] - self.marks[start]
+
+
+
+class Histogram:
+    """Distribution of durations in fixed buckets."""
+    
+    
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+    
+    
+    def __repr__(self):
+        return "<Histogram count=%d mean=%.4f max=%.4f>" % (self.count, self.mean, self.max)
+    
+    
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+    
+    
+    def observe(self, value: float):
+        """Add <value> to the distribution."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[min(index, len(self.counts) - 1)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+    
+    
+    def quantile(self, q: float) -> float:
+        """Return an estimate of the <q>-quantile (0 <= q <= 1), the upper
+        bound of the bucket containing it (capped to the maximum)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max  # pragma: no cover
+    
+    
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean":  self.mean,
+            "p50":   self.quantile(0.5),
+            "p90":   self.quantile(0.9),
+            "p99":   self.quantile(0.99),
+            "max":   self.max,
+        }
+
+
+
+class Sink:
+    """Receive the timings of requests. Subclasses override the methods of
+    the events they are interested in."""
+    
+    
+    def request_started(self, timing: RequestTiming):
+        """Called when a request is about to be sent."""
+    
+    
+    def request_finished(self, timing: RequestTiming):
+        """Called once the response is received (or the request failed), with
+        the timings of its phases."""
+    
+    
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        """Called with the timings measured after the request finished, such
+        as 'read', 'decode' and 'server' for ASandbox."""
+    
+    
+    def error(self, endpoint: str, error: SandboxError):
+        """Called with the SandboxError raised before or instead of sending a
+        request of <endpoint>, such as SandboxCircuitOpen or SandboxBusy."""
+
+
+
+class HistogramSink(Sink):
+    """Record the timings of every phase into a Histogram per endpoint."""
+    
+    
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+    
+    
+    def histogram(self, endpoint: str, phase: str) -> Histogram:
+        """Return the histogram of <phase> of <endpoint>, creating it if
+        needed."""
+        histogram = self.histograms.get((endpoint, phase))
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault((endpoint, phase), Histogram(self.buckets))
+        return histogram
+    
+    
+    def request_finished(self, timing: RequestTiming):
+        for phase, seconds in timing.phases.items():
+            self.histogram(timing.endpoint, phase).observe(seconds)
+    
+    
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        self.histogram(endpoint, phase).observe(seconds)
+    
+    
+    def summary(self) -> Dict[str, Dict[str, dict]]:
+        """Return the summary of every histogram, by endpoint then phase."""
+        summary = {}
+        for (endpoint, phase), histogram in sorted(self.histograms.items()):
+            summary.setdefault(endpoint, {})[phase] = histogram.summary()
+        return summary
+
+
+
+class LoggingSink(Sink):
+    """Log the timings of every request at the given <level>."""
+    
+    
+    def __init__(self, level: int = logging.DEBUG, logger: logging.Logger = logger):
+        self.level = level
+        self.logger = logger
+    
+    
+    def request_finished(self, timing: RequestTiming):
+        self.logger.log(self.level, "%r", timing)
+
+
+
+class Instrumentation:
+    """Dispatch the timings of requests to <sinks>, a single HistogramSink
+    by default."""
+    
+    
+    def __init__(self, sinks: Optional[Iterable[Sink]] = None):
+        self.sinks = [HistogramSink()] if sinks is None else list(sinks)
+    
+    
+    def __repr__(self):
+        return "<Instrumentation sinks=%r>" % self.sinks
+    
+    
+    @property
+    def histograms(self) -> Optional[HistogramSink]:
+        """The first HistogramSink of the sinks, None if there is none."""
+        return next((s for s in self.sinks if isinstance(s, HistogramSink)), None)
+    
+    
+    def start(self, endpoint: str, method: str) -> RequestTiming:
+        """Return the timing of a request about to be sent."""
+        timing = RequestTiming(endpoint, method)
+        for sink in self.sinks:
+            sink.request_started(timing)
+        return timing
+    
+    
+    def finish(self, timing: RequestTiming, status: Optional[int] = None,
+               error: Optional[BaseException] = None, expected: bool = False):
+        """Record the end of the request of <timing>, <expected> telling
+        whether <status> is handled by the caller."""
+        timing.status = status
+        timing.expected = expected
+        timing.error = None if error is None else type(error).__name__
+        timing.phases["total"] = time.perf_counter() - timing.start
+        for sink in self.sinks:
+            sink.request_finished(timing)
+        if isinstance(error, SandboxError):
+            self.error(timing.endpoint, error)
+    
+    
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        """Record a timing measured after the request finished."""
+        for sink in self.sinks:
+            sink.observe(endpoint, phase, seconds)
+    
+    
+    def error(self, endpoint: str, error: SandboxError):
+        """Record a SandboxError raised before or instead of sending a request
+        of <endpoint>."""
+        for sink in self.sinks:
+            sink.error(endpoint, error)
+    
+    
+    def decoded(self, endpoint: str, result, seconds: float):
+        """Record the <seconds> taken to decode the JSON <result> of a
+        response of <endpoint>, and the execution time reported by the
+        sandbox if any."""
+        self.observe(endpoint, "decode", seconds)
+        total_time = result.get("total_time") if isinstance(result, dict) else None
+        if isinstance(total_time, (int, float)):
+            self.observe(endpoint, "server", total_time)
+    
+    
+    def trace_config(self) -> "aiohttp.TraceConfig":
+        """Return an aiohttp TraceConfig filling the RequestTiming given as
+        'trace_request_ctx' to the requests of a session."""
+        import aiohttp
+        
+        config = aiohttp.TraceConfig(trace_config_ctx_factory=_trace_context)
+        events = {
+            "on_request_start":           "start",
+            "on_connection_queued_start": "queued_start",
+            "on_connection_queued_end":   "queued_end",
+            "on_dns_resolvehost_start":   "dns_start",
+            "on_dns_resolvehost_end":     "dns_end",
+            "on_connection_create_start": "connect_start",
+            "on_connection_create_end":   "connect_end",
+            "on_request_headers_sent":    "sent",
+            "on_request_chunk_sent":      "sent",
+            "on_request_end":             "headers",
+        }
+        for signal, name in events.items():
+            getattr(config, signal).append(_marker(name))
+        config.on_request_chunk_sent.append(_count_sent)
+        return config
+
+
+
+def _trace_context(trace_request_ctx: Optional[RequestTiming] = None) -> SimpleNamespace:
+    return SimpleNamespace(trace_request_ctx=trace_request_ctx)
+
+
+def _marker(name: str):
+    """Return a TraceConfig callback marking the event <name> on the timing
+    of the request."""
+    
+    async def callback(session, context, params):
+        timing = context.trace_request_ctx
+        if timing is not None:
+            timing.mark(name)
+    
+    return callback
+
+
+async def _count_sent(session, context, params):
+    """TraceConfig callback adding the size of the chunks sent to the timing
+    of the request."""
+    timing = context.trace_request_ctx
+    if timing is not None:
+        timing.sent_bytes += len(params.chunk)
+
+
+def trace_phases(timing: RequestTiming):
+    """Compute the phases of <timing> from the events marked by the trace
+    config of Instrumentation."""
+    timing.span("queued_start", "queued_end", "queued")
+    timing.span("dns_start", "dns_end", "dns")
+    timing.span("connect_start", "connect_end", "connect")
+    if "connect_end" in timing.marks:
+        timing.span("connect_end", "sent", "send")
+    else:
+        timing.span("start", "sent", "send")
+    timing.span("sent", "headers", "wait")
@@ -0,0 +1,148 @@
+# metacache.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Keep the responses of the endpoints returning data which rarely changes,
+such as the specifications and the libraries of a sandbox."""
+
+import threading
+import time
+from typing import Optional, Tuple
+
+
+
+class MetadataCache:
+    """Cache the responses of specifications() and libraries().
+    
+    A response is considered fresh during <ttl> seconds. A stale response
+    is refreshed with a conditional request (If-None-Match / If-Modified-Since)
+    if the sandbox sent an ETag or a Last-Modified header, so that an
+    unchanged response is not sent again.
+    
+    The responses are returned as shallow copies, not to copy them entirely
+    on every hit : their nested values are shared with the cache and must not
+    be mutated.
+    
+    * ttl : Time in seconds during which a response is fresh.
+    * background : If True, a stale response is returned immediately while
+            being refreshed in the background, the caller only waiting for
+            the first request. If False, the caller waits for the refresh.
+    """
+    
+    
+    def __init__(self, ttl: float = 300.0, background: bool = True):
+        self.ttl = ttl
+        self.background = background
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.not_modified_count = 0
+        self.errors = 0
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+    
+    
+    def __repr__(self):
+        return "<MetadataCache size=%d hits=%d misses=%d refreshes=%d>" % (
+            len(self), self.hits, self.misses, self.refreshes
+        )
+    
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    
+    def stats(self) -> dict:
+        """Return the statistics of the cache."""
+        return {
+            "size":         len(self),
+            "hits":         self.hits,
+            "misses":       self.misses,
+            "refreshes":    self.refreshes,
+            "not_modified": self.not_modified_count,
+            "errors":       self.errors,
+        }
+    
+    
+    def lookup(self, name: str) -> Tuple[Optional[dict], bool]:
+        """Return a shallow copy of the response of the endpoint <name> (None
+        if it is unknown) and whether it is still fresh."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self.hits += 1
+            return dict(entry["value"]), time.monotonic() - entry["time"] < self.ttl
+    
+    
+    def validators(self, name: str) -> Optional[dict]:
+        """Return the headers making the request of the endpoint <name>
+        conditional, None if the sandbox did not send any validator."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        headers = {}
+        if entry["etag"] is not None:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"] is not None:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers or None
+    
+    
+    def store(self, name: str, value: dict, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> dict:
+        """Record <value> as the response of the endpoint <name>, returning a
+        shallow copy of it. <value> must not be mutated afterward."""
+        with self._lock:
+            self.refreshes += 1
+            self._entries[name] = {
+                "value":         value,
+                "etag":          etag,
+                "last_modified": last_modified,
+                "time":          time.monotonic(),
+            }
+            return dict(value)
+    
+    
+    def not_modified(self, name: str) -> Optional[dict]:
+        """Record that the response of the endpoint <name> did not change,
+        returning a shallow copy of it, None if it was invalidated
+        meanwhile."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            self.not_modified_count += 1
+            entry["time"] = time.monotonic()
+            return dict(entry["value"])
+    
+    
+    def begin_refresh(self, name: str) -> bool:
+        """Return whether a background refresh of the endpoint <name> should be
+        started, False if one is already running."""
+        with self._lock:
+            if name in self._refreshing:
+                return False
+            self._refreshing.add(name)
+            return True
+    
+    
+    def end_refresh(self, name: str, failed: bool = False):
+        """Record the end of the background refresh of the endpoint <name>."""
+        with self._lock:
+            self._refreshing.discard(name)
+            self.errors += failed
+    
+    
+    def invalidate(self, name: Optional[str] = None):
+        """Forget the response of the endpoint <name>, or of every endpoint if
+        None. The next call waits for a new request."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
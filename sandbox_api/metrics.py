@@ -0,0 +1,369 @@
+# metrics.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Keep in-process counters and histograms of the requests sent to
+sandboxes, exposed in the OpenMetrics text format."""
+
+import bisect
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .exceptions import SandboxError
+from .instrumentation import BUCKETS, RequestTiming, Sink
+
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Tuple[str, ...], Labels, float]
+
+
+def status_class(status: Optional[int]) -> str:
+    """Return the class of <status> (E.G. '2xx'), 'error' if the request
+    failed without a response."""
+    return "error" if status is None else "%dxx" % (status // 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+
+class _Owner:
+    """Stored in the thread-local data of a metric, freed when its thread
+    dies."""
+    
+    __slots__ = ("__weakref__",)
+
+
+def _retire(metric: "weakref.ReferenceType[Metric]", key: int):
+    """Fold the shard <key> of <metric> into its retired values, once the
+    thread owning it died."""
+    metric = metric()
+    if metric is None:
+        return
+    with metric._lock:
+        shard = metric._shards.pop(key, None)
+        for labels, value in (shard or {}).items():
+            metric._retired[labels] = metric._combine(metric._retired.get(labels), value)
+
+
+
+class Metric:
+    """Base class of the metrics.
+    
+    Values are stored in one shard per thread, a dict mapping the values of
+    the labels to the value of the metric. Recording only touches the shard
+    of the current thread and never takes a lock, except the first time a
+    thread records a value. Every coroutine of an event loop thus shares the
+    same shard. When a thread dies, its shard is folded into the retired
+    values, so that short-lived threads do not accumulate shards. Collecting
+    sums the retired values and the shards of every living thread.
+    
+    * name : Name of the metric family, without suffix.
+    * documentation : Description of the metric.
+    * labelnames : Name of the labels of the metric.
+    """
+    
+    type = "unknown"
+    
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: Dict[int, dict] = {}
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+    
+    
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.name)
+    
+    
+    def _shard(self) -> dict:
+        """Return the shard of the current thread."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard, owner = {}, _Owner()
+            with self._lock:
+                self._shards[id(owner)] = shard
+            weakref.finalize(owner, _retire, weakref.ref(self), id(owner))
+            self._local.owner = owner
+            self._local.shard = shard
+            return shard
+    
+    
+    def _combine(self, total, value):
+        """Return the sum of the values <total> (None if there is none yet)
+        and <value> of some labels."""
+        raise NotImplementedError  # pragma: no cover
+    
+    
+    def _items(self) -> Iterator[Tuple[Labels, object]]:
+        """Yield the (labels, value) pairs of the retired values and of every
+        shard."""
+        with self._lock:
+            items = list(self._retired.items())
+            for shard in self._shards.values():
+                # Copying a dict is atomic, its thread may be updating it
+                items.extend(list(shard.items()))
+        yield from items
+    
+    
+    def samples(self) -> Iterator[Sample]:
+        """Yield the (suffix, label names, labels, value) samples of the
+        metric."""
+        raise NotImplementedError  # pragma: no cover
+    
+    
+    def exposition(self) -> List[str]:
+        """Return the lines of the metric in the OpenMetrics text format."""
+        lines = [
+            "# TYPE %s %s" % (self.name, self.type),
+            "# HELP %s %s" % (self.name, self.documentation),
+        ]
+        for suffix, names, labels, value in self.samples():
+            pairs = ",".join('%s="%s"' % (n, _escape(v)) for n, v in zip(names, labels))
+            lines.append("%s%s%s %s" % (
+                self.name, suffix, "{%s}" % pairs if pairs else "", _number(value)
+            ))
+        return lines
+
+
+
+class Counter(Metric):
+    """A monotonically increasing value."""
+    
+    type = "counter"
+    
+    
+    def inc(self, labels: Labels = (), amount: float = 1):
+        """Increase the value of <labels> by <amount>."""
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+    
+    
+    def _combine(self, total, value):
+        return value if total is None else total + value
+    
+    
+    def values(self) -> Dict[Labels, float]:
+        """Return the value of every labels."""
+        values = {}
+        for labels, value in self._items():
+            values[labels] = values.get(labels, 0) + value
+        return values
+    
+    
+    def samples(self) -> Iterator[Sample]:
+        for labels, value in sorted(self.values().items()):
+            yield "_total", self.labelnames, labels, value
+
+
+
+class Gauge(Counter):
+    """A value which can go up and down, E.G. the number of requests in
+    flight. A value increased by a thread and decreased by another is
+    correctly summed."""
+    
+    type = "gauge"
+    
+    
+    def dec(self, labels: Labels = (), amount: float = 1):
+        """Decrease the value of <labels> by <amount>."""
+        self.inc(labels, -amount)
+    
+    
+    def samples(self) -> Iterator[Sample]:
+        for labels, value in sorted(self.values().items()):
+            yield "", self.labelnames, labels, value
+
+
+
+class Histogram(Metric):
+    """Distribution of values in fixed buckets."""
+    
+    type = "histogram"
+    
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        if buckets[-1] != float("inf"):
+            buckets = tuple(buckets) + (float("inf"),)
+        self.buckets = tuple(buckets)
+    
+    
+    def observe(self, value: float, labels: Labels = ()):
+        """Add <value> to the distribution of <labels>."""
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Count of each bucket followed by the sum of the values
+            entry = shard[labels] = [0] * len(self.buckets) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+    
+    
+    def _combine(self, total, value):
+        if total is None:
+            return list(value)
+        return [t + v for t, v in zip(total, value)]
+    
+    
+    def values(self) -> Dict[Labels, List[float]]:
+        """Return the count of each bucket followed by the sum of the values,
+        for every labels."""
+        values = {}
+        for labels, entry in self._items():
+            total = values.setdefault(labels, [0] * len(entry))
+            for i, value in enumerate(list(entry)):
+                total[i] += value
+        return values
+    
+    
+    def samples(self) -> Iterator[Sample]:
+        for labels, entry in sorted(self.values().items()):
+            cumulative, names = 0, self.labelnames + ("le",)
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield "_bucket", names, labels + (_number(bound),), cumulative
+            yield "_count", self.labelnames, labels, cumulative
+            yield "_sum", self.labelnames, labels, entry[-1]
+
+
+
+class MetricsSink(Sink):
+    """Keep counters and histograms of the requests sent to sandboxes, to be
+    given to an Instrumentation.
+    
+    * requests : Requests sent, by endpoint, method and status class.
+    * errors : SandboxError raised, by endpoint and exception. A response
+            whose status is 300 or more (except 304 Not Modified and the
+            statuses expected by the caller, see RequestTiming) is counted as
+            the corresponding SandboxError (E.G. Sandbox404).
+    * in_flight : Requests waiting for a response, by endpoint.
+    * sent_bytes, received_bytes : Size of the bodies of requests and
+            responses, by endpoint.
+    * duration : Latency of requests measured by the client, by endpoint.
+    * server_time : The 'total_time' reported by the sandbox, by endpoint.
+    """
+    
+    
+    def __init__(self, namespace: str = "sandbox", buckets: Tuple[float, ...] = BUCKETS):
+        self.requests = Counter(
+            namespace + "_requests", "Requests sent to the sandbox.",
+            ("endpoint", "method", "status")
+        )
+        self.errors = Counter(
+            namespace + "_errors", "SandboxError raised.", ("endpoint", "exception")
+        )
+        self.in_flight = Gauge(
+            namespace + "_requests_in_flight", "Requests waiting for a response.", ("endpoint",)
+        )
+        self.sent_bytes = Counter(
+            namespace + "_sent_bytes", "Size of the bodies of the requests.", ("endpoint",)
+        )
+        self.received_bytes = Counter(
+            namespace + "_received_bytes", "Size of the bodies of the responses.", ("endpoint",)
+        )
+        self.duration = Histogram(
+            namespace + "_request_duration_seconds", "Latency measured by the client.",
+            ("endpoint",), buckets
+        )
+        self.server_time = Histogram(
+            namespace + "_server_time_seconds", "Execution time reported by the sandbox.",
+            ("endpoint",), buckets
+        )
+    
+    
+    def __repr__(self):
+        return "<MetricsSink %s>" % ", ".join(m.name for m in self.metrics)
+    
+    
+    @property
+    def metrics(self) -> List[Metric]:
+        return [
+            self.requests, self.errors, self.in_flight, self.sent_bytes, self.received_bytes,
+            self.duration, self.server_time,
+        ]
+    
+    
+    def request_started(self, timing: RequestTiming):
+        self.in_flight.inc((timing.endpoint,))
+    
+    
+    def request_finished(self, timing: RequestTiming):
+        labels = (timing.endpoint,)
+        self.in_flight.dec(labels)
+        self.requests.inc((timing.endpoint, timing.method, status_class(timing.status)))
+        if (timing.status is not None and timing.status >= 300 and timing.status != 304
+                and not timing.expected):
+            self.errors.inc((timing.endpoint, "Sandbox%d" % timing.status))
+        if timing.sent_bytes:
+            self.sent_bytes.inc(labels, timing.sent_bytes)
+        if timing.received_bytes:
+            self.received_bytes.inc(labels, timing.received_bytes)
+        self.duration.observe(timing.phases["total"], labels)
+    
+    
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        if phase == "server":
+            self.server_time.observe(seconds, (endpoint,))
+    
+    
+    def error(self, endpoint: str, error: SandboxError):
+        self.errors.inc((endpoint, type(error).__name__))
+    
+    
+    def exposition(self) -> str:
+        """Return every metric in the OpenMetrics text format."""
+        lines = [line for metric in self.metrics for line in metric.exposition()]
+        lines.append("# EOF\n")
+        return "\n".join(lines)
+
+
+
+def metrics_handler(sink: MetricsSink) -> type:
+    """Return a http.server request handler answering GET requests with the
+    metrics of <sink>."""
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        
+        def do_GET(self):
+            body = sink.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return MetricsHandler
+
+
+def serve_metrics(sink: MetricsSink, host: str = "", port: int = 9464) -> ThreadingHTTPServer:
+    """Serve the metrics of <sink> on <host>:<port> in a daemon thread,
+    returning the server. The server is stopped with its shutdown()
+    method."""
+    server = ThreadingHTTPServer((host, port), metrics_handler(sink))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
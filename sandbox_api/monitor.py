@@ -0,0 +1,308 @@
+# monitor.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Poll the usage of sandboxes in the background, keeping a fixed-size time
+series of samples from which scheduling hints are derived."""
+
+import asyncio
+import time
+from array import array
+from contextlib import AbstractAsyncContextManager
+from typing import Dict, Iterable, Optional, Union
+
+from .asandbox import ASandbox
+
+
+# Fields of a sample, stored in one column each. 'read_bps' and 'write_bps'
+# are summed over every device, 'sent_bytes' and 'received_bytes' are
+# cumulative counters.
+FIELDS = (
+    "time", "cpu", "frequency", "ram", "swap", "process", "containers", "read_bps", "write_bps",
+    "sent_bytes", "received_bytes",
+)
+
+
+def flatten_usage(usage: dict, timestamp: float) -> Dict[str, float]:
+    """Return the fields of a sample from a response of usage()."""
+    return {
+        "time":           timestamp,
+        "cpu":            usage["cpu"]["usage"],
+        "frequency":      usage["cpu"]["frequency"],
+        "ram":            usage["memory"]["ram"],
+        "swap":           usage["memory"]["swap"],
+        "process":        usage["process"],
+        "containers":     usage["container"],
+        "read_bps":       sum(usage["io"]["read_bps"].values()),
+        "write_bps":      sum(usage["io"]["write_bps"].values()),
+        "sent_bytes":     usage["network"]["sent_bytes"],
+        "received_bytes": usage["network"]["received_bytes"],
+    }
+
+
+
+class UsageSeries:
+    """The last <size> usage samples of a sandbox.
+    
+    Samples are stored in a ring buffer of one array of doubles per field,
+    the oldest sample being overwritten once the buffer is full. The
+    duration of the last <size> executions given to observe() are kept the
+    same way to estimate the queue wait.
+    
+    * capacity : Number of containers of the sandbox, None until its
+            specifications are retrieved.
+    * errors : Number of failed polls.
+    * last_error : The exception raised by the last failed poll.
+    """
+    
+    
+    def __init__(self, size: int = 720):
+        if size < 1:
+            raise ValueError("size must be at least 1, not %d" % size)
+        self.size = size
+        self.capacity = None
+        self.errors = 0
+        self.last_error = None
+        self._columns = {field: array("d", bytes(8 * size)) for field in FIELDS}
+        self._next = 0
+        self._count = 0
+        self._durations = array("d", bytes(8 * size))
+        self._durations_next = 0
+        self._durations_count = 0
+    
+    
+    def __repr__(self):
+        return "<UsageSeries samples=%d capacity=%s>" % (len(self), self.capacity)
+    
+    
+    def __len__(self):
+        return self._count
+    
+    
+    def append(self, usage: dict, timestamp: Optional[float] = None):
+        """Add a sample from a response of usage(), taken at <timestamp>
+        (now if None)."""
+        sample = flatten_usage(usage, time.time() if timestamp is None else timestamp)
+        for field, value in sample.items():
+            self._columns[field][self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+    
+    
+    def values(self, field: str, window: Optional[int] = None) -> array:
+        """Return the values of <field> of the last <window> samples (every
+        sample if None), from the oldest to the newest."""
+        count = self._count if window is None else min(window, self._count)
+        column = self._columns[field]
+        start = (self._next - count) % self.size
+        if start + count <= self.size:
+            return column[start:start + count]
+        return column[start:] + column[:self._next]
+    
+    
+    def latest(self) -> Optional[Dict[str, float]]:
+        """Return the fields of the last sample, None if there is none."""
+        if not self._count:
+            return None
+        index = (self._next - 1) % self.size
+        return {field: column[index] for field, column in self._columns.items()}
+    
+    
+    def moving_average(self, field: str, window: Optional[int] = None) -> Optional[float]:
+        """Return the mean of <field> over the last <window> samples (every
+        sample if None), None if there is none."""
+        values = self.values(field, window)
+        return sum(values) / len(values) if values else None
+    
+    
+    def rate(self, field: str, window: Optional[int] = None) -> Optional[float]:
+        """Return the increase per second of the cumulative counter <field>
+        over the last <window> samples, None if there are less than two."""
+        values, times = self.values(field, window), self.values("time", window)
+        if len(values) < 2 or times[-1] <= times[0]:
+            return None
+        return (values[-1] - values[0]) / (times[-1] - times[0])
+    
+    
+    def free_containers(self) -> Optional[int]:
+        """Return the number of free containers according to the last
+        sample, None if the capacity or the usage is unknown."""
+        if self.capacity is None or not self._count:
+            return None
+        return max(0, self.capacity - int(self.latest()["containers"]))
+    
+    
+    def observe(self, duration: float):
+        """Record the <duration> in seconds of an execution on the sandbox."""
+        self._durations[self._durations_next] = duration
+        self._durations_next = (self._durations_next + 1) % self.size
+        self._durations_count = min(self._durations_count + 1, self.size)
+    
+    
+    @property
+    def mean_service_time(self) -> Optional[float]:
+        """Mean duration of the observed executions, None if there is none."""
+        if not self._durations_count:
+            return None
+        return sum(self._durations[:self._durations_count]) / self._durations_count
+    
+    
+    def estimated_wait(self, queued: int = 0) -> Optional[float]:
+        """Estimate the time in seconds a new execution waits for a container
+        if <queued> executions are already waiting.
+        
+        0 if a container is free for it, otherwise the executions ahead of
+        it are assumed to be spread over every container, each taking the
+        mean observed duration. None if the capacity, the usage or the
+        duration of executions is unknown."""
+        free = self.free_containers()
+        if free is None:
+            return None
+        if free > queued:
+            return 0.0
+        service_time = self.mean_service_time
+        if service_time is None:
+            return None
+        return (queued - free + 1) * service_time / max(1, self.capacity)
+    
+    
+    def snapshot(self, window: Optional[int] = None) -> dict:
+        """Return the last sample and the derived views over the last <window>
+        samples as a dict, E.G. for a dashboard."""
+        return {
+            "latest":          self.latest(),
+            "samples":         len(self),
+            "capacity":        self.capacity,
+            "free_containers": self.free_containers(),
+            "cpu_avg":         self.moving_average("cpu", window),
+            "containers_avg":  self.moving_average("containers", window),
+            "sent_bps":        self.rate("sent_bytes", window),
+            "received_bps":    self.rate("received_bytes", window),
+            "estimated_wait":  self.estimated_wait(),
+            "errors":          self.errors,
+        }
+
+
+
+class UsageMonitor(AbstractAsyncContextManager):
+    """Poll the usage of one or more sandboxes every <interval> seconds,
+    keeping the last <size> samples of each in a UsageSeries.
+    
+    Used as an asynchronous context manager, the monitor is started on
+    entry and stopped on exit, closing the sandboxes it created."""
+    
+    
+    def __init__(self, sandboxes: Iterable[Union[str, ASandbox]], interval: float = 5.0,
+                 size: int = 720, **kwargs):
+        """Initialize a monitor of the given sandboxes.
+        
+        <sandboxes> can contain URLs or already created ASandbox instances,
+        <kwargs> are given to ASandbox when it is created from an URL."""
+        self.sandboxes = []
+        self._owned = []
+        for sandbox in sandboxes:
+            if isinstance(sandbox, str):
+                sandbox = ASandbox(sandbox, **kwargs)
+                self._owned.append(sandbox)
+            self.sandboxes.append(sandbox)
+        self.interval = interval
+        self.series = {sandbox.url: UsageSeries(size) for sandbox in self.sandboxes}
+        self._task = None
+    
+    
+    def __repr__(self):
+        return "<UsageMonitor sandboxes=%d interval=%s running=%s>" % (
+            len(self.sandboxes), self.interval, self.running
+        )
+    
+    
+    def __getitem__(self, url: str) -> UsageSeries:
+        return self.series[url]
+    
+    
+    async def __aenter__(self):
+        self.start()
+        return self
+    
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+        await asyncio.gather(*(sandbox.close() for sandbox in self._owned))
+    
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    
+    async def _poll(self, sandbox: ASandbox):
+        """Add a sample of the usage of <sandbox> to its series, retrieving
+        its capacity first if unknown."""
+        series = self.series[sandbox.url]
+        try:
+            if series.capacity is None:
+                series.capacity = (await sandbox.specifications())["container"]["count"]
+                if sandbox.admission is not None and sandbox.admission.capacity is None:
+                    await sandbox.admission.resize(series.capacity)
+            series.append(await sandbox.usage())
+        except Exception as e:  # Keep polling whatever the sandbox answered
+            series.errors += 1
+            series.last_error = e
+    
+    
+    async def poll(self):
+        """Poll every sandbox once."""
+        await asyncio.gather(*(self._poll(sandbox) for sandbox in self.sandboxes))
+    
+    
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await self.poll()
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+    
+    
+    def start(self):
+        """Start polling in a background task of the running event loop."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+    
+    
+    async def stop(self):
+        """Stop polling."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    
+    def free_containers(self) -> int:
+        """Return the number of free containers over every sandbox whose
+        capacity and usage are known."""
+        free = (series.free_containers() for series in self.series.values())
+        return sum(f for f in free if f is not None)
+    
+    
+    def observe(self, url: str, duration: float):
+        """Record the <duration> in seconds of an execution on the sandbox
+        <url>, E.G. the 'total_time' of its result."""
+        self.series[url].observe(duration)
+    
+    
+    def estimated_wait(self, url: str, queued: Optional[int] = None) -> Optional[float]:
+        """Estimate the time in seconds a new execution waits for a container
+        of the sandbox <url>, see UsageSeries.estimated_wait().
+        
+        <queued> defaults to the number of executions waiting in the
+        admission limiter of the sandbox, if any."""
+        if queued is None:
+            sandbox = next(s for s in self.sandboxes if s.url == url)
+            queued = sandbox.admission.queue_depth if sandbox.admission is not None else 0
+        return self.series[url].estimated_wait(queued)
+    
+    
+    def snapshot(self, window: Optional[int] = None) -> Dict[str, dict]:
+        """Return the snapshot of every series, keyed by URL."""
+        return {url: series.snapshot(window) for url, series in self.series.items()}
@@ -0,0 +1,171 @@
+# multipart.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Encode multipart/form-data bodies, either in memory or streamed from file
+objects, paths and iterables of bytes without holding them in memory."""
+
+import os
+import uuid
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .environment import EnvironmentBuilder, EnvironmentReader
+
+
+# A field of a multipart/form-data body.
+Field = Tuple[str, Union[str, bytes]]
+
+# The content of a file of a MultipartStream.
+Source = Union[bytes, BinaryIO, str, os.PathLike, EnvironmentBuilder, Iterable[bytes]]
+
+
+def _disposition(name: str, filename: Optional[str] = None) -> bytes:
+    disposition = 'form-data; name="%s"' % name.replace('"', "%22")
+    if filename is not None:
+        disposition += '; filename="%s"' % filename.replace('"', "%22")
+    return ("Content-Disposition: %s\r\n" % disposition).encode()
+
+
+def encode_multipart(fields: Iterable[Field]) -> Tuple[bytes, str]:
+    """Encode <fields> as a multipart/form-data body, returning the body and
+    the value of its Content-Type header."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields:
+        if isinstance(value, str):
+            value = value.encode()
+        parts.append(b"--%s\r\n%s\r\n%s\r\n" % (boundary.encode(), _disposition(name), value))
+    parts.append(b"--%s--\r\n" % boundary.encode())
+    return b"".join(parts), "multipart/form-data; boundary=%s" % boundary
+
+
+def source_size(source: Source) -> Optional[int]:
+    """Return the number of bytes which will be read from <source>, None if
+    it cannot be known beforehand."""
+    if isinstance(source, bytes):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if isinstance(source, EnvironmentBuilder):
+        return source.size() if source.sized else None
+    if isinstance(source, EnvironmentReader):
+        return len(source) if source.builder.sized else None
+    try:
+        if not source.seekable():
+            return None
+        position = source.tell()
+        end = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return end - position
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+
+class MultipartStream:
+    """A multipart/form-data body made of <fields> and <files>, yielding its
+    content <chunk_size> bytes at a time.
+    
+    Given as the data of a requests' request, the body is streamed, with a
+    Content-Length if the size of every file is known, with a chunked
+    transfer encoding otherwise. Iterating again over the stream sends it
+    again, as long as its file objects have been rewound (see 'files').
+    
+    * fields : The (name, value) of the fields.
+    * files : The (name, filename, source) of the files, the source being
+            either bytes, a file object read from its current position, the
+            path of a file, an EnvironmentBuilder or an iterable of bytes.
+    * content_type : Value of the Content-Type header of the body.
+    * len : Size of the body, None if unknown.
+    """
+    
+    
+    def __init__(self, fields: Iterable[Field] = (),
+                 files: Iterable[Tuple[str, str, Source]] = (), chunk_size: int = 2 ** 16):
+        self.fields = list(fields)
+        self.files = list(files)
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=%s" % self.boundary
+        self.len = self._size()
+    
+    
+    def __repr__(self):
+        return "<MultipartStream %d fields %d files len=%s>" % (
+            len(self.fields), len(self.files), self.len
+        )
+    
+    
+    def __iter__(self) -> Iterator[bytes]:
+        return self.chunks()
+    
+    
+    def _headers(self) -> List[bytes]:
+        """Return the headers of every field, then of every file."""
+        separator = b"--%s\r\n" % self.boundary.encode()
+        headers = [separator + _disposition(name) + b"\r\n" for name, _ in self.fields]
+        headers += [
+            separator + _disposition(name, filename)
+            + b"Content-Type: application/octet-stream\r\n\r\n"
+            for name, filename, _ in self.files
+        ]
+        return headers
+    
+    
+    def _size(self) -> Optional[int]:
+        sizes = [source_size(source) for _, _, source in self.files]
+        if None in sizes:
+            return None
+        values = sum(len(v.encode() if isinstance(v, str) else v) for _, v in self.fields)
+        return (sum(len(h) + 2 for h in self._headers()) + values + sum(sizes)
+                + len(self.boundary) + 6)
+    
+    
+    @property
+    def rewindable(self) -> List[BinaryIO]:
+        """The sources which must be rewound before sending the body again,
+        see retry.Rewinder. Iterables other than file objects and
+        EnvironmentBuilder cannot be."""
+        return [
+            source for _, _, source in self.files
+            if not isinstance(source, (bytes, str, os.PathLike, EnvironmentBuilder))
+        ]
+    
+    
+    def _read(self, source: Source) -> Iterator[bytes]:
+        """Yield the content of <source>."""
+        if isinstance(source, bytes):
+            yield source
+        elif isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                yield from iter(lambda: f.read(self.chunk_size), b"")
+        elif isinstance(source, EnvironmentBuilder):
+            yield from source.chunks()
+        elif hasattr(source, "read"):
+            yield from iter(lambda: source.read(self.chunk_size), b"")
+        else:
+            yield from source
+    
+    
+    def chunks(self) -> Iterator[bytes]:
+        """Yield the body in chunks of about <chunk_size> bytes, the content
+        of files being read as they are sent."""
+        headers = self._headers()
+        buffer = bytearray()
+        for header, (_, value) in zip(headers, self.fields):
+            buffer += header + (value.encode() if isinstance(value, str) else value) + b"\r\n"
+        for header, (_, _, source) in zip(headers[len(self.fields):], self.files):
+            buffer += header
+            for chunk in self._read(source):
+                if not buffer and len(chunk) >= self.chunk_size:
+                    yield chunk
+                    continue
+                buffer += chunk
+                if len(buffer) >= self.chunk_size:
+                    yield bytes(buffer)
+                    buffer.clear()
+            buffer += b"\r\n"
+        buffer += b"--%s--\r\n" % self.boundary.encode()
+        yield bytes(buffer)
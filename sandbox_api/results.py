@@ -0,0 +1,196 @@
+# results.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Compact typed results of execute(), returned instead of the response's
+dict when the sandbox is created with typed=True."""
+
+from typing import Any, Iterator, Optional, Tuple, Union
+
+from .enums import SandboxErrCode
+
+
+def error_code(value: int) -> Union[int, SandboxErrCode]:
+    """Return the SandboxErrCode corresponding to <value> if it is one,
+    <value> itself otherwise."""
+    if value < 0:
+        try:
+            return SandboxErrCode(value)
+        except ValueError:
+            pass
+    return value
+
+
+
+class CommandResult:
+    """Result of a command of an execution.
+    
+    * command : The command, as executed.
+    * exit_code : Exit code of the command, SandboxErrCode.TIMEOUT if it
+            timed out.
+    * stdout : Standard output of the command.
+    * stderr : Standard error of the command.
+    * time : Time in seconds taken by the command.
+    """
+    
+    __slots__ = ("command", "_exit_code", "stdout", "stderr", "time")
+    
+    
+    def __init__(self, command: str, exit_code: int, stdout: str, stderr: str, time: float):
+        self.command = command
+        self._exit_code = exit_code
+        self.stdout = stdout
+        self.stderr = stderr
+        self.time = time
+    
+    
+    def __repr__(self):
+        return "<CommandResult %r exit_code=%r>" % (self.command, self.exit_code)
+    
+    
+    def __eq__(self, other):
+        if not isinstance(other, CommandResult):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+    
+    
+    def __reduce__(self):
+        return CommandResult, self._astuple()
+    
+    
+    def _astuple(self) -> Tuple[str, int, str, str, float]:
+        return self.command, self._exit_code, self.stdout, self.stderr, self.time
+    
+    
+    @classmethod
+    def from_dict(cls, command: dict) -> 'CommandResult':
+        """Build a CommandResult from an item of the 'execution' list of a
+        response."""
+        return cls(
+            command["command"], command["exit_code"], command["stdout"], command["stderr"],
+            command["time"]
+        )
+    
+    
+    @property
+    def exit_code(self) -> Union[int, SandboxErrCode]:
+        return error_code(self._exit_code)
+    
+    
+    def to_dict(self) -> dict:
+        """Return the command as in the response of the sandbox."""
+        return {
+            "command":   self.command,
+            "exit_code": self._exit_code,
+            "stdout":    self.stdout,
+            "stderr":    self.stderr,
+            "time":      self.time,
+        }
+
+
+
+class ExecutionResult:
+    """Result of execute().
+    
+    * status : 0 if every command succeeded, the exit code of the failing
+            command otherwise, or a SandboxErrCode if the execution failed.
+    * execution : Tuple of the CommandResult of each executed command.
+    * total_time : Time in seconds taken by the execution.
+    * result : Content of the file at 'result_path', None if the config did
+            not have one or if it could not be read.
+    * environment : UUID of the saved environment, None if the config did not
+            save it.
+    """
+    
+    __slots__ = ("_status", "execution", "total_time", "result", "environment")
+    
+    
+    def __init__(self, status: int, execution: Tuple[CommandResult, ...] = (),
+                 total_time: float = 0.0, result: Optional[str] = None,
+                 environment: Optional[str] = None):
+        self._status = status
+        self.execution = execution
+        self.total_time = total_time
+        self.result = result
+        self.environment = environment
+    
+    
+    def __repr__(self):
+        return "<ExecutionResult status=%r commands=%d total_time=%r>" % (
+            self.status, len(self.execution), self.total_time
+        )
+    
+    
+    def __eq__(self, other):
+        if not isinstance(other, ExecutionResult):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+    
+    
+    def __reduce__(self):
+        return ExecutionResult, self._astuple()
+    
+    
+    def __iter__(self) -> Iterator[CommandResult]:
+        return iter(self.execution)
+    
+    
+    def __len__(self) -> int:
+        return len(self.execution)
+    
+    
+    def _astuple(self) -> Tuple[Any, ...]:
+        return self._status, self.execution, self.total_time, self.result, self.environment
+    
+    
+    @classmethod
+    def from_dict(cls, response: dict) -> 'ExecutionResult':
+        """Build an ExecutionResult from the response of execute(). The strings
+        of <response> are shared, not copied."""
+        return cls(
+            response["status"],
+            tuple(CommandResult.from_dict(c) for c in response.get("execution", ())),
+            response.get("total_time", 0.0), response.get("result"), response.get("environment"),
+        )
+    
+    
+    @property
+    def status(self) -> Union[int, SandboxErrCode]:
+        return error_code(self._status)
+    
+    
+    @property
+    def ok(self) -> bool:
+        """Whether every command succeeded."""
+        return self._status == 0
+    
+    
+    @property
+    def failed(self) -> Optional[CommandResult]:
+        """The command which made the execution fail, None if there is
+        none."""
+        if self._status == 0 or not self.execution:
+            return None
+        last = self.execution[-1]
+        return last if last._exit_code != 0 else None
+    
+    
+    def to_dict(self) -> dict:
+        """Return the result as the response of the sandbox."""
+        response = {"status": self._status, "execution": [c.to_dict() for c in self.execution]}
+        if self.result is not None:
+            response["result"] = self.result
+        if self.environment is not None:
+            response["environment"] = self.environment
+        response["total_time"] = self.total_time
+        return response
+
+
+def saved_environment(result: Union[dict, ExecutionResult]) -> Optional[str]:
+    """Return the UUID of the environment saved by the execution of <result>,
+    either a dict or an ExecutionResult, None if it was not saved."""
+    if isinstance(result, ExecutionResult):
+        return result.environment
+    return result.get("environment")
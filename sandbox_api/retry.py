@@ -0,0 +1,226 @@
+# retry.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Retry policy and circuit breaker shared by Sandbox and ASandbox."""
+
+import email.utils
+import random
+import threading
+import time
+from typing import BinaryIO, Dict, Iterable, Optional
+
+from .exceptions import SandboxCircuitOpen
+
+
+# Default number of retries allowed for each status code.
+IDEMPOTENT_STATUSES = {429: 5, 502: 3, 503: 5, 504: 3}
+# Only status codes guaranteeing that the commands were not executed are
+# retried for an execution.
+EXECUTE_STATUSES = {429: 5, 503: 5}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the number of seconds corresponding to the value of a
+    Retry-After header, None if it could not be parsed.
+    
+    The value can either be a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:  # pragma: no cover
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+
+class RetryPolicy:
+    """Decide whether and when a failed request must be retried.
+    
+    * statuses : Number of retries allowed for each status code of an
+            idempotent request (every request but executions).
+    * execute_statuses : Number of retries allowed for each status code of
+            an execution.
+    * connect_retries : Number of retries allowed when the connection could
+            not be established, the request was thus never received.
+    * read_retries : Number of retries allowed for idempotent requests when
+            the connection failed after the request was sent. Executions are
+            never retried in this case.
+    * backoff : Delay in seconds before the first retry, doubled for each
+            subsequent retry.
+    * max_backoff : Maximum delay in seconds between two retries.
+    * jitter : Whether to randomize the delay between half and all of its
+            value.
+    * respect_retry_after : Whether to wait at least the delay given in the
+            Retry-After header, up to <max_retry_after> seconds.
+    """
+    
+    
+    def __init__(self, statuses: Optional[Dict[int, int]] = None,
+                 execute_statuses: Optional[Dict[int, int]] = None, connect_retries: int = 3,
+                 read_retries: int = 2, backoff: float = 0.5, max_backoff: float = 30.0,
+                 jitter: bool = True, respect_retry_after: bool = True,
+                 max_retry_after: float = 120.0):
+        self.statuses = IDEMPOTENT_STATUSES if statuses is None else statuses
+        self.execute_statuses = EXECUTE_STATUSES if execute_statuses is None else execute_statuses
+        self.connect_retries = connect_retries
+        self.read_retries = read_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+    
+    
+    def retries(self, idempotent: bool, status: Optional[int] = None,
+                connect_error: bool = False) -> int:
+        """Return the number of retries allowed for a request.
+        
+        <status> is the status code of the response, None if the request
+        failed without response, <connect_error> then telling whether the
+        connection could be established."""
+        if status is not None:
+            return (self.statuses if idempotent else self.execute_statuses).get(status, 0)
+        if connect_error:
+            return self.connect_retries
+        return self.read_retries if idempotent else 0
+    
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Return the delay before retrying after the <attempt>-th retry
+        (starting at 0)."""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        return delay
+    
+    
+    def delay(self, attempt: int, idempotent: bool, status: Optional[int] = None,
+              retry_after: Optional[str] = None, connect_error: bool = False) -> Optional[float]:
+        """Return how many seconds to wait before retrying a failed request,
+        None if it must not be retried.
+        
+        <attempt> is the number of retries already done, <retry_after> the
+        value of the Retry-After header of the response, if any. See
+        retries() for the other arguments."""
+        if attempt >= self.retries(idempotent, status, connect_error):
+            return None
+        
+        delay = self.backoff_delay(attempt)
+        if self.respect_retry_after:
+            retry_after = parse_retry_after(retry_after)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+
+
+class CircuitBreaker:
+    """Fail fast while a sandbox is recovering.
+    
+    The circuit opens after <failure_threshold> consecutive failures (a
+    connection error or a 5xx status code). While open, requests immediately
+    raise SandboxCircuitOpen. After <recovery_timeout> seconds, the circuit is
+    half-open : up to <half_open_requests> requests are let through, closing
+    the circuit if they succeed, opening it again otherwise."""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_requests: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_requests = half_open_requests
+        self.failures = 0
+        self.opened_at = None
+        self._trials = 0
+        self._lock = threading.Lock()
+    
+    
+    def __repr__(self):
+        return "<CircuitBreaker %s failures=%d>" % (self.state, self.failures)
+    
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+    
+    
+    def before_request(self) -> bool:
+        """Raise SandboxCircuitOpen if the request must not be sent.
+        
+        Return True if the request is one of the trials of the half-open
+        circuit. Its outcome must then be recorded with record_success() or
+        record_failure(), or the trial given back with release_trial() if it
+        has none (E.G. the request was cancelled)."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and self._trials < self.half_open_requests:
+                self._trials += 1
+                return True
+        raise SandboxCircuitOpen("Circuit breaker is open after %d failures" % self.failures)
+    
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trials = 0
+    
+    
+    def release_trial(self):
+        """Give back a trial taken by before_request() without recording any
+        outcome."""
+        with self._lock:
+            self._trials = max(0, self._trials - 1)
+    
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._trials = 0
+
+
+
+class Rewinder:
+    """Record the position of file objects sent in a request's body, so that
+    they can be sent again if the request is retried."""
+    
+    
+    def __init__(self, files: Iterable[BinaryIO]):
+        self.positions = []
+        for f in files:
+            try:
+                self.positions.append((f, f.tell() if f.seekable() else None))
+            except (AttributeError, OSError, ValueError):
+                self.positions.append((f, None))
+    
+    
+    def rewind(self) -> bool:
+        """Seek every file back to its recorded position, returning False if
+        one of them could not be."""
+        for f, position in self.positions:
+            if position is None or getattr(f, "closed", False):
+                return False
+            f.seek(position)
+        return True
@@ -7,105 +7,709 @@
 """A synchronous implementation of the Sandbox API."""
 
 import io
-import json
 import os
-from typing import BinaryIO, Optional, Union
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Union
 
 import requests
+from urllib3.exceptions import NewConnectionError
 
-from .exceptions import status_exceptions
-from .utils import ENDPOINTS
+from .admission import AdmissionLimiter
+from .batch import BatchItem, BatchResult, ProgressCallback, submit_many
+from .cache import ResultCache, result_key
+from .codec import JSONCodec, get_codec
+from .compression import Compression
+from .envcache import EnvironmentCache
+from .environment import EnvironmentBuilder, EnvironmentReader
+from .exceptions import Sandbox404, SandboxBusy, status_exceptions
+from .instrumentation import Instrumentation, endpoint_name
+from .metacache import MetadataCache
+from .multipart import MultipartStream
+from .results import ExecutionResult
+from .retry import CircuitBreaker, Rewinder, RetryPolicy
+from .transport import Transport, get_transport
+from .utils import (ENDPOINTS, base_url, file_digest, range_header, resolve_option,
+                    slice_chunks, split_segments, unix_socket_path)
 
 
-class Sandbox:
+try:
+    from urllib3.response import HAS_ZSTD
+except ImportError:  # pragma: no cover - urllib3 < 2
+    HAS_ZSTD = False
+
+# The environment of an execution : a file object, the path of a file, an
+# EnvironmentBuilder or an iterable of bytes.
+Environ = Union[BinaryIO, str, os.PathLike, EnvironmentBuilder, Iterable[bytes]]
+
+
+def is_connect_error(error: requests.RequestException) -> bool:
+    """Return whether <error> happened while establishing the connection,
+    before the request was sent."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class Sandbox(AbstractContextManager):
     """Interface a Sandbox server."""
     
     
-    def __init__(self, url: str, timeout: Optional[float] = 60):
+    def __init__(self, url: str, timeout: Optional[float] = 60, pool_connections: int = 10,
+                 pool_maxsize: int = 10, pool_block: bool = False, keep_alive: bool = True,
+                 admission: Union[bool, AdmissionLimiter, None] = None,
+                 retry: Union[bool, RetryPolicy, None] = None,
+                 circuit_breaker: Union[bool, CircuitBreaker, None] = None,
+                 env_cache: Union[bool, EnvironmentCache, None] = None,
+                 result_cache: Union[bool, ResultCache, None] = None,
+                 metadata_cache: Union[bool, MetadataCache, None] = None,
+                 instrumentation: Union[bool, Instrumentation, None] = None,
+                 compression: Union[bool, Compression, None] = None,
+                 transport: Union[str, Transport, None] = None,
+                 codec: Union[str, JSONCodec, None] = None, typed: bool = False,
+                 chunk_size: int = 2 ** 16,
+                 max_workers: Optional[int] = None):
         """Initialize a sandbox with the given URL.
         
+        <url> can also be 'unix://' followed by the path of the Unix domain
+        socket the sandbox listens on, E.G. 'unix:///run/sandbox.sock', for a
+        sandbox running on the same host.
+        
         Default timeout for waiting a response is one minute, use the <timeout>
-        argument to override."""
+        argument to override.
+        
+        Requests are sent through a pooled requests.Session, reusing TCP
+        connections between calls. Use the following arguments to tune the
+        pool :
+            
+            * pool_connections : The number of hosts for which a connection
+                    pool is kept.
+            * pool_maxsize : The maximum number of connections kept alive
+                    per host.
+            * pool_block : Whether to wait for a free connection when every
+                    connection of the pool is in use instead of opening a new
+                    one which will be discarded afterward.
+            * keep_alive : If False, connections are closed after each
+                    request.
+        
+        If <admission> is True or an AdmissionLimiter, the number of
+        executions in flight is limited to the number of containers of the
+        sandbox, excess executions waiting on the client. A limiter created
+        without capacity is sized from the sandbox's specifications on the
+        first execution.
+        
+        If <retry> is True or a RetryPolicy, failed requests are retried
+        according to the policy. If <circuit_breaker> is True or a
+        CircuitBreaker, requests fail fast with SandboxCircuitOpen while the
+        sandbox is recovering.
+        
+        If <env_cache> is True or an EnvironmentCache, environments given to
+        execute() are uploaded once and reused afterward, see execute().
+        
+        If <result_cache> is True or a ResultCache, the results of execute()
+        are cached, see execute().
+        
+        If <metadata_cache> is True or a MetadataCache, the responses of
+        specifications() and libraries() are cached and refreshed once stale.
+        
+        If <instrumentation> is True or an Instrumentation, the timings of
+        every request are recorded and passed to its sinks.
+        
+        If <compression> is True or a Compression, the bodies of executions
+        without environment are compressed once
+        larger than its threshold, and responses are requested compressed
+        with zstd when it can be decoded, see Compression.
+        
+        <transport> is the Transport, or the name of one ('http1' or 'http2'),
+        through which requests are sent. Defaults to HTTP/1.1 through the
+        pool described above, 'http2' multiplexes requests over a single
+        HTTP/2 connection, see HTTP2Transport.
+        
+        <codec> is the JSONCodec, or the name of one ('orjson', 'ujson' or
+        'json'), encoding the configs and decoding the responses. Defaults to
+        the fastest installed, see default_codec().
+        
+        If <typed> is True, execute() returns an ExecutionResult instead of
+        the response's dict.
+        
+        <chunk_size> is the default size of the chunks read by
+        iter_download() and download_to().
+        
+        <max_workers> is the number of threads executing the items of
+        execute_many() and map(), defaulting to <pool_maxsize> so that every
+        thread reuses a pooled connection.
+        """
         self.url = url
+        self.base_url = base_url(url)
+        self.socket_path = unix_socket_path(url)
         self.timeout = timeout
+        self.adapter_options = {
+            "pool_connections": pool_connections,
+            "pool_maxsize":     pool_maxsize,
+            "pool_block":       pool_block,
+        }
+        self.session = requests.Session()
+        self.transport = get_transport(transport)
+        self.transport.mount(self)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.admission = resolve_option(admission, AdmissionLimiter)
+        self.retry = resolve_option(retry, RetryPolicy)
+        self.circuit_breaker = resolve_option(circuit_breaker, CircuitBreaker)
+        self.env_cache = resolve_option(env_cache, EnvironmentCache)
+        self.result_cache = resolve_option(result_cache, ResultCache)
+        self.metadata_cache = resolve_option(metadata_cache, MetadataCache)
+        self.instrumentation = resolve_option(instrumentation, Instrumentation)
+        self.compression = resolve_option(compression, Compression)
+        if self.compression is not None:
+            self.session.headers["Accept-Encoding"] = self.compression.accept_encoding(HAS_ZSTD)
+        self.codec = get_codec(codec)
+        self.typed = typed
+        self.chunk_size = chunk_size
+        self.max_workers = pool_maxsize if max_workers is None else max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    
+    def close(self):
+        """Close the requests Session and every connection of its pool.
+        
+        Waits for the items of execute_many() and map() already submitted."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+        self.session.close()
+    
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool of execute_many() and map(), created on first use."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="sandbox-api"
+                )
+            return self._executor
     
     
     def _build_url(self, endpoint: str, *args: str):
         """Build the url corresponding to <endpoint> with the given <args>."""
-        return os.path.join(self.url, ENDPOINTS[endpoint] % tuple(args))
+        return os.path.join(self.base_url, ENDPOINTS[endpoint] % tuple(args))
+    
+    
+    def _request(self, method: str, url: str, idempotent: bool = True,
+                 expected: Iterable[int] = (), **kwargs) -> requests.Response:
+        """Send a request through the session, returning the response.
+        
+        The timings of the request are recorded if instrumentation is
+        enabled, see _send(). <expected> are the error statuses handled by
+        the caller, which are not recorded as errors."""
+        if self.instrumentation is None:
+            return self._send(method, url, idempotent, **kwargs)
+        
+        timing = self.instrumentation.start(endpoint_name(self.base_url, url), method)
+        try:
+            response = self._send(method, url, idempotent, **kwargs)
+        except Exception as e:
+            self.instrumentation.finish(timing, error=e)
+            raise
+        timing.phases["wait"] = response.elapsed.total_seconds()
+        if not kwargs.get("stream"):
+            timing.phases["read"] = max(
+                0.0, time.perf_counter() - timing.start - timing.phases["wait"]
+            )
+        timing.sent_bytes = int(response.request.headers.get("Content-Length") or 0)
+        timing.received_bytes = int(response.headers.get("Content-Length") or 0)
+        self.instrumentation.finish(
+            timing, response.status_code, expected=response.status_code in expected
+        )
+        return response
+    
+    
+    def _send(self, method: str, url: str, idempotent: bool = True,
+              **kwargs) -> requests.Response:
+        """Send a request through the session, returning the response.
+        
+        The request is retried according to the retry policy, the circuit
+        breaker being checked before each attempt. File objects in
+        kwargs['files'] or in a MultipartStream given as kwargs['data'] are
+        rewound before a retry, the request is not retried if one of them can
+        not be."""
+        rewinder = None
+        if kwargs.get("files"):
+            rewinder = Rewinder(kwargs["files"].values())
+        elif isinstance(kwargs.get("data"), MultipartStream):
+            rewinder = Rewinder(kwargs["data"].rewindable)
+        attempt = 0
+        while True:
+            trial = False
+            if self.circuit_breaker is not None:
+                trial = self.circuit_breaker.before_request()
+            
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                delay = None if self.retry is None else self.retry.delay(
+                    attempt, idempotent, connect_error=is_connect_error(e)
+                )
+                if delay is None or (rewinder is not None and not rewinder.rewind()):
+                    raise
+            except BaseException:
+                # Interrupted or failed for another reason, the sandbox's
+                # health is unknown
+                if trial:
+                    self.circuit_breaker.release_trial()
+                raise
+            else:
+                if self.circuit_breaker is not None:
+                    if response.status_code >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                if response.status_code < 300 or self.retry is None:
+                    return response
+                delay = self.retry.delay(
+                    attempt, idempotent, response.status_code, response.headers.get("Retry-After")
+                )
+                if delay is None or (rewinder is not None and not rewinder.rewind()):
+                    return response
+                response.close()
+            
+            time.sleep(delay)
+            attempt += 1
+    
+    
+    def _json(self, response: requests.Response):
+        """Decode the JSON body of <response>, recording the time taken if
+        instrumentation is enabled."""
+        if self.instrumentation is None:
+            return self.codec.loads(response.content)
+        
+        start = time.perf_counter()
+        result = self.codec.loads(response.content)
+        self.instrumentation.decoded(
+            endpoint_name(self.base_url, response.url), result, time.perf_counter() - start
+        )
+        return result
     
     
     def libraries(self) -> dict:
-        """Retrieve libraries installed in the containers of the sandbox."""
-        response = requests.get(self._build_url("libraries"), timeout=self.timeout)
-        if response.status_code != 200:
-            raise status_exceptions(response)
+        """Retrieve libraries installed in the containers of the sandbox.
         
-        return response.json()
+        The response is cached if the metadata cache is enabled, its nested
+        values are then shared with the cache and must not be mutated."""
+        return self._metadata("libraries")
     
     
     def specifications(self) -> dict:
-        """Retrieve specifications of the sandbox."""
-        response = requests.get(self._build_url("specifications"), timeout=self.timeout)
+        """Retrieve specifications of the sandbox.
+        
+        The response is cached if the metadata cache is enabled, its nested
+        values are then shared with the cache and must not be mutated."""
+        return self._metadata("specifications")
+    
+    
+    def _metadata(self, endpoint: str) -> dict:
+        """Retrieve the response of <endpoint>, from the metadata cache if it
+        is enabled.
+        
+        A stale response is refreshed in the thread pool of the sandbox if
+        the cache refreshes in the background."""
+        if self.metadata_cache is None:
+            return self._fetch_metadata(endpoint)
+        
+        value, fresh = self.metadata_cache.lookup(endpoint)
+        if value is None or (not fresh and not self.metadata_cache.background):
+            return self._fetch_metadata(endpoint)
+        if not fresh and self.metadata_cache.begin_refresh(endpoint):
+            self.executor.submit(self._refresh_metadata, endpoint)
+        return value
+    
+    
+    def _fetch_metadata(self, endpoint: str) -> dict:
+        """Send the request of <endpoint>, storing the response in the metadata
+        cache if it is enabled. The request is conditional if the cached
+        response has validators."""
+        cache = self.metadata_cache
+        url = self._build_url(endpoint)
+        headers = None if cache is None else cache.validators(endpoint)
+        response = self._request("GET", url, headers=headers)
+        if response.status_code == 304:
+            value = cache.not_modified(endpoint)
+            if value is not None:
+                return value
+            response = self._request("GET", url)
         if response.status_code != 200:
             raise status_exceptions(response)
         
-        return response.json()
+        if cache is None:
+            return self._json(response)
+        return cache.store(
+            endpoint, self._json(response), response.headers.get("ETag"),
+            response.headers.get("Last-Modified")
+        )
+    
+    
+    def _refresh_metadata(self, endpoint: str):
+        """Refresh the cached response of <endpoint> in the background, keeping
+        the stale one if the request fails."""
+        try:
+            self._fetch_metadata(endpoint)
+        except Exception:
+            self.metadata_cache.end_refresh(endpoint, failed=True)
+        else:
+            self.metadata_cache.end_refresh(endpoint)
     
     
     def usage(self) -> dict:
         """Retrieve current usage stats of the sandbox."""
-        response = requests.get(self._build_url("usages"), timeout=self.timeout)
+        response = self._request("GET", self._build_url("usages"))
         if response.status_code != 200:
             raise status_exceptions(response)
         
-        return response.json()
+        return self._json(response)
+    
+    
+    def _download_url(self, uuid: str, path: str = None) -> str:
+        """Build the url of the environment <uuid>, or of the file <path>
+        inside it."""
+        if path is None:
+            return self._build_url("environments", uuid)
+        return self._build_url("files", uuid, path)
     
     
     def download(self, uuid: str, path: str = None) -> BinaryIO:
         """Download an environment or a specific file inside an environment."""
-        if path is None:
-            url = self._build_url("environments", uuid)
-        else:
-            url = self._build_url("files", uuid, path)
-        
-        response = requests.get(url, timeout=self.timeout)
+        response = self._request("GET", self._download_url(uuid, path))
         if response.status_code != 200:
             raise status_exceptions(response)
         
         return io.BytesIO(response.content)
     
     
+    def _range_request(self, url: str, start: int = 0,
+                       end: Optional[int] = None) -> requests.Response:
+        """Send a streamed request for the bytes from <start> to <end>
+        (inclusive) of <url>.
+        
+        The status code of the response is 206 if the range was honored, 200
+        if the server ignored it and sent the whole content."""
+        response = self._request("GET", url, stream=True, headers=range_header(start, end))
+        if response.status_code not in (200, 206):
+            response.close()
+            raise status_exceptions(response)
+        return response
+    
+    
+    def _iter_response(self, response: requests.Response, start: int = 0,
+                       end: Optional[int] = None,
+                       chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the content of a response returned by _range_request(),
+        slicing it if the server ignored the range."""
+        with response:
+            chunks = response.iter_content(chunk_size or self.chunk_size)
+            if response.status_code == 200:
+                chunks = slice_chunks(chunks, start, end)
+            yield from chunks
+    
+    
+    def iter_download(self, uuid: str, path: str = None, chunk_size: Optional[int] = None,
+                      start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Download an environment or a specific file inside an environment,
+        yielding its content in chunks of <chunk_size> bytes.
+        
+        Only the bytes from <start> to <end> (inclusive, up to the last byte
+        if None) are downloaded. If the sandbox does not support ranges, the
+        whole content is downloaded and sliced.
+        
+        The request is sent when the iteration starts."""
+        response = self._range_request(self._download_url(uuid, path), start, end)
+        yield from self._iter_response(response, start, end, chunk_size)
+    
+    
+    def download_range(self, uuid: str, start: int, end: Optional[int] = None,
+                       path: str = None) -> BinaryIO:
+        """Download the bytes from <start> to <end> (inclusive, up to the last
+        byte if None) of an environment or a specific file inside an
+        environment."""
+        return io.BytesIO(b"".join(self.iter_download(uuid, path, start=start, end=end)))
+    
+    
+    def download_to(self, uuid: str, destination: Union[str, os.PathLike, BinaryIO],
+                    path: str = None, chunk_size: Optional[int] = None,
+                    resume: bool = False) -> int:
+        """Download an environment or a specific file inside an environment to
+        <destination>, returning the number of bytes written.
+        
+        <destination> can either be a path or a binary file object, which is
+        not closed. Only one chunk of <chunk_size> bytes is held in memory at
+        a time.
+        
+        If <resume> is True, the download resumes from the current size of
+        <destination> (its current position for a file object), using the
+        size returned by check() to know whether it is already complete. The
+        download restarts from the beginning if the sandbox does not support
+        ranges."""
+        if not hasattr(destination, "write"):
+            mode = "ab" if resume and os.path.exists(destination) else "wb"
+            with open(destination, mode) as f:
+                return self.download_to(uuid, f, path, chunk_size, resume)
+        
+        start = destination.tell() if resume else 0
+        if start:
+            size = int(self.check(uuid, path))
+            if start == size:
+                return 0
+            if start > size:
+                destination.seek(0)
+                destination.truncate()
+                start = 0
+        
+        response = self._range_request(self._download_url(uuid, path), start)
+        if start and response.status_code == 200:
+            destination.seek(0)
+            destination.truncate()
+            start = 0
+        
+        written = 0
+        for chunk in self._iter_response(response, start, None, chunk_size):
+            destination.write(chunk)
+            written += len(chunk)
+        return written
+    
+    
+    def download_segmented(self, uuid: str, destination: Union[str, os.PathLike],
+                           path: str = None, segments: int = 4,
+                           chunk_size: Optional[int] = None,
+                           min_segment_size: int = 2 ** 20) -> int:
+        """Download an environment or a specific file inside an environment to
+        the file <destination>, fetching <segments> ranges in parallel over as
+        many connections. Return the number of bytes written.
+        
+        The size is given by check(), segments are at least
+        <min_segment_size> bytes long. If the sandbox does not support ranges,
+        the content is downloaded through a single connection."""
+        size = int(self.check(uuid, path))
+        count = max(1, min(segments, size // max(1, min_segment_size)))
+        if count == 1:
+            return self.download_to(uuid, destination, path, chunk_size)
+        
+        url = self._download_url(uuid, path)
+        bounds = list(split_segments(size, count))
+        first = self._range_request(url, *bounds[0])
+        if first.status_code == 200:
+            written = 0
+            with open(destination, "wb") as f:
+                for chunk in self._iter_response(first, chunk_size=chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+            return written
+        
+        with open(destination, "wb") as f:
+            f.truncate(size)
+        
+        def fetch(start: int, end: int, response: Optional[requests.Response] = None):
+            if response is None:
+                response = self._range_request(url, start, end)
+            with open(destination, "r+b") as f:
+                f.seek(start)
+                for chunk in self._iter_response(response, start, end, chunk_size):
+                    f.write(chunk)
+        
+        with ThreadPoolExecutor(count) as pool:
+            futures = [pool.submit(fetch, *bounds[0], first)]
+            futures += [pool.submit(fetch, *b) for b in bounds[1:]]
+            for future in futures:
+                future.result()
+        return size
+    
+    
     def check(self, uuid: str, path: str = None) -> int:
         """Return the size of an environment or a specific file, 0 if it was not
         found.
         
         Can be used to check if an environment or a specific file inside an
         environment exists."""
-        if path is None:
-            url = self._build_url("environments", uuid)
-        else:
-            url = self._build_url("files", uuid, path)
-        
-        response = requests.head(url, timeout=self.timeout)
+        response = self._request("HEAD", self._download_url(uuid, path), expected=(404,))
         if response.status_code not in [200, 404]:  # pragma: no cover
             raise status_exceptions(response)
         
         return 0 if response.status_code == 404 else response.headers["Content-Length"]
     
     
-    def execute(self, config: Union[dict], environ: Optional[BinaryIO] = None) -> dict:
+    def execute(self, config: Union[dict], environ: Optional[Environ] = None,
+                cache: bool = True) -> Union[dict, ExecutionResult]:
         """Execute commands on the sandbox according to <config> and
-        <environ>, returning the response's json as a dict.
+        <environ>, returning the response's json as a dict, or as an
+        ExecutionResult if the sandbox is typed.
         
         <environ>, if not None, will be consumed and closed and shall not be
-        used further."""
-        files = {"environment": environ} if environ is not None else None
-        response = requests.post(
-            self._build_url("execute"), data={"config": json.dumps(config)}, files=files,
-            timeout=self.timeout
-        )
+        used further. It can also be the path of a file, an
+        EnvironmentBuilder or an iterable of bytes (E.G. a generator). It is
+        streamed to the sandbox <chunk_size> bytes at a time, without being
+        loaded in memory.
+        
+        If the result cache is enabled and <cache> is True, the result is
+        looked up in the cache using the config and the content of <environ>,
+        the execution being sent only if it is not found. Results of
+        executions whose <environ> is not seekable or is an
+        EnvironmentBuilder, saving their environment or that timed out are
+        never cached. Use <cache>=False for non-deterministic commands.
+        
+        If admission control is enabled, wait for a free container first,
+        raising SandboxBusy if none was available in time.
+        
+        If the environment cache is enabled, <config> does not contain an
+        'environment' and <environ> is seekable, <environ> is uploaded once
+        and saved on the sandbox, its UUID being then used in place of
+        <environ> as long as the sandbox keeps it. The upload is done through
+        a separate execution so that the saved environment is not modified by
+        the commands of <config>."""
+        if isinstance(environ, (str, os.PathLike)):
+            with open(environ, "rb") as f:
+                return self.execute(config, f, cache)
+        
+        key = self._result_key(config, environ) if cache else None
+        if key is not None:
+            result = self.result_cache.get(key)
+            if result is not None:
+                if environ is not None:
+                    environ.close()
+                return ExecutionResult.from_dict(result) if self.typed else result
+        
+        result = self._admitted_execute(config, environ)
+        if key is not None and self.result_cache.cacheable(config, result):
+            self.result_cache.set(key, result)
+        return ExecutionResult.from_dict(result) if self.typed else result
+    
+    
+    def _result_key(self, config: Union[dict], environ: Optional[Environ]) -> Optional[str]:
+        """Return the key of the execution in the result cache, None if the
+        cache is disabled or if the execution can not be cached."""
+        if (self.result_cache is None or not isinstance(config, dict)
+                or isinstance(environ, EnvironmentBuilder)):
+            return None
+        if environ is None:
+            return result_key(config)
+        digest = file_digest(environ)
+        return None if digest is None else result_key(config, digest)
+    
+    
+    def _admitted_execute(self, config: Union[dict], environ: Optional[Environ] = None) -> dict:
+        """Execute <config> once admitted by the admission limiter."""
+        if self.admission is None:
+            return self._execute(config, environ)
+        
+        if self.admission.capacity is None:
+            self.admission.resize(self.specifications()["container"]["count"])
+        try:
+            with self.admission:
+                return self._execute(config, environ)
+        except SandboxBusy as e:
+            if self.instrumentation is not None:
+                self.instrumentation.error("execute", e)
+            raise
+    
+    
+    def execute_many(self, items: Iterable[BatchItem],
+                     progress: Optional[ProgressCallback] = None) -> List[Future]:
+        """Execute every item of <items>, either a config or a (config,
+        environ) pair, with execute() in the thread pool of the sandbox,
+        returning a Future for each of them in the order of <items>.
+        
+        The futures never raise, their result is a BatchResult holding the
+        index of the item and either its result or its exception. At most
+        <max_workers> items are executed at a time, all of them sharing the
+        connection pool of the sandbox.
+        
+        <progress>, if given, is called from the worker threads with the
+        number of finished items and the total number of items every time an
+        item finishes."""
+        return submit_many(self.executor, self.execute, items, progress)
+    
+    
+    def map(self, items: Iterable[BatchItem],
+            progress: Optional[ProgressCallback] = None) -> List[BatchResult]:
+        """Execute every item of <items> like execute_many(), returning the
+        BatchResult of each of them in the order of <items> once every item
+        has finished."""
+        return [f.result() for f in self.execute_many(items, progress)]
+    
+    
+    def _execute(self, config: Union[dict], environ: Optional[Environ] = None) -> dict:
+        """Execute <config>, using the environment cache if possible."""
+        if (self.env_cache is None or environ is None or not isinstance(config, dict)
+                or "environment" in config):
+            return self._post_execute(config, environ)
+        
+        digest = file_digest(environ)
+        if digest is None:
+            return self._post_execute(config, environ)
+        
+        rewinder = Rewinder([environ])
+        uuid = self._cached_environment(digest, environ)
+        try:
+            return self._post_execute(dict(config, environment=uuid))
+        except Sandbox404:
+            # The environment expired between its check and the execution
+            self.env_cache.invalidate(digest)
+            if not rewinder.rewind():  # pragma: no cover
+                raise
+            uuid = self._cached_environment(digest, environ)
+            return self._post_execute(dict(config, environment=uuid))
+    
+    
+    def _cached_environment(self, digest: str, environ: BinaryIO) -> str:
+        """Return the UUID of the environment corresponding to <digest>,
+        uploading <environ> if the sandbox does not have it."""
+        uuid = self.env_cache.get(digest)
+        if uuid is not None and self.env_cache.needs_check(digest):
+            if self.check(uuid):
+                self.env_cache.checked(digest)
+            else:
+                self.env_cache.invalidate(digest)
+                uuid = None
+        
+        if uuid is None:
+            uuid = self._post_execute({"commands": ["true"], "save": True}, environ)["environment"]
+            self.env_cache.set(digest, uuid)
+        return uuid
+    
+    
+    def _post_execute(self, config: Union[dict], environ: Optional[Environ] = None) -> dict:
+        """Send the request of execute(), streaming <environ>."""
+        url, fields = self._build_url("execute"), {"config": self.codec.dumps(config)}
+        encoded = None
+        if environ is None and self.compression is not None:
+            encoded = self.compression.encode_form(fields.items())
+        if encoded is not None:
+            body, headers = encoded
+            response = self._request("POST", url, idempotent=False, data=body, headers=headers)
+        elif environ is None:
+            response = self._request("POST", url, idempotent=False, data=fields)
+        else:
+            name = getattr(environ, "name", None)
+            if isinstance(environ, EnvironmentBuilder):
+                name = EnvironmentReader.name
+            filename = os.path.basename(name) if isinstance(name, str) else "environment"
+            body = MultipartStream(
+                fields.items(), [("environment", filename, environ)], self.chunk_size
+            )
+            response = self._request(
+                "POST", url, idempotent=False, data=body,
+                headers={"Content-Type": body.content_type}
+            )
         if response.status_code != 200:
             raise status_exceptions(response)
         
-        return response.json()
+        return self._json(response)
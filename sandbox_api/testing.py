@@ -0,0 +1,643 @@
+# testing.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""An in-process fake of a sandbox server, built on aiohttp.web, to test and
+benchmark clients without a docker-backed sandbox.
+
+Every endpoint of utils.ENDPOINTS is served. Commands are either run as local
+subprocesses or answered by a script, and the server can be configured with a
+number of containers, latency distributions and injected faults (429 / 503
+responses, slow bodies). Random draws use a seeded generator so that runs are
+reproducible."""
+
+import asyncio
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import signal
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import BinaryIO, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from aiohttp import web
+
+from .enums import SandboxErrCode
+from .utils import ENDPOINTS, UNIX_SCHEME
+
+
+# Draw a duration in seconds from a random generator.
+Distribution = Callable[[random.Random], float]
+
+# Either a constant duration, a Distribution, or either of them by endpoint.
+Latency = Union[float, Distribution, Dict[str, Union[float, Distribution]]]
+
+# Return the exit code, stdout and stderr of a command from the command and
+# its environment variables.
+Script = Callable[[str, Dict[str, str]], Tuple[int, str, str]]
+
+SPECIFICATIONS = {
+    "host":      {
+        "docker_version":  "20.10.0",
+        "sandbox_version": "3.0.0",
+        "cpu":             {"core": 4, "logical": 8, "freq_min": 800.0, "freq_max": 4000.0},
+        "memory":          {"ram": 16000000000, "swap": 0, "storage": 500000000000},
+    },
+    "container": {
+        "working_dir_device": "/dev/sda1",
+        "count":              0,
+        "cpu":                {"count": 1, "period": 1000, "shares": 1024, "quota": 0},
+        "memory":             {"ram": 1000000000, "swap": 0, "storage": -1},
+    },
+}
+
+LIBRARIES = {
+    "system": {"python": "3.8.0", "gcc": "9.2.0"},
+    "c":      {},
+    "python": {"numpy": "1.18.0"},
+    "perl":   {},
+}
+
+
+def constant(value: float) -> Distribution:
+    """Always <value> seconds."""
+    return lambda rng: value
+
+
+def uniform(low: float, high: float) -> Distribution:
+    """Uniformly between <low> and <high> seconds."""
+    return lambda rng: rng.uniform(low, high)
+
+
+def exponential(mean: float) -> Distribution:
+    """Exponentially distributed with the given <mean>."""
+    return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Distribution:
+    """Log-normally distributed around <median>, with a long tail growing
+    with <sigma>."""
+    mu = 0.0 if median <= 0 else math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma) if median > 0 else 0.0
+
+
+def scripted(results: Dict[str, Tuple[int, str, str]],
+             default: Tuple[int, str, str] = (0, "", "")) -> Script:
+    """Return a script answering a command with its entry in <results>, the
+    <default> if it has none."""
+    return lambda command, environ: results.get(command, default)
+
+
+def _distribution(latency: Union[float, Distribution, None]) -> Distribution:
+    if latency is None:
+        return constant(0.0)
+    return latency if callable(latency) else constant(float(latency))
+
+
+
+class Faults:
+    """Faults injected by a FakeSandbox.
+    
+    * status : Probability of answering a request with each status instead
+            of processing it, E.G. {429: 0.1, 503: 0.05}.
+    * retry_after : Value of the Retry-After header of the injected
+            responses, None to omit it.
+    * slow_body : Probability of sending the body of a response slowly,
+            <chunk_size> bytes every <chunk_delay> seconds.
+    * endpoints : Name of the endpoints (keys of ENDPOINTS) the faults apply
+            to, None for every endpoint.
+    """
+    
+    
+    def __init__(self, status: Optional[Dict[int, float]] = None,
+                 retry_after: Optional[float] = 1, slow_body: float = 0.0,
+                 chunk_size: int = 1024, chunk_delay: float = 0.01,
+                 endpoints: Optional[Iterable[str]] = None):
+        self.status = dict(status or {})
+        self.retry_after = retry_after
+        self.slow_body = slow_body
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.endpoints = None if endpoints is None else set(endpoints)
+    
+    
+    def __repr__(self):
+        return "<Faults status=%s slow_body=%s>" % (self.status, self.slow_body)
+    
+    
+    def applies(self, endpoint: str) -> bool:
+        return self.endpoints is None or endpoint in self.endpoints
+    
+    
+    def draw_status(self, rng: random.Random) -> Optional[int]:
+        """Return the status to inject, None to process the request."""
+        draw = rng.random()
+        for status, probability in self.status.items():
+            if draw < probability:
+                return status
+            draw -= probability
+        return None
+
+
+
+class FakeSandbox:
+    """An in-process fake sandbox server.
+    
+    Used as an asynchronous context manager, the server listens on
+    <host>:<port> (a free port if 0) of the running event loop. Used as a
+    context manager, it runs in its own event loop in a background thread,
+    which suits synchronous clients. Its URL is in 'url' once started. The
+    aiohttp application is also available through 'app', E.G. for
+    aiohttp.test_utils.TestServer.
+    
+    * containers : Number of containers. Executions wait for a free one.
+    * max_queue : Maximum number of executions waiting for a container,
+            the next ones being answered with a 503, None for no limit.
+    * latency : Delay added before answering a request, a constant, a
+            Distribution, or a dict mapping the name of endpoints to either.
+    * faults : The Faults to inject, None for none.
+    * script : If given, answers the commands instead of running them as
+            local subprocesses, see scripted().
+    * command_time : Duration of each scripted command.
+    * command_timeout : Default timeout of the commands run as subprocesses.
+    * loader : Called with the name of the loader endpoint ('load/fr',
+            'demo', 'exo' or 'exec') and the fields of the form, returning the
+            JSON response. Echoes the fields by default.
+    * compress : Minimum size in bytes of the bodies of responses compressed
+            according to their Accept-Encoding, None to never compress them.
+            Compressed request bodies (Content-Encoding) are always accepted.
+    * seed : Seed of the random generator drawing latencies and faults.
+    * path : If given, the server listens on the Unix domain socket at this
+            path instead of <host>:<port>, its url being 'unix://<path>'.
+    
+    * stats : Counter of the requests by endpoint, of the injected faults
+            ('fault:429', 'slow_body', ...), of the executions and of the
+            compressed requests and responses ('encoded:gzip',
+            'compressed').
+    * running : Number of executions holding a container.
+    * max_running : Maximum number of executions which held a container at
+            the same time.
+    """
+    
+    
+    def __init__(self, containers: int = 5, max_queue: Optional[int] = None,
+                 latency: Latency = None, faults: Optional[Faults] = None,
+                 script: Optional[Script] = None, command_time: Latency = None,
+                 command_timeout: float = 10.0,
+                 loader: Optional[Callable[[str, dict], dict]] = None,
+                 compress: Optional[int] = None, seed: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0, path: Optional[str] = None):
+        self.containers = containers
+        self.max_queue = max_queue
+        self.latency = latency
+        self.faults = faults
+        self.script = script
+        self.command_time = command_time
+        self.command_timeout = command_timeout
+        self.loader = loader
+        self.compress = compress
+        self.random = random.Random(seed)
+        self.host = host
+        self.port = port
+        self.path = path
+        self.url = None
+        self.environments: Dict[str, bytes] = {}
+        self.stats = Counter()
+        self.running = 0
+        self.max_running = 0
+        self.waiting = 0
+        self._semaphore = None
+        self._runner = None
+        self._loop = None
+        self._thread = None
+        self._endpoints = {}
+        self.app = self._application()
+    
+    
+    def __repr__(self):
+        return "<FakeSandbox url=%s containers=%d running=%d>" % (
+            self.url, self.containers, self.running
+        )
+    
+    
+    def _application(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware], client_max_size=1024 ** 3)
+        handlers = {  # Every other endpoint is a POST handled by execute() or a loader
+            "specifications": self.specifications,
+            "libraries":      self.libraries,
+            "usages":         self.usages,
+            "environments":   self.environment,
+            "files":          self.file,
+        }
+        arguments = ("{uuid}", "{path:.+}")
+        for name, path in ENDPOINTS.items():
+            route = "/" + path % arguments[:path.count("%s")]
+            if name in handlers:
+                resource = app.router.add_get(route, handlers[name]).resource
+            else:
+                resource = app.router.add_post(route, self._handler(name)).resource
+            self._endpoints[resource.canonical] = name
+        return app
+    
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+    
+    
+    async def start(self):
+        """Start listening in the running event loop."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        if self.path is not None:
+            site = web.UnixSite(self._runner, self.path)
+            await site.start()
+            self.url = UNIX_SCHEME + self.path
+        else:
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            host, port = site._server.sockets[0].getsockname()[:2]
+            self.url = "http://%s:%d/" % (host, port)
+    
+    
+    async def stop(self):
+        """Stop listening."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+    
+    
+    def __enter__(self):
+        started = threading.Event()
+        
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+        
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = self._loop = None
+    
+    
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """The semaphore of the containers, created in the running loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.containers)
+        return self._semaphore
+    
+    
+    def _draw(self, latency: Latency, endpoint: str) -> float:
+        if isinstance(latency, dict):
+            latency = latency.get(endpoint)
+        return max(0.0, _distribution(latency)(self.random))
+    
+    
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Count the request, inject the faults and the latency, then answer
+        it, slowly if drawn."""
+        resource = request.match_info.route.resource
+        endpoint = None if resource is None else self._endpoints.get(resource.canonical)
+        if endpoint is None:
+            return await handler(request)
+        self.stats[endpoint] += 1
+        if "Content-Encoding" in request.headers:
+            self.stats["encoded:%s" % request.headers["Content-Encoding"]] += 1
+        
+        faults = self.faults if self.faults is not None and self.faults.applies(endpoint) else None
+        if faults is not None:
+            status = faults.draw_status(self.random)
+            if status is not None:
+                self.stats["fault:%d" % status] += 1
+                return self._fault(status, faults.retry_after)
+        
+        delay = self._draw(self.latency, endpoint)
+        if delay:
+            await asyncio.sleep(delay)
+        response = await handler(request)
+        if (self.compress is not None and isinstance(response, web.Response)
+                and len(response.body or b"") >= self.compress
+                and "Content-Encoding" not in response.headers
+                and request.headers.get("Accept-Encoding", "identity") != "identity"):
+            response.enable_compression()
+            self.stats["compressed"] += 1
+        
+        if (faults is not None and faults.slow_body
+                and self.random.random() < faults.slow_body and isinstance(response, web.Response)):
+            self.stats["slow_body"] += 1
+            return await self._slow(request, response, faults)
+        return response
+    
+    
+    @staticmethod
+    def _fault(status: int, retry_after: Optional[float]) -> web.Response:
+        headers = {} if retry_after is None else {"Retry-After": "%g" % retry_after}
+        return web.json_response({"error": "Injected fault"}, status=status, headers=headers)
+    
+    
+    @staticmethod
+    async def _slow(request: web.Request, response: web.Response,
+                    faults: Faults) -> web.StreamResponse:
+        """Send the body of <response> <chunk_size> bytes at a time."""
+        body = response.body or b""
+        slow = web.StreamResponse(status=response.status, headers=response.headers)
+        slow.content_length = len(body)
+        await slow.prepare(request)
+        for i in range(0, len(body), faults.chunk_size):
+            await slow.write(body[i:i + faults.chunk_size])
+            await asyncio.sleep(faults.chunk_delay)
+        await slow.write_eof()
+        return slow
+    
+    
+    @staticmethod
+    def _conditional(request: web.Request, payload: dict) -> web.Response:
+        """Answer with <payload>, or a 304 if the client has it already."""
+        body = json.dumps(payload, sort_keys=True).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+    
+    
+    async def specifications(self, request: web.Request) -> web.Response:
+        specifications = json.loads(json.dumps(SPECIFICATIONS))
+        specifications["container"]["count"] = self.containers
+        return self._conditional(request, specifications)
+    
+    
+    async def libraries(self, request: web.Request) -> web.Response:
+        return self._conditional(request, LIBRARIES)
+    
+    
+    async def usages(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "cpu":       {"frequency": 2000.0, "usage": self.running / max(1, self.containers),
+                          "usage_avg": [0.0, 0.0, 0.0]},
+            "memory":    {"ram": 0, "swap": 0, "storage": {}},
+            "io":        {"read_iops": {}, "read_bps": {}, "write_iops": {}, "write_bps": {}},
+            "network":   {"sent_bytes": 0, "received_bytes": 0, "sent_packets": 0,
+                          "received_packets": 0},
+            "process":   self.running,
+            "container": self.running,
+        })
+    
+    
+    @staticmethod
+    def _range(request: web.Request, body: bytes) -> web.Response:
+        """Answer with <body>, or the part of it asked by a Range header."""
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+        if match is None:
+            return web.Response(body=body, content_type="application/octet-stream")
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+        if start > end:
+            return web.Response(status=416, headers={"Content-Range": "bytes */%d" % len(body)})
+        return web.Response(
+            status=206, body=body[start:end + 1], content_type="application/octet-stream",
+            headers={"Content-Range": "bytes %d-%d/%d" % (start, end, len(body))}
+        )
+    
+    
+    async def environment(self, request: web.Request) -> web.Response:
+        body = self.environments.get(request.match_info["uuid"])
+        if body is None:
+            raise web.HTTPNotFound()
+        return self._range(request, body)
+    
+    
+    async def file(self, request: web.Request) -> web.Response:
+        body = self.environments.get(request.match_info["uuid"])
+        if body is None:
+            raise web.HTTPNotFound()
+        path = request.match_info["path"]
+        with tarfile.open(fileobj=io.BytesIO(body), mode="r:gz") as tar:
+            member = next(
+                (m for m in tar.getmembers() if m.isfile() and os.path.normpath(m.name) == path),
+                None
+            )
+            if member is None:
+                raise web.HTTPNotFound()
+            content = tar.extractfile(member).read()
+        return self._range(request, content)
+    
+    
+    def _handler(self, name: str):
+        """Return the handler of the POST endpoint <name>."""
+        if name == "execute":
+            return self.execute
+        
+        async def handler(request: web.Request) -> web.Response:
+            fields = {key: value for key, value in (await request.post()).items()
+                      if isinstance(value, str)}
+            if self.loader is not None:
+                return web.json_response(self.loader(name, fields))
+            return web.json_response({"status": 0, "endpoint": name, "fields": fields})
+        
+        return handler
+    
+    
+    async def execute(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        try:
+            config = json.loads(form["config"])
+        except (KeyError, ValueError):
+            raise web.HTTPBadRequest(text="Missing or invalid config")
+        if not isinstance(config, dict) or not isinstance(config.get("commands"), list):
+            raise web.HTTPBadRequest(text="Config must be a dict containing 'commands'")
+        
+        environ = form.get("environment")
+        base = config.get("environment")
+        if base is not None and base not in self.environments:
+            raise web.HTTPNotFound(text="Environment '%s' does not exist" % base)
+        
+        busy = self.semaphore.locked()
+        if self.max_queue is not None and busy and self.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise web.HTTPServiceUnavailable(text="Every container is busy")
+        
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.stats["executions"] += 1
+        try:
+            with tempfile.TemporaryDirectory(prefix="fake-sandbox-") as directory:
+                # Archives are (de)compressed in the default executor, so that
+                # the other requests are not blocked meanwhile
+                loop = asyncio.get_running_loop()
+                if base is not None:
+                    await loop.run_in_executor(
+                        None, _extract, self.environments[base], directory
+                    )
+                if environ is not None:
+                    await loop.run_in_executor(None, _extract, environ.file, directory)
+                result = await self._run(config, directory)
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+        return web.json_response(result)
+    
+    
+    async def _run(self, config: dict, directory: str) -> dict:
+        """Run the commands of <config> in <directory>, returning the result
+        of the execution."""
+        start = time.perf_counter()
+        environ = {str(k): str(v) for k, v in config.get("environ", {}).items()}
+        status, execution = 0, []
+        for command in config["commands"]:
+            timeout = self.command_timeout
+            if isinstance(command, dict):
+                timeout = command.get("timeout", timeout)
+                command = command["command"]
+            ignore = command.startswith("-")
+            command = command[1:] if ignore else command
+            
+            command_start = time.perf_counter()
+            if self.script is not None:
+                await asyncio.sleep(self._draw(self.command_time, "execute"))
+                exit_code, stdout, stderr = self.script(command, environ)
+            else:
+                exit_code, stdout, stderr = await _subprocess(command, directory, environ, timeout)
+            execution.append({
+                "command":   command,
+                "exit_code": exit_code,
+                "stdout":    stdout.rstrip("\n"),
+                "stderr":    stderr,
+                "time":      time.perf_counter() - command_start,
+            })
+            if exit_code == SandboxErrCode.TIMEOUT:
+                status = SandboxErrCode.TIMEOUT
+                break
+            if exit_code and not ignore:
+                status = exit_code
+                break
+        
+        result = {"status": status, "execution": execution}
+        if status == 0 and config.get("result_path"):
+            try:
+                with open(os.path.join(directory, config["result_path"]), "rb") as f:
+                    result["result"] = f.read().decode()
+            except OSError:
+                result["status"] = SandboxErrCode.RESULT_NOT_FOUND
+            except UnicodeDecodeError:
+                result["status"] = SandboxErrCode.RESULT_NOT_UTF8
+        if config.get("save"):
+            archive = await asyncio.get_running_loop().run_in_executor(None, _archive, directory)
+            result["environment"] = self._save(archive)
+        result["total_time"] = time.perf_counter() - start
+        return result
+    
+    
+    def _save(self, archive: bytes) -> str:
+        """Store <archive> as a new environment, returning its UUID."""
+        key = str(uuid.uuid4())
+        self.environments[key] = archive
+        return key
+
+
+
+def _archive(directory: str) -> bytes:
+    """Return the content of <directory> as a gzipped tar archive."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name in sorted(os.listdir(directory)):
+            tar.add(os.path.join(directory, name), arcname=name)
+    return buffer.getvalue()
+
+
+def _extract(archive: Union[bytes, BinaryIO], directory: str):
+    """Extract the gzipped tar <archive>, its content or a file object
+    reading it, into <directory>."""
+    if isinstance(archive, bytes):
+        archive = io.BytesIO(archive)
+    with tarfile.open(fileobj=archive, mode="r:*") as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(directory, filter="data")
+        else:  # pragma: no cover
+            tar.extractall(directory)
+
+
+async def _subprocess(command: str, directory: str, environ: Dict[str, str],
+                      timeout: float) -> Tuple[int, str, str]:
+    """Run <command> in a shell, returning its exit code, stdout and
+    stderr."""
+    process = await asyncio.create_subprocess_shell(
+        command, cwd=directory, env=dict(os.environ, **environ),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        # Kill the whole process group, children of the shell included
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:  # pragma: no cover
+            pass
+        await process.wait()
+        return (
+            SandboxErrCode.TIMEOUT, "",
+            "Command timed out after %s seconds\n" % timeout
+        )
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+def main():  # pragma: no cover
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Run a fake sandbox server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--path", default=None, help="Listen on this Unix domain socket instead")
+    parser.add_argument("--containers", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Mean latency in seconds, exponentially distributed")
+    parser.add_argument("--fault-429", type=float, default=0.0, help="Probability of a 429")
+    parser.add_argument("--fault-503", type=float, default=0.0, help="Probability of a 503")
+    parser.add_argument("--compress", type=int, default=None,
+                        help="Minimum size in bytes of the responses compressed")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    
+    faults = Faults({429: args.fault_429, 503: args.fault_503})
+    fake = FakeSandbox(
+        args.containers, latency=exponential(args.latency), faults=faults,
+        compress=args.compress, seed=args.seed, host=args.host, port=args.port, path=args.path
+    )
+    if args.path is not None:
+        web.run_app(fake.app, path=args.path, access_log=None)
+    else:
+        web.run_app(fake.app, host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,199 @@
+# transport.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Transports through which Sandbox and ASandbox send their requests.
+
+A transport mounts the requests' adapters of the session of a Sandbox and
+creates the aiohttp-like session of an ASandbox. The default one sends
+HTTP/1.1 requests through requests and aiohttp, HTTP2Transport multiplexes
+them over a single HTTP/2 connection with httpx.
+
+The HTTP libraries are only imported when a session is created, so that
+importing this module loads neither requests nor aiohttp."""
+
+from typing import TYPE_CHECKING, Dict, Optional, Type, Union
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    import aiohttp
+    
+    from .asandbox import ASandbox
+    from .ahttp2 import HTTP2Session
+    from .sandbox import Sandbox
+
+
+
+class Transport:
+    """Send HTTP/1.1 requests, through requests' HTTPAdapter for Sandbox and
+    aiohttp's connectors for ASandbox. This is the default transport.
+    
+    Subclasses override mount() and session()."""
+    
+    name = "http1"
+    
+    
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.name)
+    
+    
+    @staticmethod
+    def available() -> bool:
+        """Return whether the libraries of the transport are installed."""
+        return True
+    
+    
+    def mount(self, sandbox: "Sandbox"):
+        """Mount the adapters of <sandbox>'s requests session, configured
+        with its 'adapter_options'."""
+        from requests.adapters import HTTPAdapter
+        
+        from .unix import UnixAdapter
+        
+        adapter = HTTPAdapter(**sandbox.adapter_options)
+        sandbox.session.mount("http://", adapter)
+        sandbox.session.mount("https://", adapter)
+        if sandbox.socket_path is not None:
+            sandbox.session.mount(sandbox.base_url, UnixAdapter(
+                sandbox.socket_path, sandbox.adapter_options["pool_maxsize"],
+                sandbox.adapter_options["pool_block"]
+            ))
+            # Proxies, netrc and CA bundles do not apply to a socket, skip
+            # their lookup in the environment on every request
+            sandbox.session.trust_env = False
+    
+    
+    def session(self, sandbox: "ASandbox") -> "aiohttp.ClientSession":
+        """Create the aiohttp ClientSession of <sandbox>, using its
+        'connector' or creating one from its 'connector_options'."""
+        import aiohttp
+        
+        from .asandbox import HAS_ZSTD
+        
+        if sandbox.connector is not None:
+            connector, owner = sandbox.connector, False
+        elif sandbox.socket_path is not None:
+            options = dict(sandbox.connector_options)
+            del options["ttl_dns_cache"]
+            connector, owner = aiohttp.UnixConnector(sandbox.socket_path, **options), True
+        else:
+            connector, owner = aiohttp.TCPConnector(**sandbox.connector_options), True
+        trace_configs = None
+        if sandbox.instrumentation is not None:
+            trace_configs = [sandbox.instrumentation.trace_config()]
+        headers = None
+        if sandbox.compression is not None:
+            headers = {"Accept-Encoding": sandbox.compression.accept_encoding(HAS_ZSTD)}
+        return aiohttp.ClientSession(
+            connector=connector, connector_owner=owner, timeout=sandbox.timeout,
+            trace_configs=trace_configs, headers=headers
+        )
+
+
+
+class HTTP2Transport(Transport):
+    """Multiplex the requests over a single HTTP/2 connection with httpx,
+    instead of using one connection per request in flight.
+    
+    Requires httpx and h2 ('pip install pl-sandbox-api[http2]').
+    
+    * max_connections : Maximum number of connections opened to the sandbox.
+            httpx opens a single HTTP/2 connection to a sandbox, carrying as
+            many concurrent requests as the server allows (usually 100 or
+            more), the other requests waiting for a free stream. The other
+            connections are only used over HTTP/1.1.
+    * keepalive_expiry : How long an idle connection is kept alive.
+    * http1 : Whether HTTP/1.1 may also be used. If False, 'http://' URLs
+            (and Unix domain sockets) use HTTP/2 without negotiation (h2c
+            with prior knowledge), which the server must support. If True,
+            only 'https://' URLs negotiate HTTP/2, through ALPN, the others
+            using HTTP/1.1.
+    
+    The pool options of a Sandbox, and the connector and connector options
+    of an ASandbox, are ignored. The timeouts of an ASandbox apply to each
+    phase of a request (connection, sending, reading) instead of the whole
+    request, and its instrumentation only records the total duration of the
+    requests.
+    """
+    
+    name = "http2"
+    
+    
+    def __init__(self, max_connections: int = 10, keepalive_expiry: float = 5.0,
+                 http1: bool = False):
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+        
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http1 = http1
+    
+    
+    @staticmethod
+    def available() -> bool:
+        try:
+            import h2  # noqa: F401
+            import httpx  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    
+    
+    def options(self, socket_path: Optional[str] = None) -> dict:
+        """Return the keyword arguments of the httpx transports."""
+        import httpx
+        
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        return {"http1": self.http1, "http2": True, "limits": limits, "uds": socket_path}
+    
+    
+    def mount(self, sandbox: "Sandbox"):
+        from .http2 import HTTP2Adapter
+        
+        adapter = HTTP2Adapter(self.options(sandbox.socket_path))
+        sandbox.session.mount("http://", adapter)
+        sandbox.session.mount("https://", adapter)
+        if sandbox.socket_path is not None:
+            sandbox.session.trust_env = False
+    
+    
+    def session(self, sandbox: "ASandbox") -> "HTTP2Session":
+        from .compression import zstd_available
+        from .ahttp2 import HTTP2Session
+        
+        headers = None
+        if sandbox.compression is not None:
+            headers = {"Accept-Encoding": sandbox.compression.accept_encoding(zstd_available())}
+        return HTTP2Session(self.options(sandbox.socket_path), sandbox.timeout, headers)
+
+
+# Transports by name.
+TRANSPORTS: Dict[str, Type[Transport]] = {
+    Transport.name:      Transport,
+    HTTP2Transport.name: HTTP2Transport,
+}
+
+
+def get_transport(transport: Union[str, Transport, None] = None) -> Transport:
+    """Return the transport corresponding to <transport> : the default
+    transport if None, the transport of this name if it is a string,
+    <transport> itself otherwise.
+    
+    Raise ValueError if the name is unknown and ImportError if the libraries
+    of the transport are not installed."""
+    if transport is None:
+        return Transport()
+    if isinstance(transport, Transport):
+        return transport
+    cls: Optional[Type[Transport]] = TRANSPORTS.get(transport)
+    if cls is None:
+        raise ValueError(
+            "Unknown transport '%s', must be one of %s" % (transport, list(TRANSPORTS))
+        )
+    return cls()
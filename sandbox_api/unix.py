@@ -0,0 +1,91 @@
+# unix.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+"""Send the requests of Sandbox through a Unix domain socket, for sandboxes
+running on the same host as the client.
+
+A sandbox listening on a Unix domain socket is given as 'unix://' followed by
+the path of the socket, E.G. 'unix:///run/sandbox.sock'. Requests are then
+built against utils.UNIX_BASE_URL, so that the endpoints of utils.ENDPOINTS
+are joined as for any other URL, and sent through the socket."""
+
+import socket
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """An urllib3 HTTPConnection connected to the Unix domain socket
+    <socket_path> instead of a TCP port."""
+    
+    
+    def __init__(self, *args, socket_path: str, **kwargs):
+        self.socket_path = socket_path
+        super().__init__(*args, **kwargs)
+    
+    
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise NewConnectionError(
+                self, "Failed to connect to %s: %s" % (self.socket_path, e)
+            ) from e
+        return sock
+
+
+
+class UnixConnectionPool(HTTPConnectionPool):
+    """A pool of UnixHTTPConnection to the socket <socket_path>."""
+    
+    ConnectionCls = UnixHTTPConnection
+    
+    
+    def __init__(self, socket_path: str, **kwargs):
+        super().__init__("localhost", **kwargs)
+        self.conn_kw["socket_path"] = socket_path
+
+
+
+class UnixAdapter(HTTPAdapter):
+    """A requests transport adapter sending every request through the Unix
+    domain socket <socket_path>, whatever the host of its URL, keeping up to
+    <pool_maxsize> connections alive.
+    
+    Proxies are ignored."""
+    
+    
+    def __init__(self, socket_path: str, pool_maxsize: int = 10, pool_block: bool = False):
+        self.socket_path = socket_path
+        self.pool = UnixConnectionPool(socket_path, maxsize=pool_maxsize, block=pool_block)
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    
+    
+    def __repr__(self):
+        return "<UnixAdapter %s>" % self.socket_path
+    
+    
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self.pool
+    
+    
+    def get_connection(self, url, proxies=None):  # pragma: no cover - requests < 2.32
+        return self.pool
+    
+    
+    def request_url(self, request, proxies) -> str:
+        return request.path_url
+    
+    
+    def close(self):
+        super().close()
+        self.pool.close()
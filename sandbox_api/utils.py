@@ -4,7 +4,8 @@
 #   - Coumes Quentin <coumes.quentin@gmail.com>
 
 
-from typing import Tuple
+import hashlib
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
 
 
 # Lists of the sandbox's endpoints
@@ -22,11 +23,126 @@ ENDPOINTS = {
 
 }
 
+# Scheme of the URLs of sandboxes listening on a Unix domain socket, followed
+# by the path of the socket (E.G. 'unix:///run/sandbox.sock').
+UNIX_SCHEME = "unix://"
+
+# URL against which the requests sent through a socket are built, its host
+# being sent as the Host header.
+UNIX_BASE_URL = "http://localhost/"
+
+
+def unix_socket_path(url: str) -> Optional[str]:
+    """Return the path of the socket of <url> if it is a 'unix://' URL, None
+    otherwise."""
+    if not url.startswith(UNIX_SCHEME):
+        return None
+    path = url[len(UNIX_SCHEME):].rstrip("/")
+    if not path:
+        raise ValueError("URL '%s' does not contain the path of a socket" % url)
+    return path
+
+
+def base_url(url: str) -> str:
+    """Return the URL against which the requests to the sandbox at <url> are
+    built : UNIX_BASE_URL if it is a 'unix://' URL, <url> itself otherwise."""
+    return UNIX_BASE_URL if url.startswith(UNIX_SCHEME) else url
+
+
+def resolve_option(value: Any, factory: Callable[[], Any]) -> Any:
+    """Resolve the value of an optional feature's argument.
+    
+    Returns a default instance created with <factory> if <value> is True,
+    None if <value> is None or False, and <value> itself otherwise."""
+    if value is True:
+        return factory()
+    if value is None or value is False:
+        return None
+    return value
+
+
+def file_digest(f: BinaryIO, chunk_size: int = 2 ** 16) -> Optional[str]:
+    """Return the SHA-256 hex digest of the content of <f> from its current
+    position, seeking back to that position afterward.
+    
+    Return None if <f> is not seekable."""
+    try:
+        if not f.seekable():
+            return None
+        position = f.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+    f.seek(position)
+    return digest.hexdigest()
+
+
+def range_header(start: int = 0, end: Optional[int] = None) -> Optional[dict]:
+    """Return the headers requesting the bytes from <start> to <end>
+    (inclusive) of a resource, None if the whole resource is requested."""
+    if not start and end is None:
+        return None
+    return {"Range": "bytes=%d-%s" % (start, "" if end is None else end)}
+
+
+def split_segments(size: int, count: int) -> Iterator[Tuple[int, int]]:
+    """Split <size> bytes into <count> contiguous segments, yielding the
+    first and last (inclusive) byte of each segment."""
+    for i in range(count):
+        yield i * size // count, (i + 1) * size // count - 1
+
+
+class ChunkSlicer:
+    """Keep the bytes from <start> to <end> (inclusive) of a content received
+    in chunks.
+    
+    Used when a server ignored the Range header of a request."""
+    
+    
+    def __init__(self, start: int = 0, end: Optional[int] = None):
+        self.skip = start
+        self.remaining = None if end is None else end - start + 1
+    
+    
+    @property
+    def done(self) -> bool:
+        """Whether every wanted byte was received."""
+        return self.remaining == 0
+    
+    
+    def feed(self, chunk: bytes) -> bytes:
+        """Return the wanted part of the next <chunk>."""
+        if self.skip:
+            if len(chunk) <= self.skip:
+                self.skip -= len(chunk)
+                return b""
+            chunk, self.skip = chunk[self.skip:], 0
+        if self.remaining is not None:
+            chunk = chunk[:self.remaining]
+            self.remaining -= len(chunk)
+        return chunk
+
+
+def slice_chunks(chunks: Iterable[bytes], start: int = 0,
+                 end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield the bytes from <start> to <end> (inclusive) of the content
+    split into <chunks>, see ChunkSlicer."""
+    slicer = ChunkSlicer(start, end)
+    for chunk in chunks:
+        chunk = slicer.feed(chunk)
+        if chunk:
+            yield chunk
+        if slicer.done:
+            return
+
 
 def validate_command(c: dict) -> bool:
     """Returns True if <d> is a valid representation of a command,
     False otherwise.
-
+    
     Check that:
         - 'command' is present and is a string.
         - if 'timeout' is present, it is either an integer or a float."""
@@ -33,7 +33,7 @@ long_description = (
 
 setup(
     name='pl-sandbox-api',
-    version="1.1.4",
+    version="1.2.0",
     description=description,
     long_description=long_description,
     long_description_content_type='text/markdown',
@@ -42,5 +42,11 @@ setup(
     url='https://github.com/qcoumes/sandbox-api',
     packages=['sandbox_api'],
     install_requires=['requests', 'aiohttp'],
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson':  ['ujson'],
+        'zstd':   ['zstandard'],
+        'http2':  ['httpx[http2]'],
+    },
     classifiers=CLASSIFIERS,
 )
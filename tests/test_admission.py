@@ -0,0 +1,120 @@
+# test_admission.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import threading
+import time
+import unittest
+
+import aiounittest
+
+from sandbox_api import (AdmissionLimiter, ASandbox, AsyncAdmissionLimiter, Sandbox,
+                         SandboxBusy)
+
+
+TEST_URL = "http://127.0.0.1:7000/"
+
+
+
+class AdmissionLimiterTestCase(unittest.TestCase):
+    
+    def test_unsized_admit_everything(self):
+        limiter = AdmissionLimiter()
+        for _ in range(10):
+            limiter.acquire()
+        self.assertEqual(10, limiter.in_flight)
+        self.assertEqual(0, limiter.queue_depth)
+    
+    
+    def test_wait_for_slot(self):
+        limiter = AdmissionLimiter(1)
+        limiter.acquire()
+        timer = threading.Timer(0.1, limiter.release)
+        timer.start()
+        with limiter:
+            self.assertEqual(1, limiter.in_flight)
+        timer.join()
+        self.assertEqual(0, limiter.in_flight)
+        self.assertEqual(2, limiter.admitted)
+        self.assertGreaterEqual(limiter.max_wait_time, 0.05)
+        self.assertGreater(limiter.mean_wait_time, 0)
+    
+    
+    def test_timeout(self):
+        limiter = AdmissionLimiter(1, timeout=0.05)
+        limiter.acquire()
+        with self.assertRaises(SandboxBusy):
+            limiter.acquire()
+        self.assertEqual(1, limiter.rejected)
+        self.assertEqual(0, limiter.queue_depth)
+    
+    
+    def test_max_queue(self):
+        limiter = AdmissionLimiter(0, max_queue=0)
+        with self.assertRaises(SandboxBusy):
+            limiter.acquire()
+    
+    
+    def test_resize_wake_up(self):
+        limiter = AdmissionLimiter(0, timeout=1)
+        threading.Timer(0.05, limiter.resize, (1,)).start()
+        limiter.acquire()
+        self.assertEqual(1, limiter.in_flight)
+    
+    
+    def test_sandbox_sized_from_specifications(self):
+        s = Sandbox(TEST_URL, admission=True)
+        s.specifications = lambda: {"container": {"count": 3}}
+        s._execute = lambda config, environ: {"in_flight": s.admission.in_flight}
+        self.assertEqual({"in_flight": 1}, s.execute({"commands": ["true"]}))
+        self.assertEqual(3, s.admission.capacity)
+        self.assertEqual(0, s.admission.in_flight)
+        s.close()
+
+
+
+class AsyncAdmissionLimiterTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_wait_for_slot(self):
+        limiter = AsyncAdmissionLimiter(2)
+        running, peak = 0, 0
+        
+        async def job():
+            nonlocal running, peak
+            async with limiter:
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+        
+        await asyncio.gather(*(job() for _ in range(10)))
+        self.assertEqual(2, peak)
+        self.assertEqual(10, limiter.admitted)
+        self.assertEqual(0, limiter.in_flight)
+    
+    
+    async def test_timeout(self):
+        limiter = AsyncAdmissionLimiter(1, timeout=0.05)
+        await limiter.acquire()
+        start = time.monotonic()
+        with self.assertRaises(SandboxBusy):
+            await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        self.assertEqual(0, limiter.queue_depth)
+        self.assertEqual(1, limiter.stats()["rejected"])
+    
+    
+    async def test_asandbox_sized_from_specifications(self):
+        async with ASandbox(TEST_URL, admission=True) as s:
+            async def specifications():
+                return {"container": {"count": 3}}
+            
+            async def execute(config, environ):
+                return {"in_flight": s.admission.in_flight}
+            
+            s.specifications, s._execute = specifications, execute
+            self.assertEqual({"in_flight": 1}, await s.execute({"commands": ["true"]}))
+            self.assertEqual(3, s.admission.capacity)
@@ -4,14 +4,17 @@
 #   - Coumes Quentin <coumes.quentin@gmail.com>
 
 
+import asyncio
 import os
 import tarfile
 import time
 
+import aiohttp
 import aiounittest
 
 from sandbox_api import ASandbox, Sandbox400, Sandbox404
 from sandbox_api.enums import SandboxErrCode
+from sandbox_api.testing import FakeSandbox
 from tests.utils import ENV1, RESOURCES_ROOT
 
 
@@ -41,6 +44,68 @@ class ASandboxTestCase(aiounittest.AsyncTestCase):
         await s.close()
 
 
+class ASandboxSessionTestCase(aiounittest.AsyncTestCase):
+    
+    def test_instantiate_outside_loop(self):
+        s = ASandbox(TEST_URL)
+        self.assertIsNone(s._session)
+    
+    
+    async def test_session_lazily_created(self):
+        s = ASandbox(TEST_URL, limit=5, limit_per_host=2, keepalive_timeout=30,
+                     ttl_dns_cache=None)
+        self.assertIsNone(s._session)
+        session = s.session
+        self.assertIs(session, s.session)
+        self.assertEqual(5, session.connector.limit)
+        self.assertEqual(2, session.connector.limit_per_host)
+        await s.close()
+        self.assertTrue(session.closed)
+        self.assertIsNone(s._session)
+    
+    
+    async def test_shared_connector(self):
+        connector = aiohttp.TCPConnector(limit=7)
+        async with ASandbox(TEST_URL, connector=connector) as s1, \
+                ASandbox(TEST_URL, connector=connector) as s2:
+            self.assertIs(connector, s1.session.connector)
+            self.assertIs(connector, s2.session.connector)
+        self.assertFalse(connector.closed)
+        await connector.close()
+    
+    
+    def test_several_loops(self):
+        async def usage(s: ASandbox):
+            await s.usage()
+            return s.session
+        
+        with FakeSandbox() as fake:
+            s = ASandbox(fake.url)
+            first = asyncio.run(usage(s))
+            second = asyncio.run(usage(s))
+            self.assertIsNot(first, second)
+            self.assertTrue(first.closed)
+            asyncio.run(s.close())
+            self.assertTrue(second.closed)
+            self.assertIsNone(s._session)
+    
+    
+    def test_connector_other_loop(self):
+        async def usage():
+            async with aiohttp.TCPConnector() as connector:
+                s = ASandbox(fake.url, connector=connector)
+                await s.usage()
+            return s
+        
+        async def session(s: ASandbox):
+            return s.session
+        
+        with FakeSandbox() as fake:
+            s = asyncio.run(usage())
+            with self.assertRaises(RuntimeError):
+                asyncio.run(session(s))
+
+
 class ASandboxExecuteTestCase(aiounittest.AsyncTestCase):
     
     async def test_execute_ok_without_env(self):
@@ -227,7 +292,7 @@ class ASandboxDownloadTestCase(aiounittest.AsyncTestCase):
             }, f)
             time.sleep(0.1)
             downloaded = await s.download(response["environment"], "dir/file1.txt")
-    
+        
         self.assertEqual(b"env1\n", downloaded.read())
     
     
@@ -242,7 +307,7 @@ class ASandboxDownloadTestCase(aiounittest.AsyncTestCase):
     async def test_download_file_unknown(self):
         async with ASandbox(TEST_URL) as s:
             f = open(os.path.join(RESOURCE_DIR, "dae5f9a3-a911-4df4-82f8-b9343241ece5.tgz"), "rb")
-        
+            
             response = await s.execute({
                 "commands": ["true"],
                 "save":     True,
@@ -270,7 +335,7 @@ class ASandboxCheckTestCase(aiounittest.AsyncTestCase):
     async def test_check_file(self):
         async with ASandbox(TEST_URL) as s:
             f = open(os.path.join(RESOURCE_DIR, "dae5f9a3-a911-4df4-82f8-b9343241ece5.tgz"), "rb")
-        
+            
             response = await s.execute({
                 "commands": ["true"],
                 "save":     True,
@@ -288,7 +353,7 @@ class ASandboxCheckTestCase(aiounittest.AsyncTestCase):
     async def test_check_file_unknown(self):
         async with ASandbox(TEST_URL) as s:
             f = open(os.path.join(RESOURCE_DIR, "dae5f9a3-a911-4df4-82f8-b9343241ece5.tgz"), "rb")
-        
+            
             response = await s.execute({
                 "commands": ["true"],
                 "save":     True,
@@ -0,0 +1,237 @@
+# test_batch.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import unittest
+
+import aiounittest
+
+from sandbox_api import ASandbox, BatchResult, Sandbox, Sandbox404
+from sandbox_api.batch import aexecute_many
+from sandbox_api.testing import FakeSandbox
+
+
+
+class Tracker:
+    """Asynchronous execute() replacement recording its concurrency."""
+    
+    
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.started = 0
+    
+    
+    async def __call__(self, config, environ):
+        self.started += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            # Later items finish first
+            await asyncio.sleep(self.delay / (config["n"] + 1))
+            if config.get("fail"):
+                raise ValueError(config["n"])
+            return {"n": config["n"], "environ": environ}
+        finally:
+            self.running -= 1
+
+
+
+class AExecuteManyTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_concurrency(self):
+        tracker = Tracker()
+        items = [{"n": i} for i in range(20)]
+        results = [r async for r in aexecute_many(tracker, items, concurrency=4)]
+        self.assertEqual(4, tracker.max_running)
+        self.assertEqual(list(range(20)), sorted(r.index for r in results))
+        self.assertTrue(all(r.ok and r.get()["n"] == r.index for r in results))
+    
+    
+    async def test_ordered(self):
+        items = [{"n": i} for i in range(10)]
+        results = [r async for r in aexecute_many(Tracker(), items, 10, ordered=True)]
+        self.assertEqual(list(range(10)), [r.index for r in results])
+        
+        results = [r async for r in aexecute_many(Tracker(), items, 10)]
+        self.assertNotEqual(list(range(10)), [r.index for r in results])
+    
+    
+    async def test_environ(self):
+        items = [({"n": 0}, "environ"), {"n": 1}]
+        results = [r async for r in aexecute_many(Tracker(), items, ordered=True)]
+        self.assertEqual(["environ", None], [r.result["environ"] for r in results])
+    
+    
+    async def test_exceptions(self):
+        items = [{"n": i, "fail": i % 2} for i in range(6)]
+        results = [r async for r in aexecute_many(Tracker(), items, 2, ordered=True)]
+        self.assertEqual([True, False] * 3, [r.ok for r in results])
+        self.assertIsInstance(results[1].exception, ValueError)
+        self.assertIsNone(results[1].result)
+        with self.assertRaises(ValueError):
+            results[1].get()
+    
+    
+    async def test_progress(self):
+        calls = []
+        items = [{"n": i} for i in range(5)]
+        [r async for r in aexecute_many(Tracker(), items, 2, progress=lambda *a: calls.append(a))]
+        self.assertEqual([(i, 5) for i in range(1, 6)], calls)
+        
+        calls.clear()
+        generator = ({"n": i} for i in range(3))
+        [r async for r in aexecute_many(Tracker(), generator, progress=lambda *a: calls.append(a))]
+        self.assertEqual([(1, None), (2, None), (3, None)], calls)
+    
+    
+    async def test_lazy_consumption(self):
+        tracker = Tracker()
+        consumed = []
+        
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield {"n": i}
+        
+        iterator = aexecute_many(tracker, items(), concurrency=3)
+        await iterator.__anext__()
+        self.assertLessEqual(len(consumed), 4)
+        await iterator.aclose()
+    
+    
+    async def test_backpressure(self):
+        for ordered in (False, True):
+            with self.subTest(ordered=ordered):
+                tracker = Tracker()
+                items = [{"n": 0} for _ in range(50)]
+                iterator = aexecute_many(tracker, items, concurrency=2, ordered=ordered)
+                await iterator.__anext__()
+                await asyncio.sleep(0.5)
+                # The result held by the consumer, 2 waiting and 2 running
+                self.assertLessEqual(tracker.started, 2 * 2 + 1)
+                results = [r async for r in iterator]
+                self.assertEqual(49, len(results))
+                self.assertEqual(50, tracker.started)
+    
+    
+    async def test_cancel_on_close(self):
+        tracker = Tracker(delay=0.05)
+        items = [{"n": 0} for _ in range(50)]
+        iterator = aexecute_many(tracker, items, concurrency=5)
+        async for _ in iterator:
+            break
+        await iterator.aclose()
+        started = tracker.started
+        await asyncio.sleep(0.1)
+        self.assertEqual(started, tracker.started)
+        self.assertEqual(0, tracker.running)
+        self.assertLess(started, 50)
+    
+    
+    async def test_cancel_consumer_task(self):
+        tracker = Tracker(delay=0.05)
+        items = [{"n": 0} for _ in range(50)]
+        
+        async def consume():
+            return [r async for r in aexecute_many(tracker, items, concurrency=5)]
+        
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.07)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(0, tracker.running)
+        self.assertLess(tracker.started, 50)
+    
+    
+    async def test_iteration_error(self):
+        def items():
+            yield {"n": 0}
+            raise KeyError("items")
+        
+        with self.assertRaises(KeyError):
+            [r async for r in aexecute_many(Tracker(), items())]
+    
+    
+    async def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            [r async for r in aexecute_many(Tracker(), [], concurrency=0)]
+    
+    
+    async def test_repr(self):
+        self.assertEqual("<BatchResult index=1 ok>", repr(BatchResult(1, {})))
+        self.assertIn("exception=", repr(BatchResult(1, exception=ValueError())))
+
+
+
+def echo(command: str, environ: dict):
+    """Script of FakeSandbox answering a command with itself."""
+    return 0, command, ""
+
+
+def items(n: int, fail: int = -1) -> list:
+    """Return <n> configs whose command is their index, the config at index
+    <fail> referencing an unknown environment."""
+    return [
+        dict({"commands": [str(i)]}, **({"environment": "unknown"} if i == fail else {}))
+        for i in range(n)
+    ]
+
+
+
+class ASandboxExecuteManyTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_execute_many(self):
+        async with FakeSandbox(script=echo) as fake:
+            async with ASandbox(fake.url) as s:
+                results = [
+                    r async for r in s.execute_many(items(10, fail=3), concurrency=3, ordered=True)
+                ]
+        
+        self.assertEqual(list(range(10)), [r.index for r in results])
+        self.assertIsInstance(results[3].exception, Sandbox404)
+        for result in results[:3] + results[4:]:
+            self.assertEqual(str(result.index), result.result["execution"][0]["stdout"])
+
+
+
+class SandboxExecuteManyTestCase(unittest.TestCase):
+    
+    def test_map(self):
+        with FakeSandbox(containers=20, script=echo, command_time=0.01) as fake:
+            with Sandbox(fake.url, max_workers=4) as s:
+                results = s.map(items(20, fail=3))
+                pools = s.session.get_adapter(fake.url).poolmanager.pools
+                connections = [pools[key].num_connections for key in pools.keys()]
+        
+        self.assertEqual(list(range(20)), [r.index for r in results])
+        self.assertIsInstance(results[3].exception, Sandbox404)
+        for result in results[:3] + results[4:]:
+            self.assertEqual(str(result.index), result.result["execution"][0]["stdout"])
+        self.assertEqual(4, fake.max_running)
+        self.assertEqual(1, len(connections))
+        self.assertTrue(1 <= connections[0] <= 4)
+    
+    
+    def test_execute_many(self):
+        calls = []
+        with FakeSandbox(script=echo) as fake, Sandbox(fake.url) as s:
+            futures = s.execute_many([(c, None) for c in items(5)], lambda *a: calls.append(a))
+            results = [f.result() for f in futures]
+        
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(["0", "1", "2", "3", "4"],
+                         [r.result["execution"][0]["stdout"] for r in results])
+        self.assertEqual([(i, 5) for i in range(1, 6)], sorted(calls))
+    
+    
+    def test_executor(self):
+        with Sandbox("http://127.0.0.1:1/", pool_maxsize=3) as s:
+            self.assertEqual(3, s.max_workers)
+            self.assertIs(s.executor, s.executor)
+        self.assertIsNone(s._executor)
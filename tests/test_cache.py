@@ -0,0 +1,235 @@
+# test_cache.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import io
+import os
+import tempfile
+import time
+import unittest
+
+import aiounittest
+
+from sandbox_api import ASandbox, EnvironmentBuilder, ResultCache, Sandbox
+from sandbox_api.cache import result_key
+from sandbox_api.enums import SandboxErrCode
+from sandbox_api.testing import FakeSandbox
+
+
+CONFIG = {"commands": ["cat input.txt 2> /dev/null || true"]}
+TIMEOUT = {"commands": [{"command": "sleep 5", "timeout": 0.05}]}
+
+
+
+class ResultKeyTestCase(unittest.TestCase):
+    
+    def test_canonical(self):
+        self.assertEqual(
+            result_key({"commands": ["true"], "result_path": "r"}),
+            result_key({"result_path": "r", "commands": ["true"]})
+        )
+    
+    
+    def test_environment(self):
+        config = {"commands": ["true"]}
+        self.assertNotEqual(result_key(config), result_key(config, "digest"))
+        self.assertNotEqual(result_key(config, "digest1"), result_key(config, "digest2"))
+        self.assertNotEqual(result_key(config), result_key({"commands": ["false"]}))
+
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    
+    def test_get_set(self):
+        cache = ResultCache()
+        self.assertIsNone(cache.get("key"))
+        cache.set("key", {"status": 0})
+        self.assertEqual({"status": 0}, cache.get("key"))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        cache.invalidate("key")
+        self.assertIsNone(cache.get("key"))
+    
+    
+    def test_get_returns_copy(self):
+        cache = ResultCache()
+        cache.set("key", {"execution": []})
+        cache.get("key")["execution"].append(1)
+        self.assertEqual({"execution": []}, cache.get("key"))
+    
+    
+    def test_maxsize(self):
+        cache = ResultCache(maxsize=2)
+        cache.set("a", {"n": 1})
+        cache.set("b", {"n": 2})
+        cache.get("a")
+        cache.set("c", {"n": 3})
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual({"n": 1}, cache.get("a"))
+        self.assertEqual(1, cache.evictions)
+    
+    
+    def test_ttl(self):
+        cache = ResultCache(ttl=0.05)
+        cache.set("a", {"n": 1})
+        self.assertIsNotNone(cache.get("a"))
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(1, cache.expired)
+        self.assertEqual(0, len(cache))
+    
+    
+    def test_cacheable(self):
+        config = {"commands": ["true"]}
+        self.assertTrue(ResultCache.cacheable(config, {"status": 0}))
+        self.assertTrue(ResultCache.cacheable(config, {"status": 1}))
+        self.assertFalse(ResultCache.cacheable(config, {"status": -1}))
+        self.assertFalse(ResultCache.cacheable(config, {"status": -2}))
+        self.assertFalse(ResultCache.cacheable(dict(config, save=True), {"status": 0}))
+    
+    
+    def test_stats(self):
+        cache = ResultCache()
+        cache.get("a")
+        cache.set("a", {})
+        cache.get("a")
+        stats = cache.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(0.5, stats["hit_ratio"])
+        self.assertEqual(1, stats["size"])
+
+
+
+class ResultCacheDiskTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache")
+    
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    
+    def test_disk_tier(self):
+        cache = ResultCache(maxsize=1, directory=self.path)
+        cache.set("a", {"n": 1})
+        cache.set("b", {"n": 2})
+        self.assertEqual(1, len(cache))
+        self.assertEqual({"n": 1}, cache.get("a"))
+        self.assertEqual(1, cache.disk_hits)
+        
+        other = ResultCache(directory=self.path)
+        self.assertEqual(2, other.stats()["disk_size"])
+        self.assertEqual({"n": 2}, other.get("b"))
+    
+    
+    def test_disk_ttl(self):
+        cache = ResultCache(ttl=0.05, directory=self.path)
+        cache.set("a", {"n": 1})
+        time.sleep(0.06)
+        self.assertIsNone(ResultCache(ttl=0.05, directory=self.path).get("a"))
+        self.assertEqual([], os.listdir(self.path))
+    
+    
+    def test_disk_maxsize(self):
+        cache = ResultCache(maxsize=1, directory=self.path, disk_maxsize=2)
+        for key in "abc":
+            cache.set(key, {"key": key})
+            time.sleep(0.01)
+        self.assertEqual(2, len(os.listdir(self.path)))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual({"key": "b"}, cache.get("b"))
+    
+    
+    def test_corrupted(self):
+        cache = ResultCache(maxsize=1, directory=self.path)
+        with open(os.path.join(self.path, "a.json"), "w") as f:
+            f.write("garbage")
+        self.assertIsNone(cache.get("a"))
+    
+    
+    def test_clear(self):
+        cache = ResultCache(directory=self.path)
+        cache.set("a", {"n": 1})
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual([], os.listdir(self.path))
+        self.assertIsNone(cache.get("a"))
+
+
+
+def environment(content: str) -> io.BytesIO:
+    """Return an environment whose 'input.txt' contains <content>."""
+    return io.BytesIO(EnvironmentBuilder({"input.txt": content}).build())
+
+
+
+class SandboxResultCacheTestCase(unittest.TestCase):
+    
+    def test_execute(self):
+        with FakeSandbox() as fake, Sandbox(fake.url, result_cache=True) as s:
+            first = s.execute(CONFIG)
+            self.assertEqual(first, s.execute(CONFIG))
+            self.assertEqual(1, fake.stats["execute"])
+            
+            s.execute(CONFIG, cache=False)
+            self.assertEqual(2, fake.stats["execute"])
+            
+            result = s.execute(CONFIG, environment("content"))
+            self.assertEqual("content", result["execution"][0]["stdout"])
+            self.assertEqual(3, fake.stats["execute"])
+            
+            environ = environment("content")
+            self.assertEqual(result, s.execute(CONFIG, environ))
+            self.assertTrue(environ.closed)
+            s.execute(CONFIG, environment("other"))
+            self.assertEqual(4, fake.stats["execute"])
+            
+            self.assertEqual(SandboxErrCode.TIMEOUT, s.execute(TIMEOUT)["status"])
+            s.execute(TIMEOUT)
+            self.assertEqual(6, fake.stats["execute"])
+            self.assertEqual(2, s.result_cache.hits)
+    
+    
+    def test_disabled(self):
+        with FakeSandbox() as fake, Sandbox(fake.url) as s:
+            self.assertIsNone(s.result_cache)
+            s.execute(CONFIG)
+            s.execute(CONFIG)
+            self.assertEqual(2, fake.stats["execute"])
+
+
+
+class ASandboxResultCacheTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_execute(self):
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, result_cache=True) as s:
+                first = await s.execute(CONFIG)
+                self.assertEqual(first, await s.execute(CONFIG))
+                self.assertEqual(1, fake.stats["execute"])
+                
+                await s.execute(CONFIG, cache=False)
+                self.assertEqual(2, fake.stats["execute"])
+                
+                result = await s.execute(CONFIG, environment("content"))
+                self.assertEqual("content", result["execution"][0]["stdout"])
+                environ = environment("content")
+                self.assertEqual(result, await s.execute(CONFIG, environ))
+                self.assertTrue(environ.closed)
+                self.assertEqual(3, fake.stats["execute"])
+    
+    
+    async def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as d:
+            async with FakeSandbox() as fake:
+                async with ASandbox(fake.url, result_cache=ResultCache(directory=d)) as s:
+                    await s.execute(CONFIG)
+                async with ASandbox(fake.url, result_cache=ResultCache(directory=d)) as s:
+                    await s.execute(CONFIG)
+                    self.assertEqual(1, s.result_cache.disk_hits)
+                self.assertEqual(1, fake.stats["execute"])
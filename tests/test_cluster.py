@@ -0,0 +1,172 @@
+# test_cluster.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import unittest
+
+import aiounittest
+import requests
+
+from sandbox_api import ASandboxCluster, Sandbox503, SandboxCluster, SandboxUnavailable
+from sandbox_api.balancer import Balancer
+
+
+class Response:
+    
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+
+class FakeSandbox:
+    
+    def __init__(self, url: str, containers: int, running: int = 0):
+        self.url = url
+        self.containers = containers
+        self.running = running
+        self.error = None
+        self.executed = 0
+    
+    
+    def specifications(self):
+        if self.error is not None:
+            raise self.error
+        return {"container": {"count": self.containers}}
+    
+    
+    def usage(self):
+        if self.error is not None:
+            raise self.error
+        return {"container": self.running, "cpu": {"usage": 0.1}}
+    
+    
+    def execute(self, config, environ=None):
+        if self.error is not None:
+            raise self.error
+        self.executed += 1
+        result = {"status": 0, "url": self.url}
+        if config.get("save"):
+            result["environment"] = "env-" + self.url
+        return result
+    
+    
+    def close(self):
+        pass
+
+
+
+class AFakeSandbox(FakeSandbox):
+    
+    async def specifications(self):
+        return super().specifications()
+    
+    
+    async def usage(self):
+        return super().usage()
+    
+    
+    async def execute(self, config, environ=None):
+        return super().execute(config, environ)
+    
+    
+    async def close(self):
+        pass
+
+
+
+class BalancerTestCase(unittest.TestCase):
+    
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            Balancer([])
+    
+    
+    def test_select_most_free(self):
+        balancer = Balancer([FakeSandbox("a", 4), FakeSandbox("b", 8)])
+        a, b = balancer.nodes
+        balancer.update(a, {"container": 0, "cpu": {"usage": 0}}, {"container": {"count": 4}})
+        balancer.update(b, {"container": 6, "cpu": {"usage": 0}}, {"container": {"count": 8}})
+        self.assertIs(a, balancer.select())
+        
+        for _ in range(3):
+            balancer.acquire()
+        self.assertEqual(3, a.in_flight)
+        self.assertIs(b, balancer.select())
+    
+    
+    def test_failures(self):
+        balancer = Balancer([FakeSandbox("a", 4)], max_failures=2)
+        node = balancer.nodes[0]
+        balancer.release(balancer.acquire(), failed=True)
+        self.assertTrue(node.is_up())
+        balancer.release(balancer.acquire(), failed=True)
+        self.assertFalse(node.is_up())
+        with self.assertRaises(SandboxUnavailable):
+            balancer.select()
+
+
+
+class SandboxClusterTestCase(unittest.TestCase):
+    
+    def test_least_loaded(self):
+        a, b = FakeSandbox("a", 4, 3), FakeSandbox("b", 4, 1)
+        with SandboxCluster([a, b]) as cluster:
+            self.assertEqual("b", cluster.execute({"commands": ["true"]})["url"])
+    
+    
+    def test_environment_owner(self):
+        a, b = FakeSandbox("a", 4, 0), FakeSandbox("b", 4, 3)
+        with SandboxCluster([a, b]) as cluster:
+            env = cluster.execute({"commands": ["true"], "save": True})["environment"]
+            a.running, b.running = 4, 0
+            cluster.refresh()
+            result = cluster.execute({"commands": ["true"], "environment": env})
+            self.assertEqual("a", result["url"])
+    
+    
+    def test_health_check_failure(self):
+        a, b = FakeSandbox("a", 4, 0), FakeSandbox("b", 4, 3)
+        a.error = requests.ConnectionError()
+        with SandboxCluster([a, b]) as cluster:
+            self.assertEqual("b", cluster.execute({"commands": ["true"]})["url"])
+            self.assertFalse(cluster.nodes[0].is_up())
+    
+    
+    def test_5xx_take_out_of_rotation(self):
+        a, b = FakeSandbox("a", 4, 0), FakeSandbox("b", 4, 3)
+        with SandboxCluster([a, b], max_failures=2) as cluster:
+            cluster.refresh()
+            a.error = Sandbox503(Response(503))
+            for _ in range(2):
+                with self.assertRaises(Sandbox503):
+                    cluster.execute({"commands": ["true"]})
+            self.assertEqual("b", cluster.execute({"commands": ["true"]})["url"])
+    
+    
+    def test_all_down(self):
+        a = FakeSandbox("a", 4, 0)
+        a.error = requests.ConnectionError()
+        with SandboxCluster([a]) as cluster:
+            with self.assertRaises(SandboxUnavailable):
+                cluster.execute({"commands": ["true"]})
+
+
+
+class ASandboxClusterTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_least_loaded(self):
+        a, b = AFakeSandbox("a", 4, 3), AFakeSandbox("b", 4, 1)
+        async with ASandboxCluster([a, b]) as cluster:
+            self.assertEqual("b", (await cluster.execute({"commands": ["true"]}))["url"])
+    
+    
+    async def test_5xx_take_out_of_rotation(self):
+        a, b = AFakeSandbox("a", 4, 0), AFakeSandbox("b", 4, 3)
+        async with ASandboxCluster([a, b], max_failures=1) as cluster:
+            await cluster.refresh()
+            a.error = Sandbox503(Response(503))
+            with self.assertRaises(Sandbox503):
+                await cluster.execute({"commands": ["true"]})
+            self.assertEqual("b", (await cluster.execute({"commands": ["true"]}))["url"])
@@ -0,0 +1,109 @@
+# test_codec.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import json
+import unittest
+
+import aiounittest
+
+from sandbox_api import ASandbox, JSONCodec, Sandbox
+from sandbox_api.codec import OrjsonCodec, UjsonCodec, default_codec, get_codec
+from sandbox_api.testing import FakeSandbox
+
+
+DOCUMENT = {"status": 0, "stdout": "héllo / \"world\"\n" * 3, "time": 0.125, "list": [1, None]}
+
+
+
+class CountingCodec(JSONCodec):
+    
+    def __init__(self):
+        self.dumped = 0
+        self.loaded = 0
+    
+    
+    def dumps(self, obj):
+        self.dumped += 1
+        return super().dumps(obj)
+    
+    
+    def loads(self, data):
+        self.loaded += 1
+        return super().loads(data)
+
+
+
+class CodecTestCase(unittest.TestCase):
+    
+    def check_codec(self, codec: JSONCodec):
+        encoded = codec.dumps(DOCUMENT)
+        self.assertIsInstance(encoded, str)
+        self.assertEqual(DOCUMENT, json.loads(encoded))
+        self.assertEqual(DOCUMENT, codec.loads(json.dumps(DOCUMENT)))
+        self.assertEqual(DOCUMENT, codec.loads(json.dumps(DOCUMENT).encode()))
+        with self.assertRaises(ValueError):
+            codec.loads(b"{not json")
+    
+    
+    def test_stdlib(self):
+        self.check_codec(get_codec("json"))
+    
+    
+    @unittest.skipUnless(OrjsonCodec.available(), "orjson is not installed")
+    def test_orjson(self):
+        codec = get_codec("orjson")
+        self.check_codec(codec)
+        self.assertEqual({"1": 2}, json.loads(codec.dumps({1: 2})))
+        self.assertIsInstance(default_codec(), OrjsonCodec)
+    
+    
+    @unittest.skipUnless(UjsonCodec.available(), "ujson is not installed")
+    def test_ujson(self):
+        self.check_codec(get_codec("ujson"))
+    
+    
+    def test_get_codec(self):
+        codec = JSONCodec()
+        self.assertIs(codec, get_codec(codec))
+        self.assertIs(default_codec(), get_codec())
+        with self.assertRaises(ValueError):
+            get_codec("unknown")
+    
+    
+    def test_clients(self):
+        self.assertEqual("json", Sandbox("http://127.0.0.1:1/", codec="json").codec.name)
+        self.assertIs(default_codec(), ASandbox("http://127.0.0.1:1/").codec)
+
+
+
+def echo(command, environ):
+    """FakeSandbox script answering every command with the command itself,
+    as decoded by the sandbox."""
+    return 0, command, ""
+
+
+
+class ClientCodecTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_sandbox(self):
+        codec = CountingCodec()
+        async with FakeSandbox(script=echo) as fake:
+            with Sandbox(fake.url, codec=codec) as s:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    None, s.execute, {"commands": ["echo é"]}
+                )
+        self.assertEqual("echo é", result["execution"][0]["stdout"])
+        self.assertEqual((1, 1), (codec.dumped, codec.loaded))
+    
+    
+    async def test_asandbox(self):
+        codec = CountingCodec()
+        async with FakeSandbox(script=echo) as fake:
+            async with ASandbox(fake.url, codec=codec) as s:
+                result = await s.execute({"commands": ["echo é"]})
+        self.assertEqual("echo é", result["execution"][0]["stdout"])
+        self.assertEqual((1, 1), (codec.dumped, codec.loaded))
@@ -0,0 +1,100 @@
+# test_compression.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import gzip
+import json
+import unittest
+
+import aiounittest
+
+from sandbox_api import ASandbox, Sandbox
+from sandbox_api.compression import Compression, zstd_available
+from sandbox_api.multipart import encode_multipart
+from sandbox_api.testing import FakeSandbox
+
+
+LARGE = {"commands": ["echo " + "hello world " * 1000 + "| wc -c"]}
+SMALL = {"commands": ["echo ok"]}
+
+
+
+class CompressionTestCase(unittest.TestCase):
+    
+    def test_encode_multipart(self):
+        body, content_type = encode_multipart([("config", "{}"), ("data", b"\x00\x01")])
+        boundary = content_type.split("boundary=")[1]
+        self.assertTrue(content_type.startswith("multipart/form-data; "))
+        self.assertTrue(body.startswith(b"--" + boundary.encode() + b"\r\n"))
+        self.assertTrue(body.endswith(b"--" + boundary.encode() + b"--\r\n"))
+        self.assertIn(b'name="data"\r\n\r\n\x00\x01\r\n', body)
+    
+    
+    def test_encode_form(self):
+        compression = Compression(threshold=500)
+        body, headers = compression.encode_form([("config", "x" * 1000)])
+        self.assertEqual("gzip", headers["Content-Encoding"])
+        self.assertIn(b"x" * 1000, gzip.decompress(body))
+        self.assertLess(len(body), 1000)
+        
+        self.assertIsNone(compression.encode_form([("config", "x")]))
+        self.assertIsNone(compression.encode_form([("config", "x" * 1000), ("demo", True)]))
+    
+    
+    def test_options(self):
+        with self.assertRaises(ValueError):
+            Compression("brotli")
+        self.assertEqual("gzip, deflate", Compression().accept_encoding(False))
+        self.assertEqual("zstd, gzip, deflate", Compression().accept_encoding(True))
+        self.assertEqual("identity", Compression(responses=False).accept_encoding(True))
+    
+    
+    @unittest.skipUnless(zstd_available(), "zstandard is not installed")
+    def test_zstd(self):
+        import zstandard
+        
+        body, headers = Compression("zstd", threshold=0).encode_form([("config", "x" * 1000)])
+        self.assertEqual("zstd", headers["Content-Encoding"])
+        self.assertIn(b"x" * 1000, zstandard.ZstdDecompressor().decompressobj().decompress(body))
+    
+    
+    def test_sandbox(self):
+        with FakeSandbox(compress=1024) as fake, Sandbox(fake.url, compression=True) as s:
+            self.assertEqual("ok", s.execute(SMALL)["execution"][0]["stdout"])
+            self.assertEqual(0, fake.stats["encoded:gzip"])
+            self.assertEqual(0, fake.stats["compressed"])
+            
+            self.assertEqual("12000", s.execute(LARGE)["execution"][0]["stdout"])
+            self.assertEqual(1, fake.stats["encoded:gzip"])
+            self.assertEqual(1, fake.stats["compressed"])
+        
+        with FakeSandbox(compress=0) as fake, Sandbox(fake.url) as s:
+            s.execute(LARGE)
+            self.assertEqual(0, fake.stats["encoded:gzip"])
+
+
+
+class AsyncCompressionTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_asandbox(self):
+        async with FakeSandbox(compress=1024) as fake:
+            async with ASandbox(fake.url, compression=Compression(threshold=10)) as s:
+                self.assertEqual("12000", (await s.execute(LARGE))["execution"][0]["stdout"])
+                self.assertEqual("ok", (await s.execute(SMALL))["execution"][0]["stdout"])
+                fields = (await s.load({"a": "b" * 100}))["fields"]
+                self.assertEqual({"a": "b" * 100}, json.loads(fields["data"]))
+                self.assertEqual("exo", (await s.playexo({"c": 1}, {"d": "e" * 100}))["endpoint"])
+                self.assertEqual("b" * 100, (await s.exec({"a": "b" * 100}))["fields"]["a"])
+            self.assertEqual(5, fake.stats["encoded:gzip"])
+    
+    
+    async def test_responses(self):
+        async with FakeSandbox(compress=0) as fake:
+            async with ASandbox(fake.url, compression=Compression(responses=False)) as s:
+                await s.execute(SMALL)
+                self.assertEqual(0, fake.stats["compressed"])
+            async with ASandbox(fake.url, compression=True) as s:
+                await s.execute(SMALL)
+                self.assertEqual(1, fake.stats["compressed"])
@@ -0,0 +1,209 @@
+# test_download.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import io
+import os
+import tempfile
+
+import aiounittest
+from aiohttp import web
+
+from sandbox_api import ASandbox, Sandbox, Sandbox404
+from tests.utils import run_sync, serve
+
+
+CONTENT = os.urandom(300000)
+FILE = b"file content"
+
+
+
+def sandbox_app(ranges: bool = True):
+    """Return an application serving the environment 'env', containing the
+    file 'dir/file.txt'.
+    
+    The Range header of environment requests is ignored if <ranges> is False,
+    received Range headers are stored in app["ranges"]."""
+    
+    async def environment(request):
+        if request.match_info["uuid"] != "env":
+            return web.Response(status=404)
+        header = request.headers.get("Range")
+        request.app["ranges"].append(header)
+        if not ranges or header is None or request.method == "HEAD":
+            return web.Response(body=CONTENT)
+        start, end = header[len("bytes="):].split("-")
+        start, end = int(start), int(end) if end else len(CONTENT) - 1
+        return web.Response(status=206, body=CONTENT[start:end + 1], headers={
+            "Content-Range": "bytes %d-%d/%d" % (start, end, len(CONTENT))
+        })
+    
+    async def file(request):
+        if request.match_info["uuid"] != "env" or request.match_info["path"] != "dir/file.txt":
+            return web.Response(status=404)
+        return web.Response(body=FILE)
+    
+    app = web.Application()
+    app["ranges"] = []
+    app.router.add_get("/environments/{uuid}/", environment)
+    app.router.add_get("/files/{uuid}/{path:.+}/", file)
+    return app
+
+
+
+class SandboxDownloadTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_iter_download(self):
+        async with serve(sandbox_app()) as url:
+            with Sandbox(url, chunk_size=1000) as s:
+                chunks = await run_sync(lambda: list(s.iter_download("env")))
+                self.assertEqual(CONTENT, b"".join(chunks))
+                self.assertTrue(all(len(c) <= 1000 for c in chunks))
+                
+                chunks = await run_sync(lambda: list(s.iter_download("env", "dir/file.txt")))
+                self.assertEqual(FILE, b"".join(chunks))
+                
+                with self.assertRaises(Sandbox404):
+                    await run_sync(lambda: list(s.iter_download("unknown")))
+    
+    
+    async def test_download_to(self):
+        async with serve(sandbox_app()) as url:
+            with Sandbox(url) as s, tempfile.TemporaryDirectory() as d:
+                destination = os.path.join(d, "env.tgz")
+                written = await run_sync(s.download_to, "env", destination)
+                self.assertEqual(len(CONTENT), written)
+                with open(destination, "rb") as f:
+                    self.assertEqual(CONTENT, f.read())
+                
+                buffer = io.BytesIO()
+                await run_sync(s.download_to, "env", buffer, "dir/file.txt")
+                self.assertEqual(FILE, buffer.getvalue())
+    
+    
+    async def test_download_range(self):
+        for ranges in (True, False):
+            app = sandbox_app(ranges)
+            async with serve(app) as url:
+                with Sandbox(url, chunk_size=1000) as s:
+                    buffer = await run_sync(s.download_range, "env", 1500, 2499)
+                    self.assertEqual(CONTENT[1500:2500], buffer.getvalue())
+                    buffer = await run_sync(s.download_range, "env", 299000)
+                    self.assertEqual(CONTENT[299000:], buffer.getvalue())
+                    self.assertEqual(["bytes=1500-2499", "bytes=299000-"], app["ranges"])
+    
+    
+    async def test_download_to_resume(self):
+        for ranges in (True, False):
+            app = sandbox_app(ranges)
+            async with serve(app) as url:
+                with Sandbox(url) as s, tempfile.TemporaryDirectory() as d:
+                    destination = os.path.join(d, "env.tgz")
+                    with open(destination, "wb") as f:
+                        f.write(CONTENT[:100000])
+                    written = await run_sync(
+                        lambda: s.download_to("env", destination, resume=True)
+                    )
+                    self.assertEqual(len(CONTENT) - 100000 if ranges else len(CONTENT), written)
+                    with open(destination, "rb") as f:
+                        self.assertEqual(CONTENT, f.read())
+                    
+                    written = await run_sync(
+                        lambda: s.download_to("env", destination, resume=True)
+                    )
+                    self.assertEqual(0, written)
+    
+    
+    async def test_download_segmented(self):
+        for ranges in (True, False):
+            app = sandbox_app(ranges)
+            async with serve(app) as url:
+                with Sandbox(url) as s, tempfile.TemporaryDirectory() as d:
+                    destination = os.path.join(d, "env.tgz")
+                    written = await run_sync(lambda: s.download_segmented(
+                        "env", destination, segments=4, min_segment_size=1000
+                    ))
+                    self.assertEqual(len(CONTENT), written)
+                    with open(destination, "rb") as f:
+                        self.assertEqual(CONTENT, f.read())
+                    ranges_sent = [r for r in app["ranges"] if r is not None]
+                    self.assertEqual(4 if ranges else 1, len(ranges_sent))
+
+
+class ASandboxDownloadTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_iter_download(self):
+        async with serve(sandbox_app()) as url:
+            async with ASandbox(url, chunk_size=1000) as s:
+                chunks = [c async for c in s.iter_download("env")]
+                self.assertEqual(CONTENT, b"".join(chunks))
+                self.assertTrue(all(len(c) <= 1000 for c in chunks))
+                
+                chunks = [c async for c in s.iter_download("env", "dir/file.txt")]
+                self.assertEqual(FILE, b"".join(chunks))
+                
+                with self.assertRaises(Sandbox404):
+                    [c async for c in s.iter_download("unknown")]
+    
+    
+    async def test_download_to(self):
+        async with serve(sandbox_app()) as url:
+            async with ASandbox(url) as s:
+                with tempfile.TemporaryDirectory() as d:
+                    destination = os.path.join(d, "env.tgz")
+                    self.assertEqual(len(CONTENT), await s.download_to("env", destination))
+                    with open(destination, "rb") as f:
+                        self.assertEqual(CONTENT, f.read())
+                
+                buffer = io.BytesIO()
+                await s.download_to("env", buffer, "dir/file.txt")
+                self.assertEqual(FILE, buffer.getvalue())
+    
+    
+    async def test_download_range(self):
+        for ranges in (True, False):
+            app = sandbox_app(ranges)
+            async with serve(app) as url:
+                async with ASandbox(url, chunk_size=1000) as s:
+                    buffer = await s.download_range("env", 1500, 2499)
+                    self.assertEqual(CONTENT[1500:2500], buffer.getvalue())
+                    buffer = await s.download_range("env", 299000)
+                    self.assertEqual(CONTENT[299000:], buffer.getvalue())
+                    self.assertEqual(["bytes=1500-2499", "bytes=299000-"], app["ranges"])
+    
+    
+    async def test_download_to_resume(self):
+        for ranges in (True, False):
+            app = sandbox_app(ranges)
+            async with serve(app) as url:
+                async with ASandbox(url) as s:
+                    with tempfile.TemporaryDirectory() as d:
+                        destination = os.path.join(d, "env.tgz")
+                        with open(destination, "wb") as f:
+                            f.write(CONTENT[:100000])
+                        written = await s.download_to("env", destination, resume=True)
+                        expected = len(CONTENT) - 100000 if ranges else len(CONTENT)
+                        self.assertEqual(expected, written)
+                        with open(destination, "rb") as f:
+                            self.assertEqual(CONTENT, f.read())
+                        
+                        self.assertEqual(0, await s.download_to("env", destination, resume=True))
+    
+    
+    async def test_download_segmented(self):
+        for ranges in (True, False):
+            app = sandbox_app(ranges)
+            async with serve(app) as url:
+                async with ASandbox(url) as s:
+                    with tempfile.TemporaryDirectory() as d:
+                        destination = os.path.join(d, "env.tgz")
+                        written = await s.download_segmented(
+                            "env", destination, segments=4, min_segment_size=1000
+                        )
+                        self.assertEqual(len(CONTENT), written)
+                        with open(destination, "rb") as f:
+                            self.assertEqual(CONTENT, f.read())
+                        ranges_sent = [r for r in app["ranges"] if r is not None]
+                        self.assertEqual(4 if ranges else 1, len(ranges_sent))
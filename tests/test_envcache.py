@@ -0,0 +1,100 @@
+# test_envcache.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import io
+import time
+import unittest
+
+import aiounittest
+
+from sandbox_api import ASandbox, EnvironmentBuilder, Sandbox
+from sandbox_api.envcache import EnvironmentCache
+from sandbox_api.testing import FakeSandbox
+
+
+CONFIG = {"commands": ["cat input.txt"]}
+
+
+
+class EnvironmentCacheTestCase(unittest.TestCase):
+    
+    def test_get_set(self):
+        cache = EnvironmentCache()
+        self.assertIsNone(cache.get("digest"))
+        cache.set("digest", "uuid")
+        self.assertEqual("uuid", cache.get("digest"))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        cache.invalidate("digest")
+        self.assertIsNone(cache.get("digest"))
+        self.assertEqual(1, cache.expired)
+    
+    
+    def test_maxsize(self):
+        cache = EnvironmentCache(maxsize=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("1", cache.get("a"))
+    
+    
+    def test_needs_check(self):
+        cache = EnvironmentCache(check_interval=0.05)
+        self.assertTrue(cache.needs_check("a"))
+        cache.set("a", "1")
+        self.assertFalse(cache.needs_check("a"))
+        time.sleep(0.06)
+        self.assertTrue(cache.needs_check("a"))
+        cache.checked("a")
+        self.assertFalse(cache.needs_check("a"))
+
+
+
+def environment(content: str) -> io.BytesIO:
+    """Return an environment whose 'input.txt' contains <content>."""
+    return io.BytesIO(EnvironmentBuilder({"input.txt": content}).build())
+
+
+
+class SandboxEnvironmentCacheTestCase(unittest.TestCase):
+    
+    def test_upload_once(self):
+        with FakeSandbox() as fake, Sandbox(fake.url, env_cache=True) as s:
+            for _ in range(3):
+                result = s.execute(CONFIG, environment("env"))
+                self.assertEqual("env", result["execution"][0]["stdout"])
+            self.assertEqual(1, len(fake.environments))
+            
+            fake.environments.clear()
+            result = s.execute(CONFIG, environment("env"))
+            self.assertEqual("env", result["execution"][0]["stdout"])
+            self.assertEqual(1, len(fake.environments))
+            self.assertEqual(1, s.env_cache.expired)
+
+
+
+class ASandboxEnvironmentCacheTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_upload_once(self):
+        async with FakeSandbox() as fake:
+            cache = EnvironmentCache(check_interval=60)
+            async with ASandbox(fake.url, env_cache=cache) as s:
+                for _ in range(3):
+                    result = await s.execute(CONFIG, environment("env"))
+                    self.assertEqual("env", result["execution"][0]["stdout"])
+                self.assertEqual(1, len(fake.environments))
+                
+                # Expired after its last check, detected through the 404
+                fake.environments.clear()
+                result = await s.execute(CONFIG, environment("env"))
+                self.assertEqual("env", result["execution"][0]["stdout"])
+                self.assertEqual(1, len(fake.environments))
+                
+                result = await s.execute(CONFIG, environment("other"))
+                self.assertEqual("other", result["execution"][0]["stdout"])
+                self.assertEqual(2, len(cache))
@@ -0,0 +1,119 @@
+# test_environment.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+import aiounittest
+from aiohttp import web
+
+from sandbox_api import ASandbox, EnvironmentBuilder, Sandbox
+from sandbox_api.testing import FakeSandbox
+from tests.utils import ENV1, RESOURCES_ROOT, serve
+
+
+def members(archive: bytes) -> dict:
+    """Return a dict mapping the name of the regular files of <archive> to
+    their content."""
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+        return {m.name: tar.extractfile(m).read() for m in tar.getmembers() if m.isfile()}
+
+
+
+class EnvironmentBuilderTestCase(unittest.TestCase):
+    
+    def test_files(self):
+        builder = EnvironmentBuilder({"a.txt": "a", "dir/b.bin": b"\x00b"})
+        builder.add_file("c.sh", "#!/bin/sh", mode=0o755)
+        archive = builder.build()
+        self.assertEqual({"a.txt": b"a", "dir/b.bin": b"\x00b", "c.sh": b"#!/bin/sh"},
+                         members(archive))
+        with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+            self.assertEqual(0o755, tar.getmember("c.sh").mode)
+    
+    
+    def test_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "sub"))
+            with open(os.path.join(directory, "sub", "file.txt"), "wb") as f:
+                f.write(b"content" * 10000)
+            os.symlink("sub/file.txt", os.path.join(directory, "link"))
+            
+            builder = EnvironmentBuilder(chunk_size=1024)
+            builder.add_path(directory, "")
+            builder.add_path(os.path.join(directory, "sub"))
+            builder.add_path(os.path.join(RESOURCES_ROOT, f"{ENV1}.tgz"), "env.tgz")
+            archive = builder.build()
+        
+        content = members(archive)
+        self.assertEqual(b"content" * 10000, content["sub/file.txt"])
+        self.assertIn("env.tgz", content)
+        with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+            self.assertEqual("sub/file.txt", tar.getmember("link").linkname)
+            self.assertTrue(tar.getmember("sub").isdir())
+    
+    
+    def test_size_and_reader(self):
+        builder = EnvironmentBuilder({"a.txt": os.urandom(100000)}, chunk_size=1000)
+        chunks = list(builder)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(map(len, chunks)), builder.size())
+        reader = builder.open()
+        self.assertEqual(builder.size(), len(reader))
+        self.assertEqual(b"".join(chunks), reader.read())
+        
+        size = builder.size()
+        builder.add_file("b.txt", "b")
+        self.assertNotEqual(size, builder.size())
+    
+    
+    def test_compresslevel(self):
+        files = {"a.txt": "a" * 100000}
+        self.assertGreater(EnvironmentBuilder(files, compresslevel=0).size(),
+                           EnvironmentBuilder(files, compresslevel=9).size())
+
+
+
+def sandbox_app():
+    """Return an application whose execute endpoint returns the names of the
+    files of the received environment and whether it had a Content-Length."""
+    
+    async def execute(request):
+        length = request.content_length
+        post = await request.post()
+        content = members(post["environment"].file.read())
+        return web.json_response({"files": sorted(content), "content_length": length})
+    
+    app = web.Application()
+    app.router.add_post("/execute/", execute)
+    return app
+
+
+
+class ExecuteEnvironmentBuilderTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_asandbox(self):
+        builder = EnvironmentBuilder({"a.txt": "a", "b/c.txt": "c"})
+        async with serve(sandbox_app()) as url:
+            async with ASandbox(url) as s:
+                result = await s.execute({"commands": ["true"]}, builder)
+                self.assertEqual(["a.txt", "b/c.txt"], result["files"])
+                self.assertIsNotNone(result["content_length"])
+                
+                builder.sized = False
+                result = await s.execute({"commands": ["true"]}, builder)
+                self.assertEqual(["a.txt", "b/c.txt"], result["files"])
+                self.assertIsNone(result["content_length"])
+    
+    
+    def test_sandbox(self):
+        builder = EnvironmentBuilder({"a.txt": "a", "b/c.txt": "c"})
+        with FakeSandbox() as fake, Sandbox(fake.url) as s:
+            result = s.execute({"commands": ["find . -type f | sort"]}, builder)
+        self.assertEqual("./a.txt\n./b/c.txt", result["execution"][0]["stdout"])
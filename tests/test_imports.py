@@ -0,0 +1,85 @@
+# test_imports.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import os
+import subprocess
+import sys
+import unittest
+
+import sandbox_api
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def loaded(statement: str, *modules: str) -> dict:
+    """Execute <statement> in a fresh interpreter, returning whether each of
+    <modules> was loaded."""
+    script = "import sys\n%s\nprint(' '.join(str(m in sys.modules) for m in %r))" % (
+        statement, modules
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, stdout=subprocess.PIPE, cwd=ROOT
+    ).stdout.decode().split()
+    return dict(zip(modules, (o == "True" for o in output)))
+
+
+
+class LazyImportTestCase(unittest.TestCase):
+    
+    def test_package(self):
+        self.assertEqual(
+            {"requests": False, "aiohttp": False, "sandbox_api.sandbox": False},
+            loaded("import sandbox_api, sandbox_api.exceptions", "requests", "aiohttp",
+                   "sandbox_api.sandbox")
+        )
+    
+    
+    def test_sync(self):
+        self.assertEqual(
+            {"requests": True, "aiohttp": False},
+            loaded("from sandbox_api import Sandbox, SandboxCluster, Instrumentation\n"
+                   "Sandbox('http://127.0.0.1:1/', instrumentation=True)",
+                   "requests", "aiohttp")
+        )
+    
+    
+    @unittest.skipUnless(sandbox_api.HTTP2Transport.available(), "httpx or h2 is not installed")
+    def test_sync_http2(self):
+        self.assertEqual(
+            {"requests": True, "aiohttp": False},
+            loaded("from sandbox_api import Sandbox\n"
+                   "Sandbox('http://127.0.0.1:1/', transport='http2')",
+                   "requests", "aiohttp")
+        )
+    
+    
+    def test_async(self):
+        self.assertEqual(
+            {"requests": False, "aiohttp": True},
+            loaded("from sandbox_api import ASandbox, ASandboxCluster, UsageMonitor",
+                   "requests", "aiohttp")
+        )
+    
+    
+    def test_getattr(self):
+        from sandbox_api.sandbox import Sandbox
+        
+        self.assertIs(Sandbox, sandbox_api.Sandbox)
+        self.assertIn("ASandbox", dir(sandbox_api))
+        with self.assertRaises(AttributeError):
+            sandbox_api.Unknown
+    
+    
+    def test_star(self):
+        self.assertEqual(
+            {"requests": True, "aiohttp": True},
+            loaded("from sandbox_api import *\n"
+                   "assert Sandbox and ASandbox and Sandbox404 and SandboxErrCode and VERSION",
+                   "requests", "aiohttp")
+        )
+        self.assertEqual(sorted(set(sandbox_api.__all__)), sorted(sandbox_api.__all__))
@@ -0,0 +1,176 @@
+# test_instrumentation.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import logging
+import unittest
+
+import aiounittest
+
+from sandbox_api import (ASandbox, HistogramSink, Instrumentation, LoggingSink, Sandbox,
+                         Sandbox404, Sink)
+from sandbox_api.instrumentation import Histogram, RequestTiming, endpoint_name
+from sandbox_api.testing import FakeSandbox
+
+
+CONFIG = {"commands": ["true"]}
+
+
+
+class RecordingSink(Sink):
+    
+    def __init__(self):
+        self.started = []
+        self.finished = []
+        self.observed = []
+    
+    
+    def request_started(self, timing):
+        self.started.append(timing)
+    
+    
+    def request_finished(self, timing):
+        self.finished.append(timing)
+    
+    
+    def observe(self, endpoint, phase, seconds):
+        self.observed.append((endpoint, phase, seconds))
+
+
+
+class HelpersTestCase(unittest.TestCase):
+    
+    def test_endpoint_name(self):
+        self.assertEqual("execute", endpoint_name("http://host/", "http://host/execute/"))
+        self.assertEqual(
+            "files", endpoint_name("http://host/sandbox/", "http://host/sandbox/files/a/b/")
+        )
+        self.assertEqual("/", endpoint_name("http://host/", "http://host/"))
+    
+    
+    def test_histogram(self):
+        histogram = Histogram(buckets=(0.1, 1.0, float("inf")))
+        self.assertEqual(0.0, histogram.quantile(0.5))
+        for value in (0.05, 0.05, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual([2, 1, 1], histogram.counts)
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(0.65, histogram.mean)
+        self.assertEqual(0.1, histogram.quantile(0.5))
+        self.assertEqual(2.0, histogram.quantile(0.99))
+        self.assertEqual(2.0, histogram.summary()["max"])
+    
+    
+    def test_timing_span(self):
+        timing = RequestTiming("execute", "POST")
+        timing.mark("a")
+        timing.span("a", "b", "phase")
+        self.assertNotIn("phase", timing.phases)
+        timing.mark("b")
+        timing.span("a", "b", "phase")
+        self.assertGreaterEqual(timing.phases["phase"], 0)
+    
+    
+    def test_instrumentation(self):
+        recording = RecordingSink()
+        instrumentation = Instrumentation([HistogramSink(), recording])
+        timing = instrumentation.start("execute", "POST")
+        instrumentation.finish(timing, 200)
+        instrumentation.decoded("execute", {"total_time": 0.5}, 0.001)
+        
+        self.assertEqual([timing], recording.started)
+        self.assertEqual(200, recording.finished[0].status)
+        self.assertIn("total", timing.phases)
+        self.assertEqual(
+            [("execute", "decode", 0.001), ("execute", "server", 0.5)], recording.observed
+        )
+        summary = instrumentation.histograms.summary()
+        self.assertEqual({"decode", "server", "total"}, set(summary["execute"]))
+    
+    
+    def test_default_sink(self):
+        self.assertIsInstance(Instrumentation().histograms, HistogramSink)
+        self.assertIsNone(Instrumentation([]).histograms)
+    
+    
+    def test_logging_sink(self):
+        instrumentation = Instrumentation([LoggingSink(logging.INFO)])
+        with self.assertLogs("sandbox_api", logging.INFO) as logs:
+            instrumentation.finish(instrumentation.start("usages", "GET"), 200)
+        self.assertIn("GET usages status=200", logs.output[0])
+
+
+
+class SandboxInstrumentationTestCase(unittest.TestCase):
+    
+    def test_timings(self):
+        recording = RecordingSink()
+        instrumentation = Instrumentation([HistogramSink(), recording])
+        with FakeSandbox(latency={"execute": 0.01}) as fake:
+            with Sandbox(fake.url, instrumentation=instrumentation) as s:
+                result = s.execute(CONFIG)
+                s.usage()
+                with self.assertRaises(Sandbox404):
+                    s.download("unknown")
+        
+        execute = recording.finished[0]
+        self.assertEqual(("execute", "POST", 200), (execute.endpoint, execute.method, execute.status))
+        self.assertGreaterEqual(execute.phases["wait"], 0.01)
+        self.assertGreaterEqual(execute.phases["total"], execute.phases["wait"])
+        self.assertIn("read", execute.phases)
+        self.assertEqual(404, recording.finished[2].status)
+        
+        summary = instrumentation.histograms.summary()
+        self.assertEqual(result["total_time"], summary["execute"]["server"]["max"])
+        self.assertEqual(1, summary["usages"]["decode"]["count"])
+    
+    
+    def test_error(self):
+        recording = RecordingSink()
+        with Sandbox("http://127.0.0.1:1/", instrumentation=Instrumentation([recording])) as s:
+            with self.assertRaises(Exception):
+                s.usage()
+        self.assertEqual("ConnectionError", recording.finished[0].error)
+        self.assertIsNone(recording.finished[0].status)
+
+
+
+class ASandboxInstrumentationTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_timings(self):
+        recording = RecordingSink()
+        instrumentation = Instrumentation([HistogramSink(), recording])
+        async with FakeSandbox(latency={"execute": 0.01}) as fake:
+            async with ASandbox(fake.url, instrumentation=instrumentation) as s:
+                result = await s.execute(CONFIG)
+                await s.usage()
+        
+        execute, usage = recording.finished
+        self.assertEqual(("execute", "POST", 200), (execute.endpoint, execute.method, execute.status))
+        self.assertIn("connect", execute.phases)
+        self.assertIn("send", execute.phases)
+        self.assertGreaterEqual(execute.phases["wait"], 0.01)
+        self.assertNotIn("connect", usage.phases)
+        
+        summary = instrumentation.histograms.summary()
+        self.assertEqual(result["total_time"], summary["execute"]["server"]["max"])
+        self.assertLessEqual(
+            {"connect", "send", "wait", "read", "decode", "server", "total"}, set(summary["execute"])
+        )
+    
+    
+    async def test_error(self):
+        recording = RecordingSink()
+        instrumentation = Instrumentation([recording])
+        async with ASandbox("http://127.0.0.1:1/", instrumentation=instrumentation) as s:
+            with self.assertRaises(Exception):
+                await s.usage()
+        self.assertEqual("ClientConnectorError", recording.finished[0].error)
+    
+    
+    async def test_disabled(self):
+        async with ASandbox("http://127.0.0.1:1/") as s:
+            self.assertIsNone(s.instrumentation)
+            self.assertEqual([], s.session.trace_configs)
@@ -0,0 +1,196 @@
+# test_metacache.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import time
+import unittest
+
+import aiounittest
+
+from sandbox_api import ASandbox, MetadataCache, Sandbox
+from sandbox_api.testing import FakeSandbox, Faults
+
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+    
+    def test_lookup(self):
+        cache = MetadataCache(ttl=0.05)
+        self.assertEqual((None, False), cache.lookup("specifications"))
+        cache.store("specifications", {"container": {"count": 5}})
+        self.assertEqual(({"container": {"count": 5}}, True), cache.lookup("specifications"))
+        time.sleep(0.06)
+        self.assertEqual(({"container": {"count": 5}}, False), cache.lookup("specifications"))
+        self.assertEqual(5, cache.not_modified("specifications")["container"]["count"])
+        self.assertTrue(cache.lookup("specifications")[1])
+    
+    
+    def test_lookup_returns_shallow_copy(self):
+        cache = MetadataCache()
+        cache.store("libraries", {"python": []})
+        cache.lookup("libraries")[0]["python"] = ["numpy"]
+        self.assertEqual({"python": []}, cache.lookup("libraries")[0])
+        first, second = cache.lookup("libraries")[0], cache.lookup("libraries")[0]
+        self.assertIsNot(first, second)
+        self.assertIs(first["python"], second["python"])
+    
+    
+    def test_validators(self):
+        cache = MetadataCache()
+        self.assertIsNone(cache.validators("libraries"))
+        cache.store("libraries", {})
+        self.assertIsNone(cache.validators("libraries"))
+        cache.store("libraries", {}, '"etag"', "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.assertEqual({
+            "If-None-Match":     '"etag"',
+            "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+        }, cache.validators("libraries"))
+    
+    
+    def test_refresh_once(self):
+        cache = MetadataCache()
+        self.assertTrue(cache.begin_refresh("libraries"))
+        self.assertFalse(cache.begin_refresh("libraries"))
+        cache.end_refresh("libraries", failed=True)
+        self.assertEqual(1, cache.errors)
+        self.assertTrue(cache.begin_refresh("libraries"))
+    
+    
+    def test_invalidate(self):
+        cache = MetadataCache()
+        cache.store("libraries", {})
+        cache.store("specifications", {})
+        cache.invalidate("libraries")
+        self.assertEqual(1, len(cache))
+        self.assertIsNone(cache.not_modified("libraries"))
+        cache.invalidate()
+        self.assertEqual(0, len(cache))
+
+
+
+def count(specifications: dict) -> int:
+    """Return the number of containers of <specifications>."""
+    return specifications["container"]["count"]
+
+
+
+class SandboxMetadataCacheTestCase(unittest.TestCase):
+    
+    def test_disabled(self):
+        with FakeSandbox() as fake, Sandbox(fake.url) as s:
+            s.specifications()
+            s.specifications()
+            self.assertEqual(2, fake.stats["specifications"])
+    
+    
+    def test_fresh(self):
+        with FakeSandbox() as fake, Sandbox(fake.url, metadata_cache=True) as s:
+            self.assertEqual(5, count(s.specifications()))
+            self.assertEqual(5, count(s.specifications()))
+            s.libraries()
+            self.assertEqual(1, fake.stats["specifications"])
+            self.assertEqual(1, fake.stats["libraries"])
+            
+            s.metadata_cache.invalidate()
+            fake.containers = 6
+            self.assertEqual(6, count(s.specifications()))
+    
+    
+    def test_conditional_refresh(self):
+        cache = MetadataCache(ttl=0, background=False)
+        with FakeSandbox() as fake, Sandbox(fake.url, metadata_cache=cache) as s:
+            s.specifications()
+            self.assertEqual(5, count(s.specifications()))
+            self.assertEqual(1, cache.not_modified_count)
+            
+            fake.containers = 6
+            self.assertEqual(6, count(s.specifications()))
+            self.assertEqual(3, fake.stats["specifications"])
+    
+    
+    def test_background_refresh(self):
+        cache = MetadataCache(ttl=0.05)
+        with FakeSandbox() as fake, Sandbox(fake.url, metadata_cache=cache) as s:
+            s.specifications()
+            time.sleep(0.06)
+            fake.containers, fake.latency = 6, 0.1
+            
+            start = time.monotonic()
+            self.assertEqual(5, count(s.specifications()))
+            self.assertEqual(5, count(s.specifications()))
+            self.assertLess(time.monotonic() - start, 0.1)
+            time.sleep(0.2)
+            cache.ttl = 60
+            self.assertEqual(6, count(s.specifications()))
+            self.assertEqual(2, fake.stats["specifications"])
+    
+    
+    def test_background_refresh_failure(self):
+        cache = MetadataCache(ttl=0)
+        with FakeSandbox() as fake, Sandbox(fake.url, metadata_cache=cache) as s:
+            libraries = s.libraries()
+            fake.faults = Faults({500: 1.0})
+            self.assertEqual(libraries, s.libraries())
+            time.sleep(0.1)
+            self.assertEqual(1, cache.errors)
+            cache.ttl = 60
+            self.assertEqual(libraries, s.libraries())
+
+
+
+class ASandboxMetadataCacheTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_fresh(self):
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, metadata_cache=True) as s:
+                self.assertEqual(5, count(await s.specifications()))
+                self.assertEqual(5, count(await s.specifications()))
+                await s.libraries()
+                self.assertEqual(1, fake.stats["specifications"])
+                self.assertEqual(1, fake.stats["libraries"])
+    
+    
+    async def test_conditional_refresh(self):
+        cache = MetadataCache(ttl=0, background=False)
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, metadata_cache=cache) as s:
+                await s.specifications()
+                self.assertEqual(5, count(await s.specifications()))
+                self.assertEqual(1, cache.not_modified_count)
+                
+                fake.containers = 6
+                self.assertEqual(6, count(await s.specifications()))
+    
+    
+    async def test_background_refresh(self):
+        cache = MetadataCache(ttl=0)
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, metadata_cache=cache) as s:
+                await s.specifications()
+                fake.containers, fake.latency = 6, 0.1
+                
+                start = time.monotonic()
+                self.assertEqual(5, count(await s.specifications()))
+                self.assertEqual(5, count(await s.specifications()))
+                self.assertLess(time.monotonic() - start, 0.1)
+                self.assertEqual(1, len(s._refresh_tasks))
+                await asyncio.gather(*s._refresh_tasks)
+                self.assertEqual(2, fake.stats["specifications"])
+                
+                cache.ttl = 60
+                self.assertEqual(6, count(await s.specifications()))
+    
+    
+    async def test_close_cancels_refresh(self):
+        cache = MetadataCache(ttl=0)
+        async with FakeSandbox() as fake:
+            s = ASandbox(fake.url, metadata_cache=cache)
+            await s.libraries()
+            fake.latency = 0.5
+            await s.libraries()
+            await s.close()
+            self.assertEqual(0, len(s._refresh_tasks))
+            self.assertTrue(cache.begin_refresh("libraries"))
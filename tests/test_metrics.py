@@ -0,0 +1,264 @@
+# test_metrics.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import threading
+import unittest
+import urllib.request
+
+import aiounittest
+
+from sandbox_api import (ASandbox, AsyncAdmissionLimiter, CircuitBreaker, Instrumentation,
+                         MetricsSink, Sandbox, Sandbox404, SandboxBusy, SandboxCircuitOpen,
+                         serve_metrics)
+from sandbox_api.metrics import CONTENT_TYPE, Counter, Gauge, Histogram, status_class
+from sandbox_api.testing import FakeSandbox
+
+
+
+class MetricTestCase(unittest.TestCase):
+    
+    def test_status_class(self):
+        self.assertEqual("2xx", status_class(200))
+        self.assertEqual("5xx", status_class(503))
+        self.assertEqual("error", status_class(None))
+    
+    
+    def test_counter_threads(self):
+        counter = Counter("c", "Counter.", ("label",))
+        
+        def work():
+            for _ in range(1000):
+                counter.inc(("a",))
+                counter.inc(("b",), 2)
+        
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual({("a",): 8000, ("b",): 16000}, counter.values())
+        # Shards of the dead threads are folded into the retired values
+        self.assertEqual(0, len(counter._shards))
+        self.assertEqual([
+            "# TYPE c counter",
+            "# HELP c Counter.",
+            'c_total{label="a"} 8000',
+            'c_total{label="b"} 16000',
+        ], counter.exposition())
+    
+    
+    def test_thread_churn(self):
+        counter = Counter("c", "Counter.")
+        histogram = Histogram("h", "Histogram.", buckets=(1.0,))
+        counter.inc()
+        
+        def work():
+            counter.inc()
+            histogram.observe(0.5)
+        
+        for _ in range(50):
+            threads = [threading.Thread(target=work) for _ in range(40)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(1, len(counter._shards))
+        self.assertEqual(0, len(histogram._shards))
+        self.assertEqual({(): 2001}, counter.values())
+        self.assertEqual({(): [2000, 0, 1000.0]}, histogram.values())
+    
+    
+    def test_gauge(self):
+        gauge = Gauge("g", "Gauge.")
+        gauge.inc()
+        thread = threading.Thread(target=gauge.dec)
+        thread.start()
+        thread.join()
+        gauge.inc(amount=2)
+        self.assertEqual("g 2", gauge.exposition()[-1])
+    
+    
+    def test_histogram(self):
+        histogram = Histogram("h", "Histogram.", ("endpoint",), buckets=(0.1, 1.0))
+        self.assertEqual((0.1, 1.0, float("inf")), histogram.buckets)
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, ("execute",))
+        self.assertEqual([
+            "# TYPE h histogram",
+            "# HELP h Histogram.",
+            'h_bucket{endpoint="execute",le="0.1"} 1',
+            'h_bucket{endpoint="execute",le="1.0"} 3',
+            'h_bucket{endpoint="execute",le="+Inf"} 4',
+            'h_count{endpoint="execute"} 4',
+            'h_sum{endpoint="execute"} 6.05',
+        ], histogram.exposition())
+    
+    
+    def test_escape(self):
+        counter = Counter("c", "Counter.", ("label",))
+        counter.inc(('a"b\\c\n',))
+        self.assertEqual('c_total{label="a\\"b\\\\c\\n"} 1', counter.exposition()[-1])
+
+
+
+class MetricsSinkTestCase(unittest.TestCase):
+    
+    def test_sink(self):
+        sink = MetricsSink()
+        instrumentation = Instrumentation([sink])
+        timing = instrumentation.start("execute", "POST")
+        self.assertEqual({("execute",): 1}, sink.in_flight.values())
+        timing.sent_bytes, timing.received_bytes = 100, 20
+        instrumentation.finish(timing, 200)
+        instrumentation.decoded("execute", {"total_time": 0.4}, 0.001)
+        instrumentation.finish(instrumentation.start("files", "GET"), 404)
+        instrumentation.finish(instrumentation.start("libraries", "GET"), 304)
+        instrumentation.finish(instrumentation.start("usages", "GET"), error=ConnectionError())
+        
+        self.assertEqual({("execute",): 0, ("files",): 0, ("libraries",): 0, ("usages",): 0},
+                         sink.in_flight.values())
+        self.assertEqual({
+            ("execute", "POST", "2xx"):  1,
+            ("files", "GET", "4xx"):     1,
+            ("libraries", "GET", "3xx"): 1,
+            ("usages", "GET", "error"):  1,
+        }, sink.requests.values())
+        self.assertEqual({("files", "Sandbox404"): 1}, sink.errors.values())
+        self.assertEqual({("execute",): 100}, sink.sent_bytes.values())
+        self.assertEqual({("execute",): 20}, sink.received_bytes.values())
+        self.assertEqual(1, sum(sink.duration.values()[("execute",)][:-1]))
+        self.assertEqual(0.4, sink.server_time.values()[("execute",)][-1])
+        
+        text = sink.exposition()
+        self.assertTrue(text.endswith("# EOF\n"))
+        self.assertIn('sandbox_requests_total{endpoint="execute",method="POST",status="2xx"} 1',
+                      text)
+        self.assertIn('sandbox_server_time_seconds_count{endpoint="execute"} 1', text)
+    
+    
+    def test_expected_status(self):
+        sink = MetricsSink()
+        with FakeSandbox() as fake:
+            with Sandbox(fake.url, instrumentation=Instrumentation([sink])) as s:
+                self.assertEqual(0, s.check("unknown"))
+                with self.assertRaises(Sandbox404):
+                    s.download("unknown")
+        
+        self.assertEqual({
+            ("environments", "HEAD", "4xx"): 1,
+            ("environments", "GET", "4xx"):  1,
+        }, sink.requests.values())
+        self.assertEqual({("environments", "Sandbox404"): 1}, sink.errors.values())
+    
+    
+    def test_namespace(self):
+        sink = MetricsSink("client")
+        self.assertTrue(all(m.name.startswith("client_") for m in sink.metrics))
+    
+    
+    def test_serve(self):
+        sink = MetricsSink()
+        sink.requests.inc(("execute", "POST", "2xx"))
+        server = serve_metrics(sink, "127.0.0.1", 0)
+        try:
+            url = "http://127.0.0.1:%d/metrics" % server.server_address[1]
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(CONTENT_TYPE, response.headers["Content-Type"])
+                self.assertEqual(sink.exposition(), response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+
+CONFIG = {"commands": ["true"]}
+
+
+
+class SandboxMetricsTestCase(unittest.TestCase):
+    
+    def test_metrics(self):
+        sink = MetricsSink()
+        with FakeSandbox() as fake:
+            with Sandbox(fake.url, instrumentation=Instrumentation([sink])) as s:
+                result = s.execute(CONFIG)
+                s.usage()
+                with self.assertRaises(Sandbox404):
+                    s.download("unknown")
+        
+        self.assertEqual({
+            ("execute", "POST", "2xx"):     1,
+            ("usages", "GET", "2xx"):       1,
+            ("environments", "GET", "4xx"): 1,
+        }, sink.requests.values())
+        self.assertEqual({("environments", "Sandbox404"): 1}, sink.errors.values())
+        self.assertGreater(sink.sent_bytes.values()[("execute",)], 0)
+        self.assertGreater(sink.received_bytes.values()[("execute",)], 0)
+        self.assertEqual(result["total_time"], sink.server_time.values()[("execute",)][-1])
+        self.assertEqual(0, sink.in_flight.values()[("execute",)])
+    
+    
+    def test_circuit_open(self):
+        sink = MetricsSink()
+        breaker = CircuitBreaker(failure_threshold=1)
+        instrumentation = Instrumentation([sink])
+        with Sandbox("http://127.0.0.1:1/", circuit_breaker=breaker,
+                     instrumentation=instrumentation) as s:
+            with self.assertRaises(Exception):
+                s.usage()
+            with self.assertRaises(SandboxCircuitOpen):
+                s.usage()
+        
+        self.assertEqual({("usages", "GET", "error"): 2}, sink.requests.values())
+        self.assertEqual({("usages", "SandboxCircuitOpen"): 1}, sink.errors.values())
+
+
+
+class ASandboxMetricsTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_metrics(self):
+        sink = MetricsSink()
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, instrumentation=Instrumentation([sink])) as s:
+                results = await asyncio.gather(*(s.execute(CONFIG) for _ in range(20)))
+                await s.usage()
+        
+        self.assertEqual({("execute", "POST", "2xx"): 20, ("usages", "GET", "2xx"): 1},
+                         sink.requests.values())
+        self.assertEqual(1, len(sink.requests._shards))
+        self.assertGreater(sink.sent_bytes.values()[("execute",)], 20 * 20)
+        self.assertGreater(sink.received_bytes.values()[("execute",)], 20 * 20)
+        self.assertAlmostEqual(sum(r["total_time"] for r in results),
+                               sink.server_time.values()[("execute",)][-1])
+        self.assertEqual(0, sink.in_flight.values()[("execute",)])
+    
+    
+    async def test_expected_status(self):
+        sink = MetricsSink()
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, instrumentation=Instrumentation([sink])) as s:
+                self.assertEqual(0, await s.check("unknown"))
+        
+        self.assertEqual({("environments", "HEAD", "4xx"): 1}, sink.requests.values())
+        self.assertEqual({}, sink.errors.values())
+    
+    
+    async def test_busy(self):
+        sink = MetricsSink()
+        admission = AsyncAdmissionLimiter(capacity=1, max_queue=0)
+        async with FakeSandbox(latency={"execute": 0.05}) as fake:
+            async with ASandbox(fake.url, admission=admission,
+                                instrumentation=Instrumentation([sink])) as s:
+                results = await asyncio.gather(
+                    s.execute(CONFIG), s.execute(CONFIG), return_exceptions=True
+                )
+        
+        self.assertIsInstance(results[1], SandboxBusy)
+        self.assertEqual({("execute", "SandboxBusy"): 1}, sink.errors.values())
+        self.assertEqual({("execute", "POST", "2xx"): 1}, sink.requests.values())
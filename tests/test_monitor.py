@@ -0,0 +1,189 @@
+# test_monitor.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import unittest
+
+import aiounittest
+from aiohttp import web
+
+from sandbox_api import ASandbox, UsageMonitor, UsageSeries
+from sandbox_api.testing import FakeSandbox, Faults
+from tests.utils import serve
+
+
+
+def usage(containers: int = 0, cpu: float = 0.5, sent: int = 0) -> dict:
+    return {
+        "cpu":       {"frequency": 800.0, "usage": cpu, "usage_avg": [cpu, cpu, cpu]},
+        "memory":    {"ram": 1000, "swap": 0, "storage": {"/dev/sda2": 2000}},
+        "io":        {"read_iops": {}, "read_bps": {"sda": 10, "sdb": 5}, "write_iops": {},
+                      "write_bps": {"sda": 1}},
+        "network":   {"sent_bytes": sent, "received_bytes": 0, "sent_packets": 0,
+                      "received_packets": 0},
+        "process":   42,
+        "container": containers,
+    }
+
+
+
+class UsageSeriesTestCase(unittest.TestCase):
+    
+    def test_append(self):
+        series = UsageSeries(size=3)
+        self.assertIsNone(series.latest())
+        series.append(usage(2), timestamp=10)
+        latest = series.latest()
+        self.assertEqual(10, latest["time"])
+        self.assertEqual(2, latest["containers"])
+        self.assertEqual(15, latest["read_bps"])
+        self.assertEqual(1, latest["write_bps"])
+        self.assertEqual(42, latest["process"])
+    
+    
+    def test_ring_buffer(self):
+        series = UsageSeries(size=3)
+        for i in range(5):
+            series.append(usage(i), timestamp=i)
+        self.assertEqual(3, len(series))
+        self.assertEqual([2, 3, 4], list(series.values("containers")))
+        self.assertEqual([3, 4], list(series.values("containers", window=2)))
+        self.assertEqual([2, 3, 4], list(series.values("containers", window=10)))
+        self.assertEqual(4, series.latest()["containers"])
+    
+    
+    def test_moving_average(self):
+        series = UsageSeries()
+        self.assertIsNone(series.moving_average("cpu"))
+        for cpu in (0.2, 0.4, 0.9):
+            series.append(usage(cpu=cpu))
+        self.assertAlmostEqual(0.5, series.moving_average("cpu"))
+        self.assertAlmostEqual(0.65, series.moving_average("cpu", window=2))
+    
+    
+    def test_rate(self):
+        series = UsageSeries()
+        series.append(usage(sent=100), timestamp=0)
+        self.assertIsNone(series.rate("sent_bytes"))
+        series.append(usage(sent=300), timestamp=2)
+        series.append(usage(sent=600), timestamp=4)
+        self.assertEqual(125, series.rate("sent_bytes"))
+        self.assertEqual(150, series.rate("sent_bytes", window=2))
+    
+    
+    def test_free_containers(self):
+        series = UsageSeries()
+        series.append(usage(3))
+        self.assertIsNone(series.free_containers())
+        series.capacity = 5
+        self.assertEqual(2, series.free_containers())
+    
+    
+    def test_estimated_wait(self):
+        series = UsageSeries()
+        series.capacity = 2
+        self.assertIsNone(series.estimated_wait())
+        series.append(usage(1))
+        self.assertEqual(0, series.estimated_wait())
+        self.assertIsNone(series.estimated_wait(queued=1))
+        
+        series.observe(1.0)
+        series.observe(3.0)
+        self.assertEqual(2.0, series.mean_service_time)
+        self.assertEqual(1.0, series.estimated_wait(queued=1))
+        self.assertEqual(3.0, series.estimated_wait(queued=3))
+    
+    
+    def test_snapshot(self):
+        series = UsageSeries()
+        series.capacity = 4
+        series.append(usage(1))
+        snapshot = series.snapshot()
+        self.assertEqual(3, snapshot["free_containers"])
+        self.assertEqual(1, snapshot["samples"])
+        self.assertEqual(0.0, snapshot["estimated_wait"])
+    
+    
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            UsageSeries(size=0)
+
+
+
+def bad_app():
+    """Return an application answering usages with an unexpected payload."""
+    
+    async def specifications(request):
+        return web.json_response({"container": {"count": 4}})
+    
+    async def usages(request):
+        return web.json_response({"cpu": None})
+    
+    app = web.Application()
+    app.router.add_get("/specifications/", specifications)
+    app.router.add_get("/usages/", usages)
+    return app
+
+
+
+class UsageMonitorTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_poll(self):
+        async with FakeSandbox(containers=4) as fake1, FakeSandbox(containers=4) as fake2:
+            monitor = UsageMonitor([fake1.url, fake2.url])
+            await monitor.poll()
+            await monitor.poll()
+            self.assertEqual(2, len(monitor[fake1.url]))
+            self.assertEqual(4, monitor[fake2.url].capacity)
+            self.assertEqual(8, monitor.free_containers())
+            self.assertEqual(4, monitor.snapshot()[fake1.url]["free_containers"])
+            await asyncio.gather(*(s.close() for s in monitor.sandboxes))
+    
+    
+    async def test_background(self):
+        async with FakeSandbox() as fake:
+            async with UsageMonitor([fake.url], interval=0.02, size=3) as monitor:
+                self.assertTrue(monitor.running)
+                await asyncio.sleep(0.15)
+            self.assertFalse(monitor.running)
+            polls = fake.stats["usages"]
+            self.assertGreaterEqual(polls, 4)
+            self.assertEqual(3, len(monitor[fake.url]))
+            await asyncio.sleep(0.05)
+            self.assertEqual(polls, fake.stats["usages"])
+    
+    
+    async def test_errors(self):
+        async with FakeSandbox(faults=Faults({500: 1.0}, endpoints=["usages"])) as fake:
+            async with UsageMonitor([fake.url]) as monitor:
+                await monitor.poll()
+            self.assertEqual(0, len(monitor[fake.url]))
+            self.assertGreaterEqual(monitor[fake.url].errors, 1)
+            self.assertIsNotNone(monitor[fake.url].last_error)
+    
+    
+    async def test_bad_payload(self):
+        async with serve(bad_app()) as url, FakeSandbox() as fake:
+            async with UsageMonitor([url, fake.url], interval=0.02) as monitor:
+                await asyncio.sleep(0.1)
+                self.assertTrue(monitor.running)
+            self.assertEqual(0, len(monitor[url]))
+            self.assertGreaterEqual(monitor[url].errors, 2)
+            self.assertIsInstance(monitor[url].last_error, TypeError)
+            self.assertGreaterEqual(len(monitor[fake.url]), 2)
+            self.assertEqual(0, monitor[fake.url].errors)
+    
+    
+    async def test_admission(self):
+        async with FakeSandbox(containers=4) as fake:
+            async with ASandbox(fake.url, admission=True) as sandbox:
+                monitor = UsageMonitor([sandbox])
+                await monitor.poll()
+                self.assertEqual(4, sandbox.admission.capacity)
+                self.assertEqual(0, monitor.estimated_wait(sandbox.url))
+                
+                monitor.observe(sandbox.url, 2.0)
+                self.assertEqual(1.0, monitor.estimated_wait(sandbox.url, queued=5))
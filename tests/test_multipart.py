@@ -0,0 +1,150 @@
+# test_multipart.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import email.parser
+import email.policy
+import io
+import os
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sandbox_api import EnvironmentBuilder, RetryPolicy, Sandbox, Sandbox503
+from sandbox_api.multipart import MultipartStream, source_size
+from sandbox_api.testing import Faults, FakeSandbox
+
+
+CAT = {"commands": ["cat file.txt"]}
+
+
+
+def parse(stream: MultipartStream) -> dict:
+    """Parse the body of <stream> with the standard library."""
+    body = b"".join(stream)
+    if stream.len is not None:
+        assert len(body) == stream.len, (len(body), stream.len)
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: %s\r\n\r\n%s" % (stream.content_type.encode(), body)
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+        for part in message.iter_parts()
+    }
+
+
+
+class DiscardHandler(BaseHTTPRequestHandler):
+    """Read and discard the body of POST requests, answering with an empty
+    execution."""
+    
+    def do_POST(self):
+        remaining = int(self.headers["Content-Length"])
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 2 ** 16)))
+        body = b'{"status": 0, "execution": [], "total_time": 0}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    
+    def log_message(self, format, *args):
+        pass
+
+
+
+class MultipartStreamTestCase(unittest.TestCase):
+    
+    def test_fields_and_files(self):
+        stream = MultipartStream(
+            [("config", '{"a": 1}')],
+            [("environment", "env.tgz", io.BytesIO(b"x" * 100000)), ("raw", "raw", b"\x00\r\n")],
+            chunk_size=1000
+        )
+        self.assertEqual(
+            {"config": b'{"a": 1}', "environment": b"x" * 100000, "raw": b"\x00\r\n"},
+            parse(stream)
+        )
+        self.assertTrue(all(len(chunk) >= 1000 for chunk in list(stream)[:-1]))
+    
+    
+    def test_sizes(self):
+        builder = EnvironmentBuilder({"file.txt": "hello"})
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"path")
+            f.flush()
+            for source in (b"bytes", f.name, builder, builder.open(), io.BytesIO(b"file")):
+                stream = MultipartStream([("config", "{}")], [("environment", "e", source)])
+                self.assertEqual(source_size(source), len(parse(stream)["environment"]))
+        
+        stream = MultipartStream([], [("environment", "e", iter([b"gen", b"erator"]))])
+        self.assertIsNone(stream.len)
+        self.assertEqual(b"generator", parse(stream)["environment"])
+        self.assertIsNone(source_size(EnvironmentBuilder(sized=False)))
+    
+    
+    def test_rewindable(self):
+        f = io.BytesIO()
+        stream = MultipartStream([], [("a", "a", b""), ("b", "b", os.devnull), ("c", "c", f)])
+        self.assertEqual([f], stream.rewindable)
+
+
+
+class SandboxUploadTestCase(unittest.TestCase):
+    
+    def test_sources(self):
+        builder = EnvironmentBuilder({"file.txt": "hello"})
+        archive = builder.build()
+        with tempfile.NamedTemporaryFile(suffix=".tgz") as f:
+            f.write(archive)
+            f.flush()
+            with FakeSandbox() as fake, Sandbox(fake.url) as s:
+                sources = [
+                    io.BytesIO(archive), f.name, builder, EnvironmentBuilder(sized=False),
+                    (archive[i:i + 10] for i in range(0, len(archive), 10)),
+                ]
+                sources[3].add_file("file.txt", "hello")
+                for source in sources:
+                    result = s.execute(CAT, source)
+                    self.assertEqual("hello", result["execution"][0]["stdout"], source)
+    
+    
+    def test_retry_rewinds(self):
+        archive = EnvironmentBuilder({"file.txt": "hello"}).build()
+        faults = Faults({503: 0.5}, retry_after=None, endpoints=["execute"])
+        with FakeSandbox(faults=faults, seed=1) as fake:
+            with Sandbox(fake.url, retry=RetryPolicy(backoff=0)) as s:
+                result = s.execute(CAT, io.BytesIO(archive))
+                self.assertEqual("hello", result["execution"][0]["stdout"])
+                self.assertEqual(1, fake.stats["fault:503"])
+        
+        with FakeSandbox(faults=faults, seed=1) as fake:
+            with Sandbox(fake.url, retry=RetryPolicy(backoff=0)) as s:
+                with self.assertRaises(Sandbox503):
+                    s.execute(CAT, iter([archive]))
+    
+    
+    def test_memory(self):
+        size = 32 * 2 ** 20
+        server = ThreadingHTTPServer(("127.0.0.1", 0), DiscardHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with tempfile.NamedTemporaryFile() as f:
+                f.truncate(size)
+                with Sandbox("http://127.0.0.1:%d/" % server.server_port) as s:
+                    tracemalloc.start()
+                    try:
+                        s.execute({"commands": ["true"]}, f.name)
+                        peak = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+            self.assertLess(peak, size / 8)
+        finally:
+            server.shutdown()
+            server.server_close()
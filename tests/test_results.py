@@ -0,0 +1,111 @@
+# test_results.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import json
+import pickle
+import unittest
+
+import aiounittest
+
+from sandbox_api import (ASandbox, ASandboxCluster, CommandResult, ExecutionResult, Sandbox,
+                         SandboxErrCode)
+from sandbox_api.results import saved_environment
+from sandbox_api.testing import FakeSandbox, scripted
+
+
+RESPONSE = {
+    "status":     2,
+    "execution":  [
+        {"command": "true", "exit_code": 0, "stdout": "", "stderr": "", "time": 0.01},
+        {"command": "false", "exit_code": 2, "stdout": "out", "stderr": "err", "time": 0.02},
+    ],
+    "result":     "42",
+    "total_time": 0.05,
+}
+
+
+
+class ResultsTestCase(unittest.TestCase):
+    
+    def test_from_dict(self):
+        response = json.loads(json.dumps(RESPONSE))
+        result = ExecutionResult.from_dict(response)
+        self.assertEqual(2, result.status)
+        self.assertFalse(result.ok)
+        self.assertEqual(0.05, result.total_time)
+        self.assertEqual("42", result.result)
+        self.assertIsNone(result.environment)
+        self.assertEqual(["true", "false"], [c.command for c in result])
+        self.assertEqual(2, len(result))
+        self.assertIs(result.execution[1], result.failed)
+        self.assertIs(response["execution"][1]["stdout"], result.execution[1].stdout)
+        self.assertEqual(RESPONSE, result.to_dict())
+    
+    
+    def test_error_codes(self):
+        result = ExecutionResult.from_dict({"status": -2, "execution": [
+            {"command": "sleep 10", "exit_code": -2, "stdout": "", "stderr": "", "time": 1},
+        ], "total_time": 1})
+        self.assertIs(SandboxErrCode.TIMEOUT, result.status)
+        self.assertIs(SandboxErrCode.TIMEOUT, result.execution[0].exit_code)
+        self.assertEqual(-42, ExecutionResult(-42).status)
+        self.assertIsNone(ExecutionResult(0).failed)
+        self.assertTrue(ExecutionResult(0).ok)
+    
+    
+    def test_slots(self):
+        result = ExecutionResult.from_dict(RESPONSE)
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertFalse(hasattr(result.execution[0], "__dict__"))
+        with self.assertRaises(AttributeError):
+            result.other = 1
+    
+    
+    def test_pickle(self):
+        result = ExecutionResult.from_dict(RESPONSE)
+        self.assertEqual(result, pickle.loads(pickle.dumps(result)))
+        self.assertNotEqual(result, ExecutionResult(0))
+        self.assertNotEqual(CommandResult("a", 0, "", "", 0), result.execution[0])
+    
+    
+    def test_saved_environment(self):
+        self.assertEqual("uuid", saved_environment({"environment": "uuid"}))
+        self.assertEqual("uuid", saved_environment(ExecutionResult(0, environment="uuid")))
+        self.assertIsNone(saved_environment(ExecutionResult(0)))
+    
+    
+    def test_sandbox(self):
+        with FakeSandbox() as fake, Sandbox(fake.url, typed=True, result_cache=True) as s:
+            result = s.execute({"commands": ["echo ok > out"], "result_path": "out"})
+            self.assertIsInstance(result, ExecutionResult)
+            self.assertTrue(result.ok)
+            self.assertEqual("ok\n", result.result)
+            self.assertEqual(result, s.execute({"commands": ["echo ok > out"],
+                                                "result_path": "out"}))
+            self.assertEqual(1, fake.stats["executions"])
+            
+            result = s.execute({"commands": ["true"], "save": True})
+            self.assertTrue(s.check(result.environment))
+
+
+
+class AsyncResultsTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_asandbox(self):
+        async with FakeSandbox(script=scripted({"answer": (0, "42\n", "")})) as fake:
+            async with ASandbox(fake.url, typed=True) as s:
+                result = await s.execute({"commands": ["answer"]})
+                self.assertIsInstance(result, ExecutionResult)
+                self.assertEqual("42", result.execution[0].stdout)
+                self.assertIsInstance(await ASandbox(fake.url).execute({"commands": []}), dict)
+    
+    
+    async def test_cluster(self):
+        async with FakeSandbox() as fake:
+            async with ASandboxCluster([fake.url], typed=True) as cluster:
+                result = await cluster.execute({"commands": ["true"], "save": True})
+                self.assertIsInstance(result, ExecutionResult)
+                self.assertIs(cluster.nodes[0], cluster.balancer.owner(result.environment))
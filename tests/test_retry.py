@@ -0,0 +1,273 @@
+# test_retry.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import email.utils
+import io
+import time
+import unittest
+
+import aiounittest
+import requests
+from aiohttp import web
+
+from sandbox_api import (ASandbox, CircuitBreaker, RetryPolicy, Sandbox, Sandbox502,
+                         SandboxCircuitOpen, SandboxError)
+from sandbox_api.multipart import MultipartStream
+from sandbox_api.retry import Rewinder, parse_retry_after
+from sandbox_api.testing import FakeSandbox, Faults
+from tests.utils import serve
+
+
+TEST_URL = "http://127.0.0.1:7000/"
+
+
+
+class Response:
+    
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+    
+    
+    @property
+    def content(self):
+        return ('{"status_code": %d}' % self.status_code).encode()
+    
+    
+    def json(self):
+        return {"status_code": self.status_code}
+    
+    
+    def close(self):
+        self.closed = True
+
+
+
+def scripted(sandbox: Sandbox, *responses):
+    """Make <sandbox>'s session return <responses> (or raise them), recording
+    the sent requests."""
+    responses = list(responses)
+    sent = []
+    
+    def request(method, url, **kwargs):
+        files = {k: f.read() for k, f in (kwargs.get("files") or {}).items()}
+        if isinstance(kwargs.get("data"), MultipartStream):
+            files = {n: b"".join(kwargs["data"]._read(f)) for n, _, f in kwargs["data"].files}
+        sent.append((method, files))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    
+    sandbox.session.request = request
+    return sent
+
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    
+    def test_parse_retry_after(self):
+        self.assertEqual(3, parse_retry_after("3"))
+        self.assertEqual(0, parse_retry_after("-3"))
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(60, parse_retry_after(date), delta=2)
+    
+    
+    def test_retries(self):
+        policy = RetryPolicy(statuses={503: 4}, execute_statuses={429: 2}, connect_retries=5,
+                             read_retries=1)
+        self.assertEqual(4, policy.retries(True, 503))
+        self.assertEqual(0, policy.retries(False, 503))
+        self.assertEqual(2, policy.retries(False, 429))
+        self.assertEqual(5, policy.retries(False, connect_error=True))
+        self.assertEqual(1, policy.retries(True))
+        self.assertEqual(0, policy.retries(False))
+    
+    
+    def test_delay(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        self.assertEqual([1, 2, 4, 5, 5], [policy.delay(i, True, 429) for i in range(5)])
+        self.assertIsNone(policy.delay(5, True, 429))
+        self.assertIsNone(policy.delay(0, True, 404))
+        self.assertEqual(10, policy.delay(0, True, 503, retry_after="10"))
+        
+        policy = RetryPolicy(backoff=1, max_retry_after=3)
+        delay = policy.delay(1, True, 503)
+        self.assertTrue(1 <= delay <= 2)
+        self.assertEqual(3, policy.delay(0, True, 503, retry_after="10"))
+
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    
+    def test_open_and_recover(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        with self.assertRaises(SandboxCircuitOpen):
+            breaker.before_request()
+        
+        time.sleep(0.06)
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        breaker.before_request()
+        with self.assertRaises(SandboxCircuitOpen):
+            breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+    
+    
+    def test_half_open_failure(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+    
+    
+    def test_release_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        self.assertFalse(breaker.before_request())
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.before_request())
+        breaker.release_trial()
+        self.assertTrue(breaker.before_request())
+        with self.assertRaises(SandboxCircuitOpen):
+            breaker.before_request()
+
+
+
+class RewinderTestCase(unittest.TestCase):
+    
+    def test_rewind(self):
+        f = io.BytesIO(b"abcdef")
+        f.seek(2)
+        rewinder = Rewinder([f])
+        f.read()
+        self.assertTrue(rewinder.rewind())
+        self.assertEqual(b"cdef", f.read())
+        f.close()
+        self.assertFalse(rewinder.rewind())
+
+
+
+class SandboxRetryTestCase(unittest.TestCase):
+    
+    def test_no_retry_by_default(self):
+        with Sandbox(TEST_URL) as s:
+            scripted(s, Response(503), Response(200))
+            with self.assertRaises(SandboxError):
+                s.usage()
+    
+    
+    def test_retry_status(self):
+        with Sandbox(TEST_URL, retry=RetryPolicy(backoff=0)) as s:
+            first = Response(503)
+            sent = scripted(s, first, Response(429, {"Retry-After": "0"}), Response(200))
+            self.assertEqual({"status_code": 200}, s.usage())
+            self.assertEqual(3, len(sent))
+            self.assertTrue(first.closed)
+    
+    
+    def test_execute_rewind_environ(self):
+        with Sandbox(TEST_URL, retry=RetryPolicy(backoff=0)) as s:
+            sent = scripted(s, Response(503), Response(200))
+            s.execute({"commands": ["true"]}, io.BytesIO(b"environment"))
+            self.assertEqual([{"environment": b"environment"}] * 2, [f for _, f in sent])
+    
+    
+    def test_execute_not_retried(self):
+        with Sandbox(TEST_URL, retry=RetryPolicy(backoff=0)) as s:
+            sent = scripted(s, Response(502), Response(200))
+            with self.assertRaises(Sandbox502):
+                s.execute({"commands": ["true"]})
+            self.assertEqual(1, len(sent))
+    
+    
+    def test_execute_connection_errors(self):
+        with Sandbox(TEST_URL, retry=RetryPolicy(backoff=0)) as s:
+            sent = scripted(s, requests.ConnectTimeout(), Response(200))
+            self.assertEqual({"status_code": 200}, s.execute({"commands": ["true"]}))
+            self.assertEqual(2, len(sent))
+            
+            sent = scripted(s, requests.ReadTimeout(), Response(200))
+            with self.assertRaises(requests.ReadTimeout):
+                s.execute({"commands": ["true"]})
+            self.assertEqual(1, len(sent))
+    
+    
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        with Sandbox(TEST_URL, circuit_breaker=breaker) as s:
+            scripted(s, Response(500), Response(500), Response(200))
+            for _ in range(2):
+                with self.assertRaises(SandboxError):
+                    s.usage()
+            with self.assertRaises(SandboxCircuitOpen):
+                s.usage()
+    
+    
+    def test_circuit_breaker_interrupted_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        with Sandbox(TEST_URL, circuit_breaker=breaker) as s:
+            scripted(s, Response(500), ValueError(), Response(200))
+            with self.assertRaises(SandboxError):
+                s.usage()
+            time.sleep(0.06)
+            with self.assertRaises(ValueError):
+                s.usage()
+            self.assertEqual({"status_code": 200}, s.usage())
+            self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+
+
+class ASandboxRetryTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_retry(self):
+        statuses = [503, 429, 200]
+        bodies = []
+        
+        async def execute(request):
+            bodies.append((await request.post())["environment"].file.read())
+            return web.json_response({"status": 0}, status=statuses.pop(0))
+        
+        app = web.Application()
+        app.router.add_post("/execute/", execute)
+        async with serve(app) as url:
+            async with ASandbox(url, retry=RetryPolicy(backoff=0)) as s:
+                result = await s.execute({"commands": ["true"]}, io.BytesIO(b"environment"))
+        
+        self.assertEqual({"status": 0}, result)
+        self.assertEqual([b"environment"] * 3, bodies)
+    
+    
+    async def test_circuit_breaker(self):
+        async with FakeSandbox(faults=Faults({500: 1.0})) as fake:
+            async with ASandbox(fake.url, circuit_breaker=CircuitBreaker(1)) as s:
+                with self.assertRaises(SandboxError):
+                    await s.usage()
+                with self.assertRaises(SandboxCircuitOpen):
+                    await s.usage()
+    
+    
+    async def test_circuit_breaker_cancelled_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        await asyncio.sleep(0.06)
+        async with FakeSandbox(latency={"usages": 1}) as fake:
+            async with ASandbox(fake.url, circuit_breaker=breaker) as s:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(s.usage(), 0.1)
+                self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+                await s.specifications()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
@@ -33,6 +33,28 @@ class SandboxTestCase(unittest.TestCase):
     def test_specifications(self):
         s = Sandbox(TEST_URL)
         self.assertTrue(dict, type(s.specifications()))
+    
+    
+    def test_context_manager(self):
+        with Sandbox(TEST_URL) as s:
+            self.assertTrue(dict, type(s.usage()))
+            self.assertTrue(dict, type(s.specifications()))
+
+
+class SandboxSessionTestCase(unittest.TestCase):
+    
+    def test_pool_configuration(self):
+        with Sandbox(TEST_URL, pool_connections=3, pool_maxsize=20, pool_block=True) as s:
+            adapter = s.session.get_adapter(TEST_URL)
+            self.assertEqual(3, adapter._pool_connections)
+            self.assertEqual(20, adapter._pool_maxsize)
+            self.assertTrue(adapter._pool_block)
+            self.assertEqual("keep-alive", s.session.headers["Connection"])
+    
+    
+    def test_keep_alive_disabled(self):
+        with Sandbox(TEST_URL, keep_alive=False) as s:
+            self.assertEqual("close", s.session.headers["Connection"])
 
 
 class SandboxExecuteTestCase(unittest.TestCase):
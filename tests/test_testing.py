@@ -0,0 +1,261 @@
+# test_testing.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import io
+import json
+import random
+import tarfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import aiounittest
+
+from sandbox_api import (ASandbox, RetryPolicy, Sandbox, Sandbox400, Sandbox404, Sandbox429,
+                         Sandbox503, testing)
+from sandbox_api.enums import SandboxErrCode
+from sandbox_api.testing import (FakeSandbox, Faults, constant, exponential, lognormal, scripted,
+                                 uniform)
+
+
+
+class DistributionTestCase(unittest.TestCase):
+    
+    def test_distributions(self):
+        rng = random.Random(0)
+        self.assertEqual(0.5, constant(0.5)(rng))
+        self.assertTrue(all(1 <= uniform(1, 2)(rng) <= 2 for _ in range(100)))
+        self.assertGreater(min(exponential(0.1)(rng) for _ in range(100)), 0)
+        values = sorted(lognormal(0.1)(rng) for _ in range(1001))
+        self.assertAlmostEqual(0.1, values[500], delta=0.01)
+        self.assertEqual(0.0, exponential(0)(rng))
+    
+    
+    def test_faults(self):
+        faults = Faults({429: 0.25, 503: 0.25}, endpoints=["execute"])
+        self.assertTrue(faults.applies("execute"))
+        self.assertFalse(faults.applies("usages"))
+        draws = [faults.draw_status(random.Random(i)) for i in range(400)]
+        self.assertAlmostEqual(100, draws.count(429), delta=30)
+        self.assertAlmostEqual(100, draws.count(503), delta=30)
+        self.assertIsNone(Faults().draw_status(random.Random(0)))
+
+
+
+class FakeSandboxTestCase(aiounittest.AsyncTestCase):
+    
+    async def test_metadata(self):
+        async with FakeSandbox(containers=3) as fake:
+            async with ASandbox(fake.url) as s:
+                self.assertEqual(3, (await s.specifications())["container"]["count"])
+                self.assertIn("python", await s.libraries())
+                self.assertEqual(0, (await s.usage())["container"])
+            async with ASandbox(fake.url, metadata_cache=True) as s:
+                await s.libraries()
+                s.metadata_cache.ttl = 0
+                s.metadata_cache.background = False
+                await s.libraries()
+                self.assertEqual(1, s.metadata_cache.not_modified_count)
+    
+    
+    async def test_execute(self):
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url) as s:
+                result = await s.execute({
+                    "commands": ["true", {"command": "echo $((1+1))", "timeout": 1}, "-false"]
+                })
+                self.assertEqual(0, result["status"])
+                self.assertEqual(["true", "echo $((1+1))", "false"],
+                                 [e["command"] for e in result["execution"]])
+                self.assertEqual("2", result["execution"][1]["stdout"])
+                self.assertNotIn("environment", result)
+                
+                result = await s.execute({"commands": ["false", "true"]})
+                self.assertEqual(1, result["status"])
+                self.assertEqual(1, len(result["execution"]))
+                
+                result = await s.execute({"commands": ["echo $VAR"], "environ": {"VAR": "v"}})
+                self.assertEqual("v", result["execution"][0]["stdout"])
+                
+                result = await s.execute({"commands": [{"command": "sleep 5", "timeout": 0.1}]})
+                self.assertEqual(SandboxErrCode.TIMEOUT, result["status"])
+                self.assertEqual("Command timed out after 0.1 seconds\n",
+                                 result["execution"][0]["stderr"])
+                self.assertLess(result["total_time"], 1)
+                
+                result = await s.execute({"commands": ["true"], "result_path": "missing"})
+                self.assertEqual(SandboxErrCode.RESULT_NOT_FOUND, result["status"])
+                
+                with self.assertRaises(Sandbox400):
+                    await s.execute({})
+                with self.assertRaises(Sandbox404):
+                    await s.execute({"commands": ["true"], "environment": "unknown"})
+            self.assertEqual(7, fake.stats["execute"])
+    
+    
+    async def test_environments(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+            info = tarfile.TarInfo("input.txt")
+            info.size = 5
+            tar.addfile(info, io.BytesIO(b"hello"))
+        archive.seek(0)
+        
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url) as s:
+                result = await s.execute({
+                    "commands": ["cat input.txt > result.txt"], "result_path": "result.txt",
+                    "save": True,
+                }, archive)
+                self.assertEqual("hello", result["result"])
+                uuid = result["environment"]
+                
+                result = await s.execute({
+                    "commands": ["cat result.txt"], "environment": uuid
+                })
+                self.assertEqual("hello", result["execution"][0]["stdout"])
+                
+                self.assertEqual(b"hello", (await s.download(uuid, "result.txt")).read())
+                self.assertEqual(b"ell", (await s.download_range(uuid, 1, 3, "input.txt")).read())
+                self.assertEqual("5", await s.check(uuid, "input.txt"))
+                self.assertEqual(0, await s.check(uuid, "missing"))
+                self.assertEqual(0, await s.check("unknown"))
+                
+                downloaded = await s.download(uuid)
+                with tarfile.open(fileobj=downloaded, mode="r:gz") as tar:
+                    self.assertEqual(["input.txt", "result.txt"], sorted(tar.getnames()))
+    
+    
+    async def test_archives_off_loop(self):
+        threads, arguments = [], []
+        
+        def recording(func):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                arguments.append(args[0])
+                return func(*args)
+            return wrapper
+        
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+            tar.addfile(tarfile.TarInfo("input.txt"), io.BytesIO())
+        archive.seek(0)
+        
+        with mock.patch.object(testing, "_extract", recording(testing._extract)), \
+                mock.patch.object(testing, "_archive", recording(testing._archive)):
+            async with FakeSandbox() as fake:
+                async with ASandbox(fake.url) as s:
+                    result = await s.execute({"commands": ["true"], "save": True}, archive)
+                    await s.execute({"commands": ["true"], "environment": result["environment"]})
+        
+        self.assertEqual(3, len(threads))
+        self.assertNotIn(threading.current_thread(), threads)
+        # The uploaded environment is read by the executor too
+        self.assertTrue(hasattr(arguments[0], "read"))
+    
+    
+    async def test_loaders(self):
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url) as s:
+                result = await s.load({"a": 1})
+                self.assertEqual({"a": 1}, json.loads(result["fields"].pop("data")))
+                self.assertEqual({"status": 0, "endpoint": "load/fr", "fields": {}}, result)
+                self.assertEqual("exo", (await s.playexo({}, {}))["endpoint"])
+                self.assertEqual("demo", (await s.demo({}))["endpoint"])
+                self.assertEqual("exec", (await s.exec({"b": "2"}))["endpoint"])
+        
+        async with FakeSandbox(loader=lambda name, fields: {"name": name}) as fake:
+            async with ASandbox(fake.url) as s:
+                self.assertEqual({"name": "load/fr"}, await s.load({}))
+    
+    
+    async def test_script_and_capacity(self):
+        script = scripted({"answer": (0, "42\n", "")}, default=(1, "", "error"))
+        async with FakeSandbox(containers=3, script=script, command_time=0.05) as fake:
+            async with ASandbox(fake.url) as s:
+                results = await asyncio.gather(
+                    *(s.execute({"commands": ["answer"]}) for _ in range(9))
+                )
+                self.assertTrue(all(r["execution"][0]["stdout"] == "42" for r in results))
+                self.assertEqual(3, fake.max_running)
+                self.assertEqual(0, fake.running)
+                
+                result = await s.execute({"commands": ["other"]})
+                self.assertEqual((1, "error"), (result["status"], result["execution"][0]["stderr"]))
+    
+    
+    async def test_max_queue(self):
+        async with FakeSandbox(1, max_queue=1, script=scripted({}), command_time=0.05) as fake:
+            async with ASandbox(fake.url) as s:
+                results = await asyncio.gather(
+                    *(s.execute({"commands": ["true"]}) for _ in range(4)), return_exceptions=True
+                )
+        self.assertEqual(2, sum(isinstance(r, Sandbox503) for r in results))
+        self.assertEqual(2, fake.stats["rejected"])
+    
+    
+    async def test_latency(self):
+        latency = {"usages": 0.05, "specifications": uniform(0.0, 0.01)}
+        async with FakeSandbox(latency=latency) as fake:
+            async with ASandbox(fake.url) as s:
+                start = time.perf_counter()
+                await s.usage()
+                self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+                start = time.perf_counter()
+                await s.libraries()
+                self.assertLess(time.perf_counter() - start, 0.05)
+    
+    
+    async def test_fault_injection(self):
+        faults = Faults({429: 1.0}, retry_after=0, endpoints=["usages"])
+        async with FakeSandbox(faults=faults) as fake:
+            async with ASandbox(fake.url) as s:
+                with self.assertRaises(Sandbox429) as cm:
+                    await s.usage()
+                self.assertEqual("0", cm.exception.response.headers["Retry-After"])
+                await s.libraries()
+        self.assertEqual(1, fake.stats["fault:429"])
+    
+    
+    async def test_retries_reproducible(self):
+        stats = []
+        for _ in range(2):
+            faults = Faults({429: 0.3, 503: 0.2}, retry_after=0)
+            retry = RetryPolicy(statuses={429: 10, 503: 10}, backoff=0, jitter=False)
+            async with FakeSandbox(faults=faults, seed=42) as fake:
+                async with ASandbox(fake.url, retry=retry) as s:
+                    for _ in range(20):
+                        await s.usage()
+            stats.append(dict(fake.stats))
+        self.assertEqual(stats[0], stats[1])
+        self.assertEqual(20 + stats[0]["fault:429"] + stats[0]["fault:503"], stats[0]["usages"])
+        self.assertGreater(stats[0]["fault:429"], 0)
+    
+    
+    async def test_slow_body(self):
+        faults = Faults(slow_body=1.0, chunk_size=10, chunk_delay=0.01)
+        async with FakeSandbox(faults=faults) as fake:
+            async with ASandbox(fake.url) as s:
+                start = time.perf_counter()
+                usage = await s.usage()
+                elapsed = time.perf_counter() - start
+        self.assertEqual(0, usage["container"])
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual(1, fake.stats["slow_body"])
+
+
+
+class ThreadedFakeSandboxTestCase(unittest.TestCase):
+    
+    def test_sync_client(self):
+        with FakeSandbox(containers=2) as fake, Sandbox(fake.url) as s:
+            self.assertEqual(2, s.specifications()["container"]["count"])
+            result = s.execute({"commands": ["echo ok > out"], "result_path": "out", "save": True})
+            self.assertEqual("ok\n", result["result"])
+            self.assertEqual(b"ok\n", s.download(result["environment"], "out").read())
+        self.assertIsNone(fake._thread)
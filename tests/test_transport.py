@@ -0,0 +1,269 @@
+# test_transport.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import aiohttp
+import aiounittest
+import requests
+from requests.adapters import HTTPAdapter
+
+from sandbox_api import (ASandbox, EnvironmentBuilder, HTTP2Transport, RetryPolicy, Sandbox,
+                         Sandbox404, Transport)
+from sandbox_api.asandbox import CONNECT_ERRORS
+from sandbox_api.sandbox import is_connect_error
+from sandbox_api.testing import FakeSandbox
+from sandbox_api.transport import get_transport
+
+
+HAS_HTTP2 = HTTP2Transport.available()
+HAS_HYPERCORN = importlib.util.find_spec("hypercorn") is not None
+
+CONFIG = {"commands": ["echo $((2+2))"]}
+ENVIRON = {"commands": ["cat input.txt > result.txt"], "result_path": "result.txt", "save": True}
+LARGE = {"commands": ["echo " + "hello world " * 1000 + "| wc -c"]}
+
+# Unused port of the loopback
+CLOSED = "http://127.0.0.1:1/"
+
+
+
+class H2Server:
+    """An ASGI application served by hypercorn over HTTP/2 (h2c with prior
+    knowledge) in a thread, answering every request with the HTTP version,
+    the client's address and the size of the body."""
+    
+    
+    def __init__(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.url = "http://127.0.0.1:%d/" % self.port
+        self.loop = asyncio.new_event_loop()
+        self.stop = asyncio.Event()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.serve(),))
+    
+    
+    async def app(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body, more = b"", True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+        payload = json.dumps({
+            "http_version": scope["http_version"], "client": scope["client"],
+            "body":         len(body), "status": 0, "execution": [],
+        }).encode()
+        await send({
+            "type":    "http.response.start", "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": payload})
+    
+    
+    async def serve(self):
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+        
+        config = Config()
+        config.bind = ["127.0.0.1:%d" % self.port]
+        config.accesslog = config.errorlog = None
+        await serve(self.app, config, shutdown_trigger=self.stop.wait)
+    
+    
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port)).close()
+                return self
+            except OSError:  # pragma: no cover
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.loop.call_soon_threadsafe(self.stop.set)
+        self.thread.join()
+        self.loop.close()
+
+
+
+class TransportTestCase(unittest.TestCase):
+    
+    def test_get_transport(self):
+        self.assertIs(Transport, type(get_transport()))
+        self.assertIs(Transport, type(get_transport("http1")))
+        transport = Transport()
+        self.assertIs(transport, get_transport(transport))
+        with self.assertRaises(ValueError):
+            get_transport("http3")
+    
+    
+    @unittest.skipUnless(HAS_HTTP2, "httpx or h2 is not installed")
+    def test_get_http2_transport(self):
+        transport = get_transport("http2")
+        self.assertIsInstance(transport, HTTP2Transport)
+        self.assertEqual("<HTTP2Transport http2>", repr(transport))
+        options = HTTP2Transport(max_connections=3).options("/run/sandbox.sock")
+        self.assertEqual((False, True), (options["http1"], options["http2"]))
+        self.assertEqual(3, options["limits"].max_connections)
+        self.assertEqual("/run/sandbox.sock", options["uds"])
+    
+    
+    def test_default(self):
+        with Sandbox(CLOSED) as s:
+            self.assertIs(Transport, type(s.transport))
+            self.assertIs(HTTPAdapter, type(s.session.get_adapter(CLOSED)))
+
+
+
+@unittest.skipUnless(HAS_HTTP2, "httpx or h2 is not installed")
+class SandboxHTTP2TestCase(unittest.TestCase):
+    """Sandbox through httpx, over HTTP/1.1 since FakeSandbox does not
+    support HTTP/2."""
+    
+    def test_requests(self):
+        transport = HTTP2Transport(http1=True)
+        with FakeSandbox(compress=1024) as fake:
+            with Sandbox(fake.url, transport=transport, compression=True) as s:
+                self.assertIs(transport, s.transport)
+                self.assertEqual("4", s.execute(CONFIG)["execution"][0]["stdout"])
+                self.assertEqual("12000", s.execute(LARGE)["execution"][0]["stdout"])
+                self.assertEqual(1, fake.stats["compressed"])
+                
+                builder = EnvironmentBuilder({"input.txt": "hello"})
+                uuid = s.execute(ENVIRON, builder)["environment"]
+                self.assertEqual(b"hello", s.download(uuid, "result.txt").read())
+                self.assertEqual(b"".join(s.iter_download(uuid, "input.txt")), b"hello")
+                self.assertEqual("5", s.check(uuid, "input.txt"))
+                self.assertEqual(0, s.check("unknown"))
+                with self.assertRaises(Sandbox404):
+                    s.execute({"commands": ["true"], "environment": "unknown"})
+                
+                archive = io.BytesIO(EnvironmentBuilder({"input.txt": "world"}).build())
+                self.assertEqual("world", s.execute(ENVIRON, archive)["result"])
+                self.assertEqual(5, s.specifications()["container"]["count"])
+    
+    
+    def test_unix(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sandbox.sock")
+            with FakeSandbox(path=path) as fake:
+                with Sandbox(fake.url, transport=HTTP2Transport(http1=True)) as s:
+                    self.assertEqual("4", s.execute(CONFIG)["execution"][0]["stdout"])
+    
+    
+    def test_connect_error(self):
+        transport = HTTP2Transport(http1=True)
+        with Sandbox(CLOSED, transport=transport, retry=RetryPolicy(backoff=0)) as s:
+            with self.assertRaises(requests.ConnectionError) as cm:
+                s.usage()
+            self.assertTrue(is_connect_error(cm.exception))
+
+
+
+@unittest.skipUnless(HAS_HTTP2, "httpx or h2 is not installed")
+class ASandboxHTTP2TestCase(aiounittest.AsyncTestCase):
+    """ASandbox through httpx, over HTTP/1.1 since FakeSandbox does not
+    support HTTP/2."""
+    
+    async def test_requests(self):
+        transport = HTTP2Transport(http1=True)
+        async with FakeSandbox(compress=1024) as fake:
+            async with ASandbox(fake.url, transport=transport, compression=True) as s:
+                result = await s.execute(CONFIG)
+                self.assertEqual("4", result["execution"][0]["stdout"])
+                result = await s.execute(LARGE)
+                self.assertEqual("12000", result["execution"][0]["stdout"])
+                self.assertEqual(1, fake.stats["compressed"])
+                
+                builder = EnvironmentBuilder({"input.txt": "hello"})
+                uuid = (await s.execute(ENVIRON, builder))["environment"]
+                self.assertEqual(b"hello", (await s.download(uuid, "result.txt")).read())
+                chunks = [c async for c in s.iter_download(uuid, "input.txt")]
+                self.assertEqual(b"hello", b"".join(chunks))
+                self.assertEqual("5", await s.check(uuid, "input.txt"))
+                self.assertEqual(0, await s.check("unknown"))
+                with self.assertRaises(Sandbox404):
+                    await s.execute({"commands": ["true"], "environment": "unknown"})
+                
+                archive = io.BytesIO(EnvironmentBuilder({"input.txt": "world"}).build())
+                self.assertEqual("world", (await s.execute(ENVIRON, archive))["result"])
+                self.assertEqual(5, (await s.specifications())["container"]["count"])
+                session = s.session
+        self.assertTrue(session.closed)
+    
+    
+    async def test_release(self):
+        async with FakeSandbox() as fake:
+            async with ASandbox(fake.url, transport=HTTP2Transport(http1=True)) as s:
+                session = s.session
+                response = await session.request("GET", fake.url + "specifications/")
+                response.release()
+                tasks = set(session._closing)
+                self.assertEqual(1, len(tasks))
+        self.assertTrue(all(t.done() for t in tasks))
+        self.assertEqual(set(), session._closing)
+    
+    
+    async def test_default(self):
+        async with ASandbox(CLOSED) as s:
+            self.assertIs(Transport, type(s.transport))
+            self.assertIsInstance(s.session, aiohttp.ClientSession)
+    
+    
+    async def test_unix(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sandbox.sock")
+            async with FakeSandbox(path=path) as fake:
+                async with ASandbox(fake.url, transport=HTTP2Transport(http1=True)) as s:
+                    result = await s.execute(CONFIG)
+                    self.assertEqual("4", result["execution"][0]["stdout"])
+    
+    
+    async def test_connect_error(self):
+        transport = HTTP2Transport(http1=True)
+        async with ASandbox(CLOSED, transport=transport) as s:
+            with self.assertRaises(CONNECT_ERRORS):
+                await s.usage()
+
+
+
+@unittest.skipUnless(HAS_HTTP2 and HAS_HYPERCORN, "httpx, h2 or hypercorn is not installed")
+class MultiplexingTestCase(unittest.TestCase):
+    
+    def test_sandbox(self):
+        with H2Server() as server, Sandbox(server.url, transport="http2") as s:
+            results = [r.get() for r in s.map([CONFIG] * 20)]
+        self.assertEqual({"2"}, {r["http_version"] for r in results})
+        self.assertEqual(1, len({tuple(r["client"]) for r in results}))
+        self.assertTrue(all(r["body"] > 0 for r in results))
+    
+    
+    def test_asandbox(self):
+        async def run(url: str):
+            async with ASandbox(url, transport="http2") as s:
+                return await asyncio.gather(*(s.execute(CONFIG) for _ in range(20)))
+        
+        with H2Server() as server:
+            results = asyncio.run(run(server.url))
+        self.assertEqual({"2"}, {r["http_version"] for r in results})
+        self.assertEqual(1, len({tuple(r["client"]) for r in results}))
+        self.assertTrue(all(r["body"] > 0 for r in results))
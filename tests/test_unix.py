@@ -0,0 +1,97 @@
+# test_unix.py
+#
+# Authors:
+#   - Coumes Quentin <coumes.quentin@gmail.com>
+
+
+import os
+import tempfile
+import unittest
+
+import aiohttp
+import aiounittest
+import requests
+
+from sandbox_api import ASandbox, HistogramSink, Instrumentation, RetryPolicy, Sandbox
+from sandbox_api.sandbox import is_connect_error
+from sandbox_api.testing import FakeSandbox
+from sandbox_api.unix import UnixAdapter
+from sandbox_api.utils import UNIX_BASE_URL, base_url, unix_socket_path
+
+
+CONFIG = {"commands": ["echo $((2+2))"]}
+
+
+
+class UnixHelpersTestCase(unittest.TestCase):
+    
+    def test_unix_socket_path(self):
+        self.assertEqual("/run/sandbox.sock", unix_socket_path("unix:///run/sandbox.sock"))
+        self.assertEqual("/run/sandbox.sock", unix_socket_path("unix:///run/sandbox.sock/"))
+        self.assertEqual("sandbox.sock", unix_socket_path("unix://sandbox.sock"))
+        self.assertIsNone(unix_socket_path("http://127.0.0.1:7000/"))
+        with self.assertRaises(ValueError):
+            unix_socket_path("unix://")
+    
+    
+    def test_base_url(self):
+        self.assertEqual(UNIX_BASE_URL, base_url("unix:///run/sandbox.sock"))
+        self.assertEqual("http://127.0.0.1:7000/", base_url("http://127.0.0.1:7000/"))
+
+
+
+class SandboxUnixTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sandbox.sock")
+    
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    
+    def test_requests(self):
+        sink = HistogramSink()
+        with FakeSandbox(path=self.path) as fake:
+            self.assertEqual("unix://" + self.path, fake.url)
+            with Sandbox(fake.url, instrumentation=Instrumentation([sink])) as s:
+                self.assertEqual(fake.url, s.url)
+                self.assertEqual("4", s.execute(CONFIG)["execution"][0]["stdout"])
+                self.assertEqual(5, s.specifications()["container"]["count"])
+                self.assertFalse(s.check("unknown"))
+                self.assertIsInstance(s.session.get_adapter(s.base_url), UnixAdapter)
+            self.assertEqual(1, fake.stats["execute"])
+        self.assertEqual(
+            {"execute", "specifications", "environments"}, {e for e, _ in sink.histograms}
+        )
+    
+    
+    def test_connect_error(self):
+        with Sandbox("unix://" + self.path, retry=RetryPolicy(backoff=0)) as s:
+            with self.assertRaises(requests.ConnectionError) as cm:
+                s.usage()
+            self.assertTrue(is_connect_error(cm.exception))
+        self.assertIn(self.path, str(cm.exception))
+
+
+
+class ASandboxUnixTestCase(aiounittest.AsyncTestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sandbox.sock")
+    
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    
+    async def test_requests(self):
+        async with FakeSandbox(path=self.path) as fake:
+            async with ASandbox(fake.url) as s:
+                result = await s.execute(CONFIG)
+                self.assertEqual("4", result["execution"][0]["stdout"])
+                self.assertEqual(5, (await s.specifications())["container"]["count"])
+                self.assertIsInstance(s.session.connector, aiohttp.UnixConnector)
+            self.assertEqual(1, fake.stats["execute"])
@@ -1,6 +1,8 @@
+import io
 import unittest
 
-from sandbox_api.utils import validate
+from sandbox_api.utils import (ChunkSlicer, file_digest, range_header, slice_chunks,
+                               split_segments, validate)
 
 
 
@@ -82,3 +84,61 @@ class ValidateTestCase(unittest.TestCase):
         }
         
         self.assertFalse(validate(config)[0])
+
+
+
+class FileDigestTestCase(unittest.TestCase):
+    
+    def test_file_digest(self):
+        f = io.BytesIO(b"headercontent")
+        f.seek(6)
+        self.assertEqual(
+            "ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73", file_digest(f)
+        )
+        self.assertEqual(b"content", f.read())
+    
+    
+    def test_file_digest_not_seekable(self):
+        class Stream(io.RawIOBase):
+            def readable(self):
+                return True
+        
+        self.assertIsNone(file_digest(Stream()))
+
+
+
+class RangeTestCase(unittest.TestCase):
+    
+    def test_range_header(self):
+        self.assertIsNone(range_header())
+        self.assertEqual({"Range": "bytes=10-"}, range_header(10))
+        self.assertEqual({"Range": "bytes=0-9"}, range_header(0, 9))
+    
+    
+    def test_split_segments(self):
+        self.assertEqual([(0, 9)], list(split_segments(10, 1)))
+        self.assertEqual([(0, 2), (3, 5), (6, 9)], list(split_segments(10, 3)))
+    
+    
+    def test_slice_chunks(self):
+        chunks = [b"abc", b"def", b"ghi"]
+        self.assertEqual(b"abcdefghi", b"".join(slice_chunks(chunks)))
+        self.assertEqual(b"bcdefgh", b"".join(slice_chunks(chunks, 1, 7)))
+        self.assertEqual(b"def", b"".join(slice_chunks(chunks, 3, 5)))
+        self.assertEqual(b"hi", b"".join(slice_chunks(chunks, 7)))
+    
+    
+    def test_slice_chunks_stops_early(self):
+        def chunks():
+            yield b"abc"
+            raise AssertionError("Should not be consumed")
+        
+        self.assertEqual(b"ab", b"".join(slice_chunks(chunks(), 0, 1)))
+    
+    
+    def test_chunk_slicer(self):
+        slicer = ChunkSlicer(2, 4)
+        self.assertEqual(b"c", slicer.feed(b"abc"))
+        self.assertFalse(slicer.done)
+        self.assertEqual(b"de", slicer.feed(b"def"))
+        self.assertTrue(slicer.done)
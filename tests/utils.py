@@ -4,10 +4,30 @@
 #   - Coumes Quentin <coumes.quentin@gmail.com>
 
 
+import asyncio
+import contextlib
 import os
+from typing import AsyncIterator, Callable
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
 
 RESOURCES_ROOT = os.path.join(os.path.dirname(__file__), "resources")
 
 ENV1 = "dae5f9a3-a911-4df4-82f8-b9343241ece5"
 ENV2 = "e77f958e-4757-4e8f-89eb-21a0153d53d4"
+
+
+@contextlib.asynccontextmanager
+async def serve(app: web.Application) -> AsyncIterator[str]:
+    """Serve <app> in the running event loop, yielding its URL. Used for the
+    behaviours FakeSandbox does not provide."""
+    async with TestServer(app) as server:
+        yield str(server.make_url("/"))
+
+
+async def run_sync(func: Callable, *args):
+    """Call <func> in the default executor, so that a synchronous client can
+    reach a server running in the current event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)